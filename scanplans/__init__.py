@@ -1 +1,71 @@
+"""Bluesky plans from Billinge group.
+
+The public functions and classes of the submodules are available from the package, e.g.
+`scanplans.cryostat_plan`. The submodules are imported at the first use of one of their names so that
+`import scanplans` does not load the beamline configuration of xpdacq. See `scanplans.importtime`.
+"""
+import importlib
+
 __version__ = '0.1.0'
+
+_API = {
+    "autoexposure": ["AutoExposure", "exposure_plan"],
+    "autoplan": ["autoplan"],
+    "beamtimehelper": ["BeamtimeHelper"],
+    "compiled": ["CompiledPlan", "compile_plan"],
+    "context": ["PlanContext", "resolve_context"],
+    "convergence": ["Convergence", "relative_change"],
+    "cryostat": [
+        "cryostat_plan", "ramp_temperature", "set_power", "get_heater_range", "get_heater_ranges",
+        "order_temperatures", "config_det_and_count"
+    ],
+    "efficiency": ["read_documents", "run_table", "efficiency_report"],
+    "export": ["ColumnarExporter"],
+    "frametime": ["DetectorModel", "optimize_frame_time"],
+    "grid_scan": ["acq_rel_grid_scan", "adaptive_rel_grid_scan"],
+    "importtime": ["measure_import_times"],
+    "livequeue": ["LiveQueue"],
+    "mdgetters": [
+        "translate_to_sample", "translate_to_plan", "get_from_sample", "find_scanplan", "get_plan_arguments",
+        "get_plan_exposure"
+    ],
+    "monitor": ["PolledMonitor", "monitor_during"],
+    "move_and_do": ["move_and_do_one", "move_and_do_many"],
+    "moves": ["MoveTracker"],
+    "preflight": ["PreflightReport", "preflight_move_and_do", "preflight_autoplan", "preflight_cryostat"],
+    "sampletable": ["SampleTable"],
+    "scheduler": ["Job", "Schedule", "make_schedule", "run_schedule"],
+    "settle": ["SettleModel"],
+    "sim": ["SimBeamline", "SimResult", "VirtualClock"],
+    "singlerun": ["single_run", "split_samples"],
+    "spatial": ["SpatialIndex"],
+    "tools": [
+        "calc_delay", "calc_exposure", "cadence_count", "configure_area_det", "configure_exposure",
+        "open_shutter_stub", "close_shutter_stub", "shutter_step", "shutter_read", "shutter_readback",
+        "calibrate_shutter"
+    ],
+    "tramp2": ["Tramp2"],
+    "tramp3": ["Tramp3"],
+    "triage": ["triage_wells"],
+    "ttseries": ["ttseries"],
+    "variants": ["simulate_variants"],
+    "wanda_grid_scan": ["gridScan"]
+}
+_MODULES = {name: module for module, names in _API.items() for name in names}
+
+__all__ = sorted(_MODULES)
+
+
+def __getattr__(name):
+    """Import the submodule or the submodule of the name at the first use."""
+    if name in _API:
+        return importlib.import_module(f"{__name__}.{name}")
+    if name in _MODULES:
+        value = getattr(importlib.import_module(f"{__name__}.{_MODULES[name]}"), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_API) | set(_MODULES))
@@ -0,0 +1,103 @@
+"""Import the heavy dependencies at the first use instead of the import of the modules.
+
+The xpdacq and xpdconf packages load the beamline configuration from the disk when they are imported, which takes
+seconds. A `LazyObject` stands in for a module or an object of a module and imports it when it is first used, e.g.
+called, indexed or an attribute is read. The helpers which do not use the dependency never import it.
+"""
+import importlib
+import typing as tp
+
+_MISSING = object()
+
+
+class LazyObject:
+    """
+    A stand-in for a module or an object in a module which is imported at the first use.
+
+    Attributes
+    ----------
+    _module
+        The name of the module.
+    _attribute
+        The name of the object in the module. If None, the stand-in is the module.
+    _target
+        The module or the object after it is imported.
+    """
+
+    __slots__ = ("_module", "_attribute", "_target")
+
+    def __init__(self, module: str, attribute: str = None):
+        self._module = module
+        self._attribute = attribute
+        self._target = _MISSING
+
+    def _load(self) -> tp.Any:
+        if self._target is _MISSING:
+            target = importlib.import_module(self._module)
+            self._target = getattr(target, self._attribute) if self._attribute is not None else target
+        return self._target
+
+    def __getattr__(self, name):
+        if name in LazyObject.__slots__:
+            raise AttributeError(name)
+        return getattr(self._load(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+
+    def __delitem__(self, key):
+        del self._load()[key]
+
+    def __contains__(self, key):
+        return key in self._load()
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __bool__(self):
+        return bool(self._load())
+
+    def __instancecheck__(self, instance):
+        return isinstance(instance, self._load())
+
+    def __subclasscheck__(self, subclass):
+        return issubclass(subclass, self._load())
+
+    def __repr__(self):
+        if self._target is _MISSING:
+            name = self._module if self._attribute is None else f"{self._module}.{self._attribute}"
+            return f"<lazy {name}>"
+        return repr(self._target)
+
+
+def lazy_import(module: str, attribute: str = None) -> tp.Any:
+    """
+    Get a stand-in for the module or the object in the module which is imported at the first use.
+
+    Parameters
+    ----------
+    module
+        The name of the module, e.g. 'xpdacq.glbl'.
+    attribute
+        (Optional) The name of the object in the module, e.g. 'glbl'.
+
+    Returns
+    -------
+    obj
+        A `LazyObject`.
+
+    Examples
+    --------
+    The equivalent of `from xpdacq.glbl import glbl`.
+    >>> glbl = lazy_import("xpdacq.glbl", "glbl")
+    """
+    return LazyObject(module, attribute)
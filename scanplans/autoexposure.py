@@ -0,0 +1,256 @@
+"""Choose the exposure of a sample from a short probe frame.
+
+`AutoExposure` takes one frame at the minimum frame time, estimates the count rates at two percentiles of the
+image and chooses the exposure which reaches the target counts at the signal percentile. The frame time is
+limited so that the peak percentile stays below the saturation of the detector in each frame. The number of frames
+and the frame time are then chosen by `~scanplans.frametime.optimize_frame_time`.
+"""
+import inspect
+import typing as tp
+
+import bluesky.plan_stubs as bps
+import bluesky.preprocessors as bpp
+import numpy as np
+
+import scanplans.tools as tl
+from scanplans.context import PlanContext, resolve_context
+from scanplans.frametime import DetectorModel, optimize_frame_time
+from scanplans.mdgetters import find_scanplan
+
+__all__ = [
+    "AutoExposure",
+    "exposure_plan"
+]
+
+
+class AutoExposure:
+    """
+    Choose the exposure from a probe frame.
+
+    Attributes
+    ----------
+    target_counts
+        The counts to reach at the signal percentile of the image in the whole exposure.
+    signal_percentile
+        The percentile of the pixels which measures the signal, e.g. 50 for the median.
+    peak_percentile
+        The percentile of the pixels which must not saturate, e.g. 99.9 to ignore a few hot pixels.
+    saturation
+        The counts per pixel per frame at which the detector saturates.
+    fill
+        The fraction of the saturation allowed at the peak percentile in a frame.
+    dark
+        The counts per pixel per frame without beam, subtracted from the percentiles.
+    min_exposure, max_exposure
+        The range of the exposure in second.
+    model
+        The timing model of the detector. The probe frame is at its minimum frame time. Default DetectorModel().
+    image_getter
+        A function from the readings of the detector to the image array. Default the first reading which is at
+        least two dimensional, which works for the detectors that return the image in the reading. The area
+        detectors which save the image in files only put a datum id in the reading so they need a getter which
+        loads the image, e.g. from the file or the image plugin of the detector.
+    """
+
+    def __init__(self, target_counts: float = 1e5, signal_percentile: float = 50., peak_percentile: float = 99.9,
+                 saturation: float = 16000., fill: float = 0.8, dark: float = 0., min_exposure: float = None,
+                 max_exposure: float = 600., model: DetectorModel = None,
+                 image_getter: tp.Callable[[dict], tp.Any] = None):
+        if not 0 < fill <= 1:
+            raise ValueError(f"The fill must be in (0, 1]. It is {fill}.")
+        self.model = model if model is not None else DetectorModel()
+        self.target_counts = target_counts
+        self.signal_percentile = signal_percentile
+        self.peak_percentile = peak_percentile
+        self.saturation = saturation
+        self.fill = fill
+        self.dark = dark
+        self.min_exposure = min_exposure if min_exposure is not None else self.model.min_frame_time
+        self.max_exposure = max_exposure
+        self.image_getter = image_getter if image_getter is not None else _find_image
+
+    @property
+    def probe_time(self) -> float:
+        """The time of the probe frame in second."""
+        return self.model.min_frame_time
+
+    def rates(self, image: np.ndarray, probe_time: float = None) -> tp.Tuple[float, float]:
+        """Estimate the count rates per pixel at the signal and peak percentiles in counts per second."""
+        probe_time = self.probe_time if probe_time is None else probe_time
+        signal, peak = np.nanpercentile(
+            np.asarray(image, dtype=float), [self.signal_percentile, self.peak_percentile]
+        ) - self.dark
+        return max(float(signal), 0.) / probe_time, max(float(peak), 0.) / probe_time
+
+    def choose(self, image: tp.Optional[np.ndarray], probe_time: float = None, scale: float = 1.) -> dict:
+        """
+        Choose the exposure, the frame time and the number of frames from the probe image.
+
+        Parameters
+        ----------
+        image
+            The probe image. If None, the plan is simulated and the max_exposure is used.
+        probe_time
+            The time of the probe frame in second. Default the minimum frame time of the model.
+        scale
+            The factor of the exposure after it is chosen, e.g. to shorten the measurement.
+
+        Returns
+        -------
+        md
+            The metadata from `~scanplans.frametime.optimize_frame_time` with the extra keys
+            'sp_auto_exposure', 'sp_probe_time', 'sp_signal_rate', 'sp_peak_rate' and 'sp_target_counts'.
+        """
+        probe_time = self.probe_time if probe_time is None else probe_time
+        max_frame_time = self.model.max_frame_time
+        if image is None:
+            signal_rate = peak_rate = np.nan
+            exposure = self.max_exposure
+            print(f"WARNING: No probe image. Use the max exposure {exposure} s.")
+        else:
+            signal_rate, peak_rate = self.rates(image, probe_time)
+            exposure = self.target_counts / signal_rate if signal_rate > 0 else self.max_exposure
+            if peak_rate > 0:
+                max_frame_time = self.fill * self.saturation / peak_rate
+            if max_frame_time < self.model.min_frame_time:
+                print(
+                    f"WARNING: The peak rate {peak_rate:.3g} counts/s saturates the detector in the minimum frame "
+                    f"time {self.model.min_frame_time} s."
+                )
+        exposure = float(np.clip(exposure * scale, self.min_exposure, self.max_exposure))
+        model = DetectorModel(
+            min_frame_time=self.model.min_frame_time,
+            max_frame_time=float(np.clip(max_frame_time, self.model.min_frame_time, self.model.max_frame_time)),
+            dead_time=self.model.dead_time,
+            multi_frame=self.model.multi_frame
+        )
+        md = optimize_frame_time([exposure], model)[0]
+        md.update(
+            {
+                "sp_auto_exposure": True,
+                "sp_probe_time": probe_time,
+                "sp_signal_rate": signal_rate,
+                "sp_peak_rate": peak_rate,
+                "sp_target_counts": self.target_counts
+            }
+        )
+        print(f"INFO: auto exposure = {md['sp_computed_exposure']} s in {md['sp_num_frames']} frame(s).")
+        return md
+
+    def probe(self, det: tp.Any = None, scale: float = 1., context: PlanContext = None) -> tp.Generator:
+        """
+        Take the probe frame and choose the exposure. The shutter is opened for the frame and closed after it. No
+        run is opened so the probe frame is not saved.
+
+        Parameters
+        ----------
+        det
+            The area detector. Default the 'area_det' in the configuration of the context.
+        scale
+            The factor of the exposure after it is chosen.
+        context
+            The configuration to read the area detector and the shutter from. Default the globals.
+
+        Yields
+        ------
+        Msg
+            The messages to take the probe frame.
+
+        Returns
+        -------
+        md
+            The metadata of `choose`. It can be passed to `~scanplans.tools.configure_area_det`.
+
+        Raises
+        ------
+        ValueError
+            If the image_getter finds no image in the readings of the probe frame.
+        """
+        context = resolve_context(context)
+        det = det if det is not None else context.configuration["area_det"]
+        readings = []
+
+        def take_frame():
+            yield from tl.open_shutter_stub(context)
+            yield from bps.trigger(det, wait=True)
+            readings.append((yield from bps.read(det)))
+
+        yield from tl.configure_area_det(det, {"sp_time_per_frame": self.probe_time, "sp_num_frames": 1})
+        plan = bpp.finalize_wrapper(take_frame(), tl.close_shutter_stub(context))
+        yield from bpp.stage_wrapper(plan, [det])
+        image = None
+        # the readings are None only if the plan is simulated
+        if readings and readings[0] is not None:
+            image = self.image_getter(readings[0])
+            if image is None:
+                raise ValueError(
+                    f"No image in the readings of '{det.name}' ({', '.join(readings[0])}). If the detector saves "
+                    f"the image in files, pass an image_getter which loads the image."
+                )
+        return self.choose(image, scale=scale)
+
+
+def _find_image(readings: dict) -> tp.Optional[np.ndarray]:
+    """Find the first value in the readings which is at least two dimensional."""
+    for reading in readings.values():
+        value = np.asarray(reading.get("value") if isinstance(reading, dict) else reading)
+        if value.ndim >= 2 and np.issubdtype(value.dtype, np.number):
+            return value
+    return None
+
+
+def exposure_plan(bt: tp.Any, plan: tp.Union[int, str, tp.Callable[[dict], tp.Generator]],
+                  md: dict, context: PlanContext = None) -> tp.Generator:
+    """
+    Build the plan with the exposure chosen by `AutoExposure`.
+
+    Parameters
+    ----------
+    bt
+        The beamtime object.
+    plan
+        The index or name key of a ScanPlan in the beamtime, or a function from the metadata of the exposure to a
+        plan. The ScanPlan is built with its argument named 'exposure' replaced. If its function accepts a context,
+        it is given the frame time chosen for the sample as glbl['frame_acq_time']. Otherwise, it configures the
+        detector with the glbl['frame_acq_time'] of the context by itself.
+    md
+        The metadata from `AutoExposure.choose`.
+    context
+        The configuration of the plan. Default the globals.
+
+    Returns
+    -------
+    plan
+        The plan.
+
+    Raises
+    ------
+    ValueError
+        If the plan is not in the beamtime or its function has no parameter 'exposure', or if its function does
+        not accept a context and the glbl['frame_acq_time'] is longer than the frame time chosen for the sample,
+        which may saturate the detector.
+    """
+    if callable(plan):
+        return plan(md)
+    sp = find_scanplan(bt, plan)
+    if sp is None:
+        raise ValueError(f"No plan {plan!r} in the beamtime.")
+    signature = inspect.signature(sp.plan_func)
+    if "exposure" not in signature.parameters:
+        raise ValueError(f"The plan '{sp.plan_func.__name__}' has no parameter 'exposure'.")
+    context = resolve_context(context)
+    frame_time = md["sp_time_per_frame"]
+    if "context" not in signature.parameters and context.glbl["frame_acq_time"] > frame_time:
+        raise ValueError(
+            f"The frame time glbl['frame_acq_time'] = {context.glbl['frame_acq_time']} s is longer than the "
+            f"{frame_time} s chosen for the sample and the plan '{sp.plan_func.__name__}' does not accept a "
+            f"context to use it. Set glbl['frame_acq_time'] to at most {frame_time} s."
+        )
+    # replace the exposure by the name because it is not always the first argument, e.g. in ttseries
+    bound = signature.bind_partial([context.configuration["area_det"]], *sp["sp_args"], **sp["sp_kwargs"])
+    bound.arguments["exposure"] = md["sp_requested_exposure"]
+    if "bt" in signature.parameters:
+        bound.arguments["bt"] = bt
+    if "context" in signature.parameters:
+        bound.arguments["context"] = context.replace(glbl={"frame_acq_time": frame_time})
+    return sp.plan_func(*bound.args, **bound.kwargs)
@@ -1,17 +1,29 @@
 """A function to measure a series of samples automatically."""
+from functools import partial
+
 from bluesky.plan_stubs import mv, sleep, checkpoint, wait
 from bluesky.preprocessors import plan_mutator
-from xpdacq.beamtime import xpd_configuration, Beamtime
 
 import scanplans.mdgetters as mg
+from scanplans._lazy import lazy_import
+from scanplans.autoexposure import AutoExposure, exposure_plan
+from scanplans.context import PlanContext, resolve_context
+from scanplans.mdgetters import translate_to_sample
+from scanplans.moves import MoveTracker
+from scanplans.preflight import preflight_autoplan
+from scanplans.settle import SettleModel
 from scanplans.tools import inner_shutter_control
 
+Beamtime = lazy_import("xpdacq.beamtime", "Beamtime")
+
 __all__ = [
     "autoplan"
 ]
 
 
-def autoplan(bt: Beamtime, sample_index, plan_index, wait_time=30., auto_shutter=False):
+def autoplan(bt: Beamtime, sample_index, plan_index, wait_time=30., auto_shutter=False, preflight=False,
+             auto_exposure: AutoExposure = None, context: PlanContext = None, move_tolerance=1e-3,
+             settle: SettleModel = None):
     """
     Yield messages to count the predefined measurement plan on the a list of samples on a sample rack. It requires
     the following information to be added for each sample.
@@ -31,6 +43,21 @@ def autoplan(bt: Beamtime, sample_index, plan_index, wait_time=30., auto_shutter
         Waiting time before conduct plan for each sample in second.
     auto_shutter : bool
         Whether to mutate the plan with inner_shutter_control.
+    preflight : bool
+        Whether to check all the samples and plans before yielding any message. If True, a ValueError listing all
+        the issues is raised instead of skipping the samples without positions.
+    auto_exposure : AutoExposure
+        If not None, take a probe frame at each sample after the wait and build the plan with the chosen exposure.
+        See `~scanplans.autoexposure.exposure_plan`.
+    context : PlanContext
+        The configuration to read the position controllers, the detector and the shutter from. See
+        `~scanplans.context.PlanContext`. Default the globals.
+    move_tolerance : float
+        A controller is only moved if the position of the sample differs from the last one by more than this. See
+        `~scanplans.moves.MoveTracker`. If None, both controllers are moved for every sample. Default 1e-3.
+    settle : SettleModel
+        If not None, the wait after the moves is computed by the model from the distance moved instead of the
+        wait_time. See `~scanplans.settle.SettleModel`.
 
     Yields
     ------
@@ -49,8 +76,14 @@ def autoplan(bt: Beamtime, sample_index, plan_index, wait_time=30., auto_shutter
         >>> plan = autoplan(bt, [0, 1])
         >>> xrun({}, plan)
     """
-    posx_controller = xpd_configuration["posx_controller"]
-    posy_controller = xpd_configuration["posy_controller"]
+    if preflight:
+        preflight_autoplan(bt, sample_index, plan_index, context=context).raise_for_issues()
+    context = resolve_context(context)
+    posx_controller = context.configuration["posx_controller"]
+    posy_controller = context.configuration["posy_controller"]
+    shutter_control = partial(inner_shutter_control, context=context)
+    tracker = MoveTracker(move_tolerance) if move_tolerance is not None else None
+    move = tracker.mv if tracker is not None else mv
 
     for sample_ind, plan_ind in zip(sample_index, plan_index):
         sample = translate_to_sample(bt, int(sample_ind))
@@ -58,17 +91,29 @@ def autoplan(bt: Beamtime, sample_index, plan_index, wait_time=30., auto_shutter
         posy = mg.get_from_sample(sample, "position_y")
         count_plan = mg.translate_to_plan(bt, int(plan_ind), sample)
         if auto_shutter:
-            count_plan = plan_mutator(count_plan, inner_shutter_control)
+            count_plan = plan_mutator(count_plan, shutter_control)
         if posx and posy and count_plan:
             yield from checkpoint()
+            if settle is not None:
+                before = yield from settle.locate(posx_controller, posy_controller)
             print(f"INFO: Move to x: {posx}")
-            yield from mv(posx_controller, float(posx))
+            yield from move(posx_controller, float(posx))
             yield from checkpoint()
             print(f"INFO: Move to y: {posy}")
-            yield from mv(posy_controller, float(posy))
+            yield from move(posy_controller, float(posy))
             yield from checkpoint()
             yield from wait()
-            print(f"INFO: Wait for {wait_time} s")
-            yield from sleep(float(wait_time))
+            if settle is not None:
+                yield from settle.settle(before, posx_controller, posy_controller)
+            else:
+                print(f"INFO: Wait for {wait_time} s")
+                yield from sleep(float(wait_time))
             yield from checkpoint()
+            if auto_exposure is not None:
+                md = yield from auto_exposure.probe(context=context)
+                count_plan = mg.translate_to_plan(bt, exposure_plan(bt, int(plan_ind), md, context), sample)
+                if auto_shutter:
+                    count_plan = plan_mutator(count_plan, shutter_control)
             yield from count_plan
+    if tracker is not None:
+        print(f"INFO: {tracker}")
@@ -1,19 +1,27 @@
 """A class to print sample information and generate bluesky plan to target samples."""
+from __future__ import annotations
+
 from pprint import pprint
-from typing import Union, Tuple, Generator
+from typing import Union, Tuple, Generator, List
 
-from bluesky.plan_stubs import mv, null
+import numpy as np
+from bluesky.plan_stubs import mv, null, checkpoint
 from bluesky.simulators import summarize_plan
-from xpdacq.beamtime import Beamtime, ScanPlan
-from xpdacq.xpdacq_conf import xpd_configuration
+
+from scanplans._lazy import lazy_import
+from scanplans.compiled import CompiledPlan, compile_plan
+from scanplans.move_and_do import move_and_do_many
+from scanplans.sampletable import SampleTable, POS_KEYS
+from scanplans.spatial import SpatialIndex
+
+pd = lazy_import("pandas")
+Beamtime = lazy_import("xpdacq.beamtime", "Beamtime")
+ScanPlan = lazy_import("xpdacq.beamtime", "ScanPlan")
+xpd_configuration = lazy_import("xpdacq.xpdacq_conf", "xpd_configuration")
 
 __all__ = [
     "BeamtimeHelper"
 ]
-POS_KEYS = (
-    "sample_x",
-    "sample_y"
-)
 
 
 class BeamtimeHelper:
@@ -26,6 +34,12 @@ class BeamtimeHelper:
         The instance storing meta data of the sample and plan
     _pos_key
         The key for the position of samples. Default is the global variable POS_KEYS
+    _table
+        The columnar table of the samples. It is built at the first use.
+    _index
+        The spatial index of the sample positions. It is rebuilt when the table changes.
+    _index_version
+        The version of the table when the spatial index was built.
     """
 
     def __init__(self, bt: Beamtime, pos_key: Tuple[str, str] = POS_KEYS):
@@ -41,6 +55,154 @@ class BeamtimeHelper:
         """
         self._bt = bt
         self._pos_key = pos_key
+        self._table = None
+        self._index = None
+        self._index_version = -1
+
+    @property
+    def table(self) -> SampleTable:
+        """The columnar table of all the samples. It picks up the new, changed and removed samples when used. Each
+        use reads all the samples, so the methods use it once per call."""
+        if self._table is None:
+            self._table = SampleTable(self._bt.samples, self._pos_key)
+        else:
+            self._table.refresh()
+        return self._table
+
+    def select_samples(self, *args, **kwargs) -> pd.DataFrame:
+        """
+        Select the samples from the columnar table. The arguments are the same as `SampleTable.select`.
+
+        Returns
+        -------
+        rows
+            The selected rows of the table. The index is the sample index.
+
+        Examples
+        --------
+        Select the samples whose names match "Ni[0-9]+" and x positions are in 10 to 20 mm.
+        >>> rows = bthelper.select_samples(name="Ni[0-9]+", ranges={"sample_x": (10., 20.)})
+        """
+        return self.table.select(*args, **kwargs)
+
+    @property
+    def spatial_index(self) -> SpatialIndex:
+        """The spatial index of the sample positions. It is rebuilt when the samples change."""
+        table = self.table
+        if self._index is None or self._index_version != table.version:
+            self._index = SpatialIndex(table.positions())
+            self._index_version = table.version
+        return self._index
+
+    @staticmethod
+    def get_position() -> Tuple[float, float]:
+        """
+        Get the current readback of the position controllers.
+
+        Returns
+        -------
+        position
+            The (x, y) position.
+        """
+        posx_controller = xpd_configuration["x_controller"]
+        posy_controller = xpd_configuration["y_controller"]
+        return float(posx_controller.position), float(posy_controller.position)
+
+    def _rows(self, ids: np.ndarray, distances: np.ndarray = None) -> pd.DataFrame:
+        """Get the rows of the table at the row positions with an optional distance column. The table is not
+        refreshed again because the row positions come from the spatial index, which has just refreshed it."""
+        rows = self._table.frame.iloc[ids].copy()
+        if distances is not None:
+            rows["distance"] = distances
+        return rows
+
+    def nearest_sample(self, position: Tuple[float, float] = None, k: int = 1) -> pd.DataFrame:
+        """
+        Find the samples nearest to the position.
+
+        Parameters
+        ----------
+        position
+            (Optional) The (x, y) position. If None, use the readback of the position controllers.
+        k
+            The number of samples.
+
+        Returns
+        -------
+        rows
+            The rows of the samples sorted by the distance in the column "distance".
+
+        Examples
+        --------
+        Which sample is under the beam?
+        >>> bthelper.nearest_sample()
+        """
+        position = self.get_position() if position is None else position
+        return self._rows(*self.spatial_index.nearest(position, k))
+
+    def samples_within(self, radius: float, position: Tuple[float, float] = None) -> pd.DataFrame:
+        """
+        Find the samples within the radius from the position.
+
+        Parameters
+        ----------
+        radius
+            The radius in the unit of the positions.
+        position
+            (Optional) The (x, y) position. If None, use the readback of the position controllers.
+
+        Returns
+        -------
+        rows
+            The rows of the samples sorted by the distance in the column "distance".
+        """
+        position = self.get_position() if position is None else position
+        return self._rows(*self.spatial_index.query_radius(position, radius))
+
+    def samples_in_box(self, xlim: Tuple[float, float], ylim: Tuple[float, float]) -> pd.DataFrame:
+        """
+        Find the samples inside the box. The edges are included.
+
+        Parameters
+        ----------
+        xlim
+            The (low, high) bounds of the horizontal position.
+        ylim
+            The (low, high) bounds of the vertical position.
+
+        Returns
+        -------
+        rows
+            The rows of the samples.
+        """
+        return self._rows(self.spatial_index.query_box(xlim, ylim))
+
+    def find_overlaps(self, min_distance: float) -> pd.DataFrame:
+        """
+        Find the pairs of samples whose positions are closer than the minimum distance.
+
+        Parameters
+        ----------
+        min_distance
+            The minimum distance allowed between two samples, e.g. the diameter of the holder.
+
+        Returns
+        -------
+        pairs
+            A table of the sample index and name of each pair and their distance.
+        """
+        pairs, distances = self.spatial_index.overlaps(min_distance)
+        frame = self._table.frame
+        names = frame["sample_name"].to_numpy()
+        return pd.DataFrame(
+            {
+                "sample_a": frame.index.to_numpy()[pairs[:, 0]],
+                "name_a": names[pairs[:, 0]],
+                "sample_b": frame.index.to_numpy()[pairs[:, 1]],
+                "name_b": names[pairs[:, 1]],
+                "distance": distances
+            }
+        )
 
     def get_sample(self, sample: Union[int, str]) -> dict:
         """
@@ -114,6 +276,35 @@ class BeamtimeHelper:
             plan_gen = self.get_plan(plan)
             summarize_plan(plan_gen)
 
+    def compile_plan(self, plan: Union[int, str]) -> CompiledPlan:
+        """
+        Compile the plan into a message program which can be previewed and run many times.
+
+        Parameters
+        ----------
+        plan
+            The plan index or plan name key
+
+        Returns
+        -------
+        compiled
+            The program of the plan. See `~scanplans.compiled.CompiledPlan`.
+
+        Examples
+        --------
+        Preview the plan and run it.
+        >>> compiled = bthelper.compile_plan(0)
+        >>> print(compiled)
+        >>> xrun(0, compiled.plan())
+        """
+        if isinstance(plan, str):
+            plan_cls = self._bt.scanplans[plan]  # type: ScanPlan
+        elif isinstance(plan, int):
+            plan_cls = list(self._bt.scanplans.values())[plan]  # type: ScanPlan
+        else:
+            raise ValueError(f"{plan} is not int or str. It is {type(plan)}.")
+        return compile_plan(plan_cls.factory)
+
     def aim_at_sample(self, sample):
         """
         A generator of message: move the sample to the beam spot according to sample position metadata.
@@ -154,3 +345,66 @@ class BeamtimeHelper:
             print(f"INFO: Move to y = {pos_y}")
             yield from mv(posy_controller, float(pos_y))
         yield from null()
+
+    def aim_at_samples(self, rows: pd.DataFrame) -> Generator:
+        """
+        A generator of message: move to the selected samples one by one using the positions in the table.
+
+        The samples without a valid position are skipped.
+
+        Parameters
+        ----------
+        rows
+            The selected rows from `select_samples`.
+
+        Examples
+        --------
+        Visit all the samples whose names start with "Ni".
+        >>> RE(bthelper.aim_at_samples(bthelper.select_samples(name="^Ni")))
+        """
+        posx_controller = xpd_configuration["x_controller"]
+        posy_controller = xpd_configuration["y_controller"]
+        positions = self.table.positions(rows)
+        valid = np.all(np.isfinite(positions), axis=1)
+        for name in rows["sample_name"][~valid]:
+            print(f"Warning: No valid position in sample {name} -> Skip")
+        for name, (pos_x, pos_y) in zip(rows["sample_name"][valid], positions[valid]):
+            print(f"INFO: Target sample {name} at ({pos_x}, {pos_y})")
+            yield from checkpoint()
+            yield from mv(posx_controller, pos_x, posy_controller, pos_y)
+        yield from null()
+
+    def move_and_do(
+            self,
+            rows: pd.DataFrame,
+            plan: Union[int, str],
+            wait_times: Union[float, List[float]] = 0.,
+            wait_at_first: bool = False
+    ) -> List[Generator]:
+        """
+        Move to the selected samples and conduct the plan on them one by one using the positions in the table.
+
+        Parameters
+        ----------
+        rows
+            The selected rows from `select_samples`.
+        plan
+            The plan index or plan name key.
+        wait_times
+            The wait time for all the samples.
+        wait_at_first
+            Whether to wait before the plan is conducted for the first samples.
+
+        Returns
+        -------
+        plans
+            A list of the bluesky plans. See `move_and_do_many`.
+        """
+        sps = [(int(i), plan) for i in rows.index]
+        return move_and_do_many(
+            self._bt, sps,
+            wait_times=wait_times,
+            wait_at_first=wait_at_first,
+            sample_x=self._pos_key[0], sample_y=self._pos_key[1],
+            positions=self.table.positions(rows)
+        )
@@ -0,0 +1,340 @@
+"""Compile a plan into a message program which can be previewed, saved and run many times.
+
+A plan is a one-shot generator. `compile_plan` runs it once on a `~scanplans.sim.SimBeamline` and records the
+messages: the command, the name of the object, the arguments and the run boundaries. The `CompiledPlan` can then
+be summarized, estimated, compared with another version, saved to a JSON file and replayed as many times as
+needed without building the plan again.
+
+The readbacks during the compilation come from the simulator. If the plan reads a device outside of an event,
+e.g. `bps.rd`, the later messages may depend on the value and the program is marked as readback dependent. Such a
+program is rebuilt from its factory when it is run. If there is no factory, e.g. it is loaded from a file, the
+recorded messages are replayed as they are.
+
+The plans which compute the sleeps from the clock, e.g. `count` with a delay or `~scanplans.tools.cadence_count`,
+record the sleeps and the jitters on the virtual clock of the simulator, which are wrong in a real run. Such a
+program is marked as clock dependent and is always rebuilt from its factory when it is run. Without a factory, it
+can be previewed and estimated but not run.
+"""
+import difflib
+import json
+import re
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, Generator, List, Mapping, Tuple, Union
+
+import numpy as np
+from bluesky import Msg
+
+from scanplans.sim import SimBeamline, SimResult
+
+__all__ = [
+    "CompiledPlan",
+    "compile_plan"
+]
+DEVICE_KEY = "__device__"
+REPR_KEY = "__repr__"
+CALLBACK_COMMANDS = ("subscribe", "unsubscribe")
+VOLATILE_KEYS = ("sp_uid",)
+
+
+class CompiledPlan:
+    """
+    A recorded message program of a plan.
+
+    Attributes
+    ----------
+    messages
+        The messages in order.
+    runs
+        The (start, stop) indexes of the open_run and close_run messages of each run.
+    readbacks
+        The names of the devices read outside of events during the compilation.
+    clock_dependent
+        True if the plan slept after reading the clock during the compilation, i.e. it may compute its sleeps from
+        the clock.
+    factory
+        A function which builds the plan again. It is used if the program is readback or clock dependent.
+    devices
+        The devices in the messages by the name.
+    plan_result
+        The return value of the plan during the compilation.
+    _tokens
+        The tokens of the subscriptions during the compilation by the index of the message.
+    """
+
+    def __init__(self, messages: List[Msg], factory: Callable[[], Generator] = None, readbacks: List[str] = None,
+                 plan_result: Any = None, tokens: Dict[int, Any] = None, clock_dependent: bool = False):
+        self.messages = messages
+        self.factory = factory
+        self.readbacks = readbacks if readbacks else []
+        self.clock_dependent = clock_dependent
+        self.plan_result = plan_result
+        self._tokens = tokens if tokens else {}
+        self.runs = _find_runs(messages)
+        self.devices = {msg.obj.name: msg.obj for msg in messages if msg.obj is not None}
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __iter__(self):
+        return self.plan()
+
+    @property
+    def readback_dependent(self) -> bool:
+        """True if the plan read any device outside of events during the compilation."""
+        return bool(self.readbacks)
+
+    def plan(self) -> Generator:
+        """
+        Get a new plan to run. It is built by the factory if the program is readback or clock dependent and there
+        is a factory. Otherwise, it replays the recorded messages.
+
+        Returns
+        -------
+        plan
+            The message generator.
+
+        Raises
+        ------
+        ValueError
+            If the program is clock dependent and there is no factory.
+        """
+        if (self.readback_dependent or self.clock_dependent) and self.factory is not None:
+            return self.factory()
+        if self.clock_dependent:
+            raise ValueError(
+                "The plan computes its sleeps from the clock and the recorded ones are from the simulator. "
+                "Compile it from a function which builds the plan to run it."
+            )
+        return self.replay()
+
+    def replay(self) -> Generator:
+        """Yield the recorded messages. The tokens of the subscriptions are the ones returned by the RunEngine. The
+        volatile metadata, e.g. 'sp_uid', gets new values in each replay. The runs which shared a value share the
+        new one."""
+        tokens = {}
+        uids = {}
+        for i, msg in enumerate(self.messages):
+            if msg.command == "unsubscribe":
+                msg = msg._replace(
+                    args=tuple(tokens.get(arg, arg) for arg in msg.args),
+                    kwargs={k: tokens.get(v, v) if k == "token" else v for k, v in msg.kwargs.items()}
+                )
+            elif msg.command == "open_run":
+                kwargs = dict(msg.kwargs)
+                for key in VOLATILE_KEYS:
+                    if key in kwargs:
+                        kwargs[key] = uids.setdefault(kwargs[key], str(uuid.uuid4()))
+                msg = msg._replace(kwargs=kwargs)
+            response = yield msg
+            if i in self._tokens:
+                tokens[self._tokens[i]] = response
+        return self.plan_result
+
+    def estimate(self, sim: SimBeamline = None) -> SimResult:
+        """Run the recorded messages on the simulator. Default a SimBeamline without latency models."""
+        sim = sim if sim is not None else SimBeamline()
+        return sim.run(self.replay())
+
+    def summarize(self) -> str:
+        """Summarize the runs, the events, the devices moved and the time of sleep."""
+        commands = Counter(msg.command for msg in self.messages)
+        lines = [f"{len(self.messages)} messages in {len(self.runs)} run(s), {commands['save']} event(s)."]
+        for k, (start, stop) in enumerate(self.runs):
+            md = self.messages[start].kwargs
+            events = sum(msg.command == "save" for msg in self.messages[start:stop + 1])
+            lines.append(f"Run {k}: {md.get('sp_plan_name', md.get('plan_name', ''))} with {events} event(s).")
+        moved = sorted({msg.obj.name for msg in self.messages if msg.command == "set"})
+        lines.append(f"Set: {', '.join(moved)}.")
+        lines.append(f"Sleep: {sum(msg.args[0] for msg in self.messages if msg.command == 'sleep')} s.")
+        if self.readback_dependent:
+            lines.append(f"Readback dependent on: {', '.join(sorted(set(self.readbacks)))}.")
+        if self.clock_dependent:
+            lines.append("Clock dependent: the sleeps are computed from the clock.")
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.summarize()
+
+    def lines(self) -> List[str]:
+        """Get one line of text per message. The uids are replaced by their order of appearance and the memory
+        addresses are removed so that two compilations of the same plan give the same lines."""
+        names = {}
+        lines = []
+        for msg in self.messages:
+            kwargs = _encode(msg.kwargs, self.devices)
+            for key in VOLATILE_KEYS:
+                if key in kwargs:
+                    kwargs[key] = "<uid>"
+            if kwargs.get("group") is not None:
+                kwargs["group"] = names.setdefault(kwargs["group"], f"<group {len(names)}>")
+            obj = msg.obj.name if msg.obj is not None else None
+            args = json.dumps(_encode(msg.args, self.devices), sort_keys=True)
+            line = f"{msg.command} {obj} {args} {json.dumps(kwargs, sort_keys=True)}"
+            lines.append(re.sub(r" at 0x[0-9a-fA-F]+", "", line))
+        return lines
+
+    def diff(self, other: "CompiledPlan") -> List[str]:
+        """Get the unified diff of the messages from the other program to this program."""
+        return list(difflib.unified_diff(other.lines(), self.lines(), "other", "this", lineterm=""))
+
+    def to_dict(self) -> dict:
+        """Convert the program to a dictionary which can be dumped to JSON."""
+        return {
+            "messages": [
+                {
+                    "command": msg.command,
+                    "obj": msg.obj.name if msg.obj is not None else None,
+                    "args": _encode(msg.args, self.devices),
+                    "kwargs": _encode(msg.kwargs, self.devices)
+                }
+                for msg in self.messages
+            ],
+            "readbacks": self.readbacks,
+            "clock_dependent": self.clock_dependent,
+            "tokens": [[i, token] for i, token in self._tokens.items()],
+            "plan_result": _encode(self.plan_result, self.devices)
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, devices: Mapping[str, Any]) -> "CompiledPlan":
+        """
+        Build the program from the dictionary of `to_dict`.
+
+        Parameters
+        ----------
+        data
+            The dictionary.
+        devices
+            The devices by the name. All the devices in the messages must be in it.
+
+        Returns
+        -------
+        compiled
+            The program. The subscriptions of callbacks are dropped because callbacks are not saved.
+        """
+        names = {m["obj"] for m in data["messages"] if m["obj"] is not None}
+        missing = names - set(devices)
+        if missing:
+            raise ValueError(f"Missing devices: {', '.join(sorted(missing))}.")
+        messages = []
+        for m in data["messages"]:
+            if m["command"] in CALLBACK_COMMANDS:
+                continue
+            args = _decode(m["args"], devices)
+            kwargs = _decode(m["kwargs"], devices)
+            obj = devices[m["obj"]] if m["obj"] is not None else None
+            messages.append(Msg(m["command"], obj, *args, **kwargs))
+        return cls(
+            messages, readbacks=data["readbacks"], plan_result=data["plan_result"],
+            clock_dependent=data.get("clock_dependent", False)
+        )
+
+    def save(self, filename: str):
+        """Save the program in a JSON file."""
+        with open(filename, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    @classmethod
+    def load(cls, filename: str, devices: Mapping[str, Any]) -> "CompiledPlan":
+        """Load the program from a JSON file. See `from_dict`."""
+        with open(filename, "r") as f:
+            return cls.from_dict(json.load(f), devices)
+
+
+def compile_plan(plan: Union[Generator, Callable[[], Generator]], sim: SimBeamline = None) -> CompiledPlan:
+    """
+    Run the plan on a simulator and record the messages.
+
+    Parameters
+    ----------
+    plan
+        A plan or a function without arguments which returns a plan, e.g. `ScanPlan.factory`. If it is a function,
+        it is used to build the plan again when the program is readback or clock dependent.
+    sim
+        The simulator which responds to the messages. Default a SimBeamline without latency models.
+
+    Returns
+    -------
+    compiled
+        The program of the plan.
+
+    Examples
+    --------
+    Preview the plan and run the same plan twice.
+    >>> compiled = compile_plan(lambda: gridScan(dets, 'wandaHY1_sample.xlsx', wait_time=5))
+    >>> print(compiled)
+    >>> xrun({}, compiled.plan())
+    >>> xrun({}, compiled.plan())
+    """
+    factory = plan if callable(plan) else None
+    gen = plan() if factory is not None else plan
+    sim = sim if sim is not None else SimBeamline()
+    messages, readbacks, tokens = [], [], {}
+    in_event = clock_dependent = False
+    response = None
+    with sim.virtual_time() as clock:
+        try:
+            while True:
+                msg = gen.send(response)
+                messages.append(msg)
+                if msg.command == "create":
+                    in_event = True
+                elif msg.command in ("save", "drop"):
+                    in_event = False
+                elif msg.command in ("read", "locate") and not in_event:
+                    readbacks.append(msg.obj.name)
+                elif msg.command == "sleep" and clock.calls > 0:
+                    clock_dependent = True
+                response = sim.respond(msg)
+                if msg.command == "subscribe":
+                    tokens[len(messages) - 1] = response
+        except StopIteration as stop:
+            plan_result = stop.value
+    return CompiledPlan(
+        messages, factory=factory, readbacks=readbacks, plan_result=plan_result, tokens=tokens,
+        clock_dependent=clock_dependent
+    )
+
+
+def _find_runs(messages: List[Msg]) -> List[Tuple[int, int]]:
+    """Find the indexes of the open_run and close_run messages."""
+    runs, start = [], None
+    for i, msg in enumerate(messages):
+        if msg.command == "open_run":
+            start = i
+        elif msg.command == "close_run" and start is not None:
+            runs.append((start, i))
+            start = None
+    return runs
+
+
+def _encode(value: Any, devices: Mapping[str, Any]) -> Any:
+    """Convert the value to the types of JSON. The devices become their names."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [_encode(v, devices) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _encode(v, devices) for k, v in value.items()}
+    name = getattr(value, "name", None)
+    if isinstance(name, str) and devices.get(name) is value:
+        return {DEVICE_KEY: name}
+    return {REPR_KEY: repr(value)}
+
+
+def _decode(value: Any, devices: Mapping[str, Any]) -> Any:
+    """Convert the value from `_encode` back. The objects which are only saved by the repr cannot be restored."""
+    if isinstance(value, list):
+        return [_decode(v, devices) for v in value]
+    if isinstance(value, dict):
+        if DEVICE_KEY in value:
+            return devices[value[DEVICE_KEY]]
+        if REPR_KEY in value:
+            raise ValueError(f"Cannot restore the object {value[REPR_KEY]}.")
+        return {k: _decode(v, devices) for k, v in value.items()}
+    return value
@@ -0,0 +1,84 @@
+"""The configuration which the plans read, passed explicitly instead of the process-global state of xpdacq.
+
+The plans read the devices in `xpd_configuration`, the settings in `glbl` and the shutter values in
+`XPD_SHUTTER_CONF`. A `PlanContext` holds its own version of each of them. The parts which are not given fall back
+to the globals so that `PlanContext()` is the same as not passing a context. The plans accept it by the argument
+`context`, e.g. `ttseries(dets, 300, 10, 5, 10, context=PlanContext(glbl={'frame_acq_time': 0.2}))`. See
+`scanplans.variants` to simulate many variants in parallel.
+"""
+import typing as tp
+from collections import ChainMap
+
+from scanplans._lazy import lazy_import
+
+xpd_configuration = lazy_import("xpdacq.xpdacq_conf", "xpd_configuration")
+glbl = lazy_import("xpdacq.glbl", "glbl")
+XPD_SHUTTER_CONF = lazy_import("xpdconf.conf", "XPD_SHUTTER_CONF")
+
+__all__ = [
+    "PlanContext",
+    "resolve_context"
+]
+
+
+class PlanContext:
+    """
+    The configuration of a plan. Each part is a mapping. The keys which are not in a given part are looked up in
+    the global one.
+
+    Attributes
+    ----------
+    configuration
+        The devices, e.g. {'area_det': pe1c, 'shutter': shctl1}. Falls back to `xpd_configuration`.
+    glbl
+        The settings, e.g. {'frame_acq_time': 0.1, 'shutter_sleep': 0.}. Falls back to `glbl` of xpdacq.
+    shutter_conf
+        The values to open and close the shutter, e.g. {'open': 60, 'close': 0}. Falls back to
+        `XPD_SHUTTER_CONF`.
+
+    Examples
+    --------
+    Simulate the plan with a slower frame rate without changing the global configuration.
+    >>> context = PlanContext(glbl={'frame_acq_time': 0.5})
+    >>> sim.run(ttseries([], 300, 10, 5, 10, context=context))
+    """
+
+    def __init__(self, configuration: tp.Mapping[str, tp.Any] = None, glbl: tp.Mapping[str, tp.Any] = None,
+                 shutter_conf: tp.Mapping[str, tp.Any] = None):
+        self._configuration = dict(configuration) if configuration else {}
+        self._glbl = dict(glbl) if glbl else {}
+        self._shutter_conf = dict(shutter_conf) if shutter_conf else {}
+
+    @property
+    def configuration(self) -> tp.Mapping[str, tp.Any]:
+        return ChainMap(self._configuration, xpd_configuration) if self._configuration else xpd_configuration
+
+    @property
+    def glbl(self) -> tp.Mapping[str, tp.Any]:
+        return ChainMap(self._glbl, glbl) if self._glbl else glbl
+
+    @property
+    def shutter_conf(self) -> tp.Mapping[str, tp.Any]:
+        return ChainMap(self._shutter_conf, XPD_SHUTTER_CONF) if self._shutter_conf else XPD_SHUTTER_CONF
+
+    def replace(self, configuration: tp.Mapping[str, tp.Any] = None, glbl: tp.Mapping[str, tp.Any] = None,
+                shutter_conf: tp.Mapping[str, tp.Any] = None) -> "PlanContext":
+        """A new context with the keys updated, e.g. `context.replace(glbl={'shutter_sleep': 0.5})`."""
+        return PlanContext(
+            dict(self._configuration, **(configuration or {})),
+            dict(self._glbl, **(glbl or {})),
+            dict(self._shutter_conf, **(shutter_conf or {}))
+        )
+
+    def __repr__(self):
+        parts = [
+            f"{name}={value!r}" for name, value in
+            (("configuration", self._configuration), ("glbl", self._glbl), ("shutter_conf", self._shutter_conf))
+            if value
+        ]
+        return f"PlanContext({', '.join(parts)})"
+
+
+def resolve_context(context: tp.Optional[PlanContext] = None) -> PlanContext:
+    """The context, or the one which reads the globals if it is None."""
+    return context if context is not None else PlanContext()
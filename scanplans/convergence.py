@@ -0,0 +1,96 @@
+"""Decide when a time series has stopped changing."""
+import typing as tp
+
+import numpy as np
+
+__all__ = [
+    "Convergence",
+    "relative_change"
+]
+
+
+def relative_change(previous: np.ndarray, current: np.ndarray) -> float:
+    """The change `sum|current - previous| / sum|previous|` between two frames or reduced patterns. NaN if the
+    shapes differ or the previous one is all zero."""
+    previous = np.asarray(previous, dtype=float)
+    current = np.asarray(current, dtype=float)
+    if previous.shape != current.shape:
+        return np.nan
+    norm = np.abs(previous).sum()
+    return float(np.abs(current - previous).sum() / norm) if norm > 0 else np.nan
+
+
+class Convergence:
+    """
+    A criterion to end a series after a number of consecutive frames which change less than a threshold.
+
+    Attributes
+    ----------
+    threshold
+        The relative change between consecutive frames below which a frame is static. See `relative_change`.
+    consecutive
+        The number of consecutive static frames to end the series.
+    min_duration
+        The time from the first frame in second before the series can end.
+    reducer
+        A function from the readings of a frame to an array, e.g. the integrated pattern. The area detectors save
+        the image in files and only put a datum id in the reading so the reducer has to load the image or read a
+        reduced signal, e.g. the stats plugin of the detector.
+    changes
+        The change of each frame from the previous one. The first one is NaN.
+    num_static
+        The number of consecutive static frames up to the last frame.
+    """
+
+    def __init__(self, threshold: float, reducer: tp.Callable[[dict], tp.Any], consecutive: int = 3,
+                 min_duration: float = 0.):
+        if consecutive < 1:
+            raise ValueError(f"The consecutive must be at least 1. It is {consecutive}.")
+        if not callable(reducer):
+            raise ValueError(f"The reducer must be a function from the readings to an array. It is {reducer!r}.")
+        self.threshold = threshold
+        self.reducer = reducer
+        self.consecutive = int(consecutive)
+        self.min_duration = min_duration
+        self.changes = []  # type: tp.List[float]
+        self.num_static = 0
+        self._previous = None
+
+    def reset(self):
+        """Forget the frames."""
+        self.changes = []
+        self.num_static = 0
+        self._previous = None
+
+    def update(self, readings: tp.Optional[dict], elapsed: float) -> bool:
+        """
+        Add a frame.
+
+        Parameters
+        ----------
+        readings
+            The readings of the frame. None if it is not known, e.g. the plan is simulated.
+        elapsed
+            The time from the first frame in second.
+
+        Returns
+        -------
+        converged
+            True if the series can end after this frame.
+        """
+        current = self.reducer(readings) if readings is not None else None
+        if current is not None and not np.issubdtype(np.asarray(current).dtype, np.number):
+            raise ValueError(f"The reducer returns {current!r}, which is not numeric.")
+        change = np.nan
+        if self._previous is not None and current is not None:
+            change = relative_change(self._previous, current)
+        self._previous = current
+        self.changes.append(change)
+        # NaN is never below the threshold
+        self.num_static = self.num_static + 1 if change < self.threshold else 0
+        return self.num_static >= self.consecutive and elapsed >= self.min_duration
+
+    @property
+    def last_change(self) -> float:
+        """The change of the last frame."""
+        return self.changes[-1] if self.changes else np.nan
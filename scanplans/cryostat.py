@@ -20,19 +20,38 @@ and 60 s respectively.
     We don't need to worry about the samples information because it will be added into metadata by this plan so
     the first positional argument of 'xrun' is given a empty dictionary. """
 import uuid
-from typing import List
+from functools import lru_cache
+from typing import List, Sequence, Tuple, Union
 
+import numpy as np
 from bluesky.callbacks import LiveTable
-from bluesky.plan_stubs import mv, abs_set, checkpoint
+from bluesky.plan_stubs import mv, abs_set, checkpoint, rd, trigger_and_read
 from bluesky.plans import count
-from bluesky.preprocessors import subs_wrapper
-from xpdacq.beamtime import _configure_area_det
-from xpdacq.xpdacq_conf import xpd_configuration
+from bluesky.preprocessors import run_wrapper, subs_wrapper
+
+import scanplans.singlerun as sr
+import scanplans.tools as tl
+from scanplans.autoexposure import AutoExposure
+from scanplans.context import PlanContext, resolve_context
+from scanplans.frametime import DetectorModel, optimize_frame_time
+from scanplans.mdgetters import translate_to_sample
+from scanplans.monitor import monitor_during
+
+DEFAULT_TEMP_TO_POWER = {
+    (0., 30.): 1,
+    (30., 100.): 2,
+    (100., float("inf")): 3
+}
+ORDERS = ("ascending", "descending", "shortest")
 
 
 def cryostat_plan(bt: object, temp_motor: object, temperatures: List[float], posi_motor: object,
                   positions: List[float],
-                  samples: List[int], exposures: List[float], temp_to_power: dict = None):
+                  samples: List[int], exposures: List[Union[float, AutoExposure]], temp_to_power: dict = None,
+                  preflight: bool = False,
+                  detector_model: DetectorModel = None, max_frame_times: int = 1, monitor_rate: float = None,
+                  monitor_decimation: int = 1, monitor_signals: list = None, context: PlanContext = None,
+                  single_run: bool = False, order: str = None):
     """
     The scanplan of cryostat measurement.
 
@@ -56,34 +75,161 @@ def cryostat_plan(bt: object, temp_motor: object, temperatures: List[float], pos
         samples : List[int]
             A list of index of samples in bt.
 
-        exposures : List[float]
-            A list of exposure time.
+        exposures : List[float or AutoExposure]
+            A list of exposure time. An AutoExposure takes a probe frame of the sample at each temperature and
+            chooses the exposure.
 
         temp_to_power : dict
             A mapping from temperature range to power. The range is open at left and close at right. If None,
             default setting (see function 'get_heater_range') is used. Default None.
 
+        preflight : bool
+            Whether to check all the temperatures and samples before yielding any message. If True, a ValueError
+            listing all the issues is raised. See `~scanplans.preflight.preflight_cryostat`. Default False.
+
+        detector_model : DetectorModel
+            The timing model of the area detector. If not None, the frame time and number of frames of all the
+            exposures are chosen together by `~scanplans.frametime.optimize_frame_time` instead of using
+            glbl['frame_acq_time']. Default None.
+
+        max_frame_times : int
+            The maximum number of distinct frame times when detector_model is not None. Default 1.
+
+        monitor_rate : float
+            The number of times per second to poll the temperature controller in the stream 'temperature_monitor'
+            of each run. Each temperature ramp is also recorded in a run of its own so that the temperature is
+            monitored from the start of the ramp to the end of the last count at the temperature, except for the
+            sample motions. See `ramp_temperature`. If None, there is no monitor. Default None.
+
+        monitor_decimation : int
+            The number of polls averaged into one event in the monitor stream. Default 1.
+
+        monitor_signals : list
+            The signals to poll, e.g. the heater output. Default the temperature controller.
+
+        context : PlanContext
+            The configuration to read the area detector, the shutter and glbl from. See
+            `~scanplans.context.PlanContext`. Default the globals.
+
+        single_run : bool
+            Whether to record all the temperatures and samples in one run instead of a run for each ramp and each
+            sample. The runs become the samples of the run. See `~scanplans.singlerun.single_run`. Default False.
+
+        order : str
+            The order to visit the temperatures. 'ascending' or 'descending' sweeps them in one direction.
+            'shortest' sweeps them from the end closer to the current temperature, which is the shortest total
+            ramp and changes the heater range the fewest times. See `order_temperatures`. If None, the given
+            order. Default None.
+
     Yields
     ------
         Message of the plan
     """
+    if preflight:
+        from scanplans.preflight import preflight_cryostat
+        preflight_cryostat(
+            bt, temp_motor, temperatures, posi_motor, positions, samples, exposures, temp_to_power, context=context
+        ).raise_for_issues()
+    if not (len(positions) == len(samples) and len(samples) == len(exposures)):
+        raise ValueError("Unmatched length of positions, samples and exposures: "
+                         f"{len(positions)}, {len(samples)}, {len(exposures)}.")
+    if order is not None and order not in ORDERS:
+        raise ValueError(f"Unknown order '{order}'. Expect one of {ORDERS}.")
+    heater_ranges = dict(zip(temperatures, get_heater_ranges(temperatures, temp_to_power)))
     samples = translate_to_sample(bt, samples)
-    for temperature in temperatures:
-        yield from set_power(temp_motor, temperature, temp_to_power)
+    if detector_model is not None:
+        fixed = [i for i, exposure in enumerate(exposures) if not isinstance(exposure, AutoExposure)]
+        exposures = list(exposures)
+        mds = optimize_frame_time([exposures[i] for i in fixed], detector_model, max_frame_times)
+        for i, md in zip(fixed, mds):
+            exposures[i] = md
+    signals = monitor_signals if monitor_signals else [temp_motor]
+
+    def measure():
+        setpoints = temperatures
+        if order is not None:
+            start = yield from rd(temp_motor, default_value=None)
+            setpoints = order_temperatures(temperatures, order, start)
+        # the heater range is only written when it changes
+        heater = None
+        if hasattr(temp_motor, "heater_range"):
+            heater = yield from rd(temp_motor.heater_range, default_value=None)
+        for temperature in setpoints:
+            if monitor_rate:
+                plan = ramp_temperature(temp_motor, temperature, temp_to_power, current=heater)
+                yield from monitor_during(plan, signals, monitor_rate, monitor_decimation)
+            else:
+                yield from set_power(temp_motor, temperature, temp_to_power, current=heater)
+                yield from checkpoint()
+                yield from mv(temp_motor, temperature)
+            heater = heater_ranges[temperature]
+            yield from checkpoint()
+            for position, sample, exposure in zip(positions, samples, exposures):
+                yield from mv(posi_motor, position)
+                yield from checkpoint()
+                if isinstance(exposure, AutoExposure):
+                    exposure = yield from exposure.probe(context=context)
+                plan = config_det_and_count([temp_motor, posi_motor], sample, exposure, context)
+                if monitor_rate:
+                    plan = monitor_during(plan, signals, monitor_rate, monitor_decimation)
+                yield from plan
+                yield from checkpoint()
+
+    plan = measure()
+    if single_run:
+        md = {
+            "sp_type": "cryostat",
+            "sp_uid": str(uuid.uuid4()),
+            "sp_plan_name": "cryostat_plan",
+            "sp_temperature_setpoints": list(temperatures),
+            "sp_temperature_order": order
+        }
+        plan = sr.single_run(plan, md=md)
+    yield from plan
+
+
+def ramp_temperature(temp_motor: object, temperature: float, temp_to_power: dict = None, md: dict = None,
+                     current: object = None):
+    """
+    Set the heater range and the temperature in a run. The primary stream has one reading of the temperature
+    controller after it arrives. Wrap it in `~scanplans.monitor.monitor_during` to record the ramp.
+
+    Parameters
+    ----------
+    temp_motor : object
+        The controller of temperature.
+    temperature : float
+        The temperature setpoint.
+    temp_to_power : dict
+        A mapping from temperature range to power. See `set_power`. Default None.
+    md : dict
+        The metadata of the run.
+    current : object
+        The heater range already set. See `set_power`. Default None.
+
+    Yields
+    -------
+        Message to ramp the temperature in a run.
+
+    """
+    _md = {
+        "sp_type": "cryostat_ramp",
+        "sp_uid": str(uuid.uuid4()),
+        "sp_plan_name": "cryostat_ramp",
+        "sp_temperature_setpoint": temperature
+    }
+    _md.update(md or {})
+
+    def inner():
+        yield from set_power(temp_motor, temperature, temp_to_power, current=current)
         yield from checkpoint()
         yield from mv(temp_motor, temperature)
-        yield from checkpoint()
-        if not (len(positions) == len(samples) and len(samples) == len(exposures)):
-            raise ValueError("Unmatched length of positions, samples and exposures: "
-                             f"{len(positions)}, {len(samples)}, {len(exposures)}.")
-        for position, sample, exposure in zip(positions, samples, exposures):
-            yield from mv(posi_motor, position)
-            yield from checkpoint()
-            yield from config_det_and_count([temp_motor, posi_motor], sample, exposure)
-            yield from checkpoint()
+        yield from trigger_and_read([temp_motor])
+
+    return (yield from run_wrapper(inner(), md=_md))
 
 
-def set_power(temp_motor: object, temperature: float, temp_to_power: dict = None):
+def set_power(temp_motor: object, temperature: float, temp_to_power: dict = None, current: object = None):
     """
     Set powder of heater according to the temperature.
 
@@ -96,17 +242,74 @@ def set_power(temp_motor: object, temperature: float, temp_to_power: dict = None
     temp_to_power : dict
         A mapping from temperature range to power. The range is open at left and close at right. If None, default
         setting (see function 'get_heater_range') is used. Default None.
+    current : object
+        The heater range already set, e.g. read from the controller or set for the last setpoint. The heater range
+        is only set if it is different. If None, it is always set. Default None.
 
     Yields
     -------
         Message to set the heater range.
 
+    Returns
+    -------
+    heater_value
+        The heater range of the temperature.
+
     """
     heater_value = get_heater_range(temperature, temp_to_power)
-    if hasattr(temp_motor, 'heater_range'):
-        yield from abs_set(temp_motor.heater_range, heater_value)
-    else:
+    if not hasattr(temp_motor, 'heater_range'):
         raise AttributeError(f"The temp_motor {temp_motor.name} does not have attribute 'heater_range'.")
+    if current is None or current != heater_value:
+        yield from abs_set(temp_motor.heater_range, heater_value)
+    return heater_value
+
+
+@lru_cache(maxsize=32)
+def _heater_table(items: Tuple[Tuple[Tuple[float, float], object], ...]) -> Tuple[np.ndarray, ...]:
+    """The lower bounds, upper bounds and heater values of the ranges sorted by the upper bound."""
+    lower = np.array([temp_range[0] for temp_range, _ in items], dtype=float)
+    upper = np.array([temp_range[1] for temp_range, _ in items], dtype=float)
+    values = np.empty(len(items), dtype=object)
+    values[:] = [value for _, value in items]
+    order = np.argsort(upper, kind="stable")
+    lower, upper, values = lower[order], upper[order], values[order]
+    if np.any(lower[1:] < upper[:-1]):
+        raise ValueError(f"The temperature ranges overlap: {[temp_range for temp_range, _ in items]}.")
+    return lower, upper, values
+
+
+def get_heater_ranges(temperatures: Sequence[float], temp_to_power: dict = None,
+                      strict: bool = True) -> np.ndarray:
+    """
+    Decide the heater ranges of all the temperatures at once by a binary search in the sorted ranges.
+
+    Parameters
+    ----------
+    temperatures : Sequence[float]
+        The temperature setpoints.
+    temp_to_power : dict
+        A mapping from temperature range to power. The range is open at left and close at right. The ranges must
+        not overlap. If None, DEFAULT_TEMP_TO_POWER is used. Default None.
+    strict : bool
+        Whether to raise a ValueError if a temperature is in no range. If False, its heater range is None.
+
+    Returns
+    -------
+    heater_values : np.ndarray
+        The value of heater range of each temperature.
+
+    """
+    temp_to_power = temp_to_power if temp_to_power else DEFAULT_TEMP_TO_POWER
+    lower, upper, values = _heater_table(tuple(temp_to_power.items()))
+    temps = np.asarray(temperatures, dtype=float).reshape(-1)
+    # the first range whose upper bound is not below the temperature
+    index = np.minimum(np.searchsorted(upper, temps, side="left"), len(upper) - 1)
+    covered = (temps > lower[index]) & (temps <= upper[index])
+    if strict and not np.all(covered):
+        raise ValueError(f'Cannot find the heater range setting for the temperature {temps[~covered][0]} K.')
+    result = np.empty(len(temps), dtype=object)
+    result[covered] = values[index[covered]]
+    return result
 
 
 def get_heater_range(temperature: float, temp_to_power: dict = None):
@@ -127,20 +330,40 @@ def get_heater_range(temperature: float, temp_to_power: dict = None):
         The value of heater range. For cryostat, it is 1, 2, 3.
 
     """
-    default_setting = {
-        (0., 30.): 1,
-        (30., 100.): 2,
-        (100., float("inf")): 3
-    }
-    temp_to_power = temp_to_power if temp_to_power else default_setting
-    for temp_range, heater_value in temp_to_power.items():
-        if temp_range[0] < temperature <= temp_range[1]:
-            return heater_value
-    else:
-        raise ValueError(f'Cannot find the heater range setting for the temperature {temperature} K.')
+    return get_heater_ranges([temperature], temp_to_power)[0]
 
 
-def config_det_and_count(motors: List[object], sample_md: dict, exposure: float):
+def order_temperatures(temperatures: Sequence[float], order: str, start: float = None) -> List[float]:
+    """
+    Reorder the temperature setpoints.
+
+    Parameters
+    ----------
+    temperatures : Sequence[float]
+        The temperature setpoints.
+    order : str
+        'ascending', 'descending' or 'shortest'. 'shortest' sweeps from the end closer to the start, which gives
+        the least total change of the temperature from the start and visits each heater range once.
+    start : float
+        The current temperature. If None, 'shortest' is 'ascending'.
+
+    Returns
+    -------
+    temperatures : List[float]
+        The reordered setpoints. The equal setpoints stay next to each other.
+
+    """
+    if order not in ORDERS:
+        raise ValueError(f"Unknown order '{order}'. Expect one of {ORDERS}.")
+    ascending = sorted(temperatures)
+    if order == "shortest" and start is not None and ascending:
+        descend = abs(float(start) - ascending[-1]) < abs(float(start) - ascending[0])
+        return ascending[::-1] if descend else ascending
+    return ascending[::-1] if order == "descending" else ascending
+
+
+def config_det_and_count(motors: List[object], sample_md: dict, exposure: Union[float, dict],
+                         context: PlanContext = None):
     """
     Take one reading from area detector with given exposure time and motors. Save the motor reading results in
     the start document.
@@ -152,7 +375,9 @@ def config_det_and_count(motors: List[object], sample_md: dict, exposure: float)
     sample_md
         The metadata of the sample.
     exposure
-        The exposure time in seconds.
+        The exposure time in seconds or the metadata of the detector configuration from optimize_frame_time.
+    context
+        The configuration to read the area detector and glbl from. Default the globals.
 
     Yields
     -------
@@ -161,15 +386,23 @@ def config_det_and_count(motors: List[object], sample_md: dict, exposure: float)
     """
     # setting up area_detector
     _md = {}
-    num_frame, acq_time, computed_exposure = yield from _configure_area_det(exposure)
-    area_det = xpd_configuration["area_det"]
+    context = resolve_context(context)
+    area_det = context.configuration["area_det"]
+    if isinstance(exposure, dict):
+        yield from tl.configure_area_det(area_det, exposure)
+        expo_md = exposure
+    else:
+        num_frame, acq_time, computed_exposure = yield from tl.configure_exposure(exposure, context)
+        expo_md = {
+            "sp_time_per_frame": acq_time,
+            "sp_num_frames": num_frame,
+            "sp_requested_exposure": exposure,
+            "sp_computed_exposure": computed_exposure
+        }
     # update md
     _md.update(**sample_md)
+    _md.update(**expo_md)
     plan_md = {
-        "sp_time_per_frame": acq_time,
-        "sp_num_frames": num_frame,
-        "sp_requested_exposure": exposure,
-        "sp_computed_exposure": computed_exposure,
         "sp_type": "cryostat",
         "sp_uid": str(uuid.uuid4()),
         "sp_plan_name": "cryostat"
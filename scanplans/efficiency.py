@@ -0,0 +1,189 @@
+"""Report how efficiently the beam time was used from the documents of the runs.
+
+The documents are read from JSON lines or msgpack files, e.g. written by suitcase-jsonl or suitcase-msgpack, or
+from any iterable of (name, doc) pairs, e.g. `run.documents()` of a databroker catalog. `run_table` reduces them to
+one row per run and `efficiency_report` aggregates the rows by the plan and the hour with vectorized operations so
+that thousands of runs take seconds. Run it from the command line to print the report of the files.
+
+    'python -m scanplans.efficiency runs/*.msgpack'
+
+The time of a run is split into the beam on time, the number of readings times the computed exposure, the setup
+before the first reading, the step overhead between the readings, e.g. the moves, the waits and the shutter, and
+the teardown after the last reading. The dead time of a run is the time from the end of the previous run.
+"""
+from __future__ import annotations
+
+import glob
+import json
+import os
+import sys
+import typing as tp
+
+import numpy as np
+
+from scanplans._lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+__all__ = [
+    "read_documents",
+    "run_table",
+    "efficiency_report"
+]
+START_KEYS = {
+    "sp_plan_name": "plan",
+    "sp_uid": "sp_uid",
+    "sp_requested_exposure": "requested_exposure",
+    "sp_computed_exposure": "computed_exposure"
+}
+
+
+def read_documents(*paths: str) -> tp.Iterator[tp.Tuple[str, dict]]:
+    """
+    Read the (name, doc) pairs from the files. A '.jsonl' file has a JSON list [name, doc] per line. A '.msgpack'
+    file has a sequence of them. A directory is read file by file.
+
+    Parameters
+    ----------
+    paths
+        The paths of the files or directories. Glob patterns are expanded.
+
+    Yields
+    ------
+    name, doc
+        The name and the document.
+    """
+    for pattern in paths:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            if os.path.isdir(path):
+                yield from read_documents(*[os.path.join(path, name) for name in sorted(os.listdir(path))])
+            elif path.endswith(".jsonl"):
+                with open(path) as f:
+                    for line in f:
+                        if line.strip():
+                            name, doc = json.loads(line)
+                            yield name, doc
+            elif path.endswith(".msgpack"):
+                import msgpack
+                with open(path, "rb") as f:
+                    for name, doc in msgpack.Unpacker(f, raw=False, strict_map_key=False):
+                        yield name, doc
+            else:
+                raise ValueError(f"Unknown file '{path}'. Expect '.jsonl' or '.msgpack'.")
+
+
+def run_table(documents: tp.Iterable[tp.Tuple[str, dict]], stream: str = "primary") -> pd.DataFrame:
+    """
+    Reduce the documents to one row per run.
+
+    Parameters
+    ----------
+    documents
+        The (name, doc) pairs of the runs in any order. The 'event_page' documents are also counted.
+    stream
+        The name of the stream of the readings.
+
+    Returns
+    -------
+    runs
+        A pandas table sorted by the start time with the columns 'uid', 'plan', the 'sp_plan_name' or else the
+        'plan_name', 'sp_uid', 'start', 'stop', 'exit_status', 'num_readings', 'first_reading', 'last_reading',
+        'requested_exposure' and 'computed_exposure' per reading in second. The runs without a stop document are
+        dropped.
+    """
+    starts, stops, descriptors = [], [], {}
+    event_descriptors, event_times = [], []
+    for name, doc in documents:
+        if name == "start":
+            row = {"uid": doc["uid"], "start": doc["time"], "plan": doc.get("plan_name")}
+            row.update((column, doc[key]) for key, column in START_KEYS.items() if doc.get(key) is not None)
+            starts.append(row)
+        elif name == "stop":
+            stops.append({"uid": doc["run_start"], "stop": doc["time"], "exit_status": doc.get("exit_status")})
+        elif name == "descriptor":
+            if doc.get("name", "primary") == stream:
+                descriptors[doc["uid"]] = doc["run_start"]
+        elif name == "event":
+            event_descriptors.append(doc["descriptor"])
+            event_times.append(doc["time"])
+        elif name == "event_page":
+            event_descriptors.extend([doc["descriptor"]] * len(doc["time"]))
+            event_times.extend(doc["time"])
+    columns = ["uid", "plan", "sp_uid", "start", "requested_exposure", "computed_exposure"]
+    runs = pd.DataFrame(starts, columns=columns).merge(
+        pd.DataFrame(stops, columns=["uid", "stop", "exit_status"]), on="uid", how="inner"
+    )
+    events = pd.DataFrame({"descriptor": event_descriptors, "time": np.asarray(event_times, dtype=float)})
+    events["uid"] = events["descriptor"].map(descriptors)
+    readings = events.dropna(subset=["uid"]).groupby("uid")["time"].agg(["count", "min", "max"])
+    readings.columns = ["num_readings", "first_reading", "last_reading"]
+    runs = runs.merge(readings, left_on="uid", right_index=True, how="left")
+    runs["num_readings"] = runs["num_readings"].fillna(0).astype(int)
+    for column in ("requested_exposure", "computed_exposure"):
+        runs[column] = pd.to_numeric(runs[column], errors="coerce")
+    return runs.sort_values("start", ignore_index=True)
+
+
+def efficiency_report(runs: pd.DataFrame, by: tp.Sequence[str] = ("plan", "hour")) -> pd.DataFrame:
+    """
+    Aggregate the time of the runs by the plan and the hour.
+
+    Parameters
+    ----------
+    runs
+        The table from `run_table`.
+    by
+        The columns to group by: any of 'plan', 'hour', the hour of the start in UTC, and the columns of the runs.
+        An empty sequence gives one row for all the runs.
+
+    Returns
+    -------
+    report
+        A pandas table with a row per group and the columns 'runs', 'readings', 'elapsed', the run time plus the
+        dead time, 'beam_on', 'dead_time', 'setup', 'step_overhead', 'teardown', 'requested_exposure' and
+        'computed_exposure' in second, 'beam_on_fraction', 'exposure_ratio', computed over requested exposure,
+        and 'runs_per_hour'. The unknown exposures count as zero beam on time.
+    """
+    runs = runs.copy()
+    runs["hour"] = pd.to_datetime(runs["start"], unit="s", utc=True).dt.floor("h")
+    runs["plan"] = runs["plan"].fillna("unknown")
+    duration = runs["stop"] - runs["start"]
+    exposure = runs["computed_exposure"].fillna(0.)
+    n = runs["num_readings"]
+    has_readings = n > 0
+    runs["duration"] = duration
+    runs["dead_time"] = (runs["start"] - runs["stop"].shift()).clip(lower=0.).fillna(0.)
+    runs["elapsed"] = duration + runs["dead_time"]
+    runs["beam_on"] = n * exposure
+    runs["setup"] = np.where(has_readings, runs["first_reading"] - runs["start"], duration)
+    runs["step_overhead"] = np.where(
+        has_readings, runs["last_reading"] - runs["first_reading"] - (n - 1).clip(lower=0) * exposure, 0.
+    )
+    runs["teardown"] = np.where(has_readings, runs["stop"] - runs["last_reading"], 0.)
+    runs["requested_total"] = n * runs["requested_exposure"].fillna(0.)
+    runs["computed_total"] = runs["beam_on"]
+    sums = {
+        "runs": ("uid", "count"),
+        "readings": ("num_readings", "sum"),
+        "elapsed": ("elapsed", "sum"),
+        "beam_on": ("beam_on", "sum"),
+        "dead_time": ("dead_time", "sum"),
+        "setup": ("setup", "sum"),
+        "step_overhead": ("step_overhead", "sum"),
+        "teardown": ("teardown", "sum"),
+        "requested_exposure": ("requested_total", "sum"),
+        "computed_exposure": ("computed_total", "sum")
+    }
+    by = list(by)
+    keys = by if by else np.zeros(len(runs), dtype=int)
+    report = runs.groupby(keys, sort=True).agg(**sums).reset_index(drop=not by)
+    elapsed = report["elapsed"].where(report["elapsed"] > 0)
+    report["beam_on_fraction"] = report["beam_on"] / elapsed
+    report["exposure_ratio"] = report["computed_exposure"] / report["requested_exposure"].where(
+        report["requested_exposure"] > 0)
+    report["runs_per_hour"] = report["runs"] * 3600. / elapsed
+    return report
+
+
+if __name__ == "__main__":
+    print(efficiency_report(run_table(read_documents(*sys.argv[1:]))).to_string(index=False))
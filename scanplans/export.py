@@ -0,0 +1,285 @@
+"""Export the scalar event data and the key metadata of the runs to a columnar file while the events arrive.
+
+`ColumnarExporter` is a callback. It keeps at most `batch_size` rows in memory and appends them to a Parquet file,
+one row group per batch, or to the column datasets of an HDF5 file. The table is complete as soon as the last stop
+document arrives so that no header has to be read again after the scan. The Parquet backend needs `pyarrow` and
+the HDF5 backend needs `h5py`. They are imported only when the file is opened.
+"""
+from __future__ import annotations
+
+import json
+import os
+import typing as tp
+
+import numpy as np
+from bluesky.callbacks.core import CallbackBase
+
+from scanplans._lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+__all__ = [
+    "ColumnarExporter",
+    "DEFAULT_MD_KEYS"
+]
+DEFAULT_MD_KEYS = ("sample_name", "x-position", "y-position", "temperature", "scan_id", "plan_name")
+FORMATS = {".parquet": "parquet", ".pq": "parquet", ".h5": "hdf5", ".hdf5": "hdf5", ".hdf": "hdf5"}
+
+
+class ColumnarExporter(CallbackBase):
+    """
+    A callback which appends one row per event to a Parquet or HDF5 table.
+
+    Each row has the columns 'run_uid', 'stream', 'seq_num' and 'time', the metadata of the start document in
+    `md_keys` or starting with one of the `md_prefixes` and the data of the event whose shape is a scalar. The
+    lists and dictionaries in the metadata are saved as JSON strings. A column which first appears in a later run
+    is empty in the earlier rows. In a Parquet file, whose schema is fixed, such a column starts a new part file
+    '<stem>-<k>.parquet' next to the first one. `read` concatenates all the parts.
+
+    Attributes
+    ----------
+    filename
+        The path of the file. It is overwritten when the first batch is written.
+    format
+        'parquet' or 'hdf5'. Default from the extension of the filename.
+    batch_size
+        The number of rows kept in memory before they are written.
+    md_keys
+        The keys of the metadata to export.
+    md_prefixes
+        The prefixes of the keys of the metadata to export.
+    streams
+        The names of the event streams to export.
+    num_rows
+        The number of rows written.
+
+    Examples
+    --------
+    Export the results of the grid scan while it runs and read them at the end.
+    >>> exporter = ColumnarExporter('wandaHY1_spatial_scan.parquet')
+    >>> xrun(gridScan_sample, grid_plan, exporter)
+    >>> df = exporter.read()
+    >>> exporter.close()
+    """
+
+    def __init__(self, filename: str, format: str = None, batch_size: int = 1000,
+                 md_keys: tp.Sequence[str] = DEFAULT_MD_KEYS, md_prefixes: tp.Sequence[str] = ("sp_",),
+                 streams: tp.Sequence[str] = ("primary",)):
+        super(ColumnarExporter, self).__init__()
+        if format is None:
+            format = FORMATS.get(os.path.splitext(filename)[1].lower())
+        if format not in ("parquet", "hdf5"):
+            raise ValueError(f"Unknown format {format!r} of '{filename}'. Expect 'parquet' or 'hdf5'.")
+        if batch_size < 1:
+            raise ValueError(f"The batch_size must be at least 1. It is {batch_size}.")
+        self.filename = filename
+        self.format = format
+        self.batch_size = int(batch_size)
+        self.md_keys = tuple(md_keys)
+        self.md_prefixes = tuple(md_prefixes)
+        self.streams = tuple(streams)
+        self.num_rows = 0
+        self._md = {}  # type: tp.Dict[str, dict]
+        self._descriptors = {}  # type: tp.Dict[str, tuple]
+        self._rows = []  # type: tp.List[dict]
+        self._writer = None
+
+    def start(self, doc):
+        md = {"run_uid": doc["uid"]}
+        for key, value in doc.items():
+            if key in self.md_keys or key.startswith(self.md_prefixes):
+                md[key] = _to_scalar(value)
+        self._md[doc["uid"]] = md
+        return doc
+
+    def descriptor(self, doc):
+        name = doc.get("name", "primary")
+        if name in self.streams:
+            keys = [key for key, dk in doc["data_keys"].items() if not dk.get("shape") and not dk.get("external")]
+            self._descriptors[doc["uid"]] = (doc["run_start"], name, keys)
+        return doc
+
+    def event(self, doc):
+        descriptor = self._descriptors.get(doc["descriptor"])
+        if descriptor is None:
+            return doc
+        run_uid, name, keys = descriptor
+        row = dict(self._md.get(run_uid, {"run_uid": run_uid}))
+        row.update({"stream": name, "seq_num": doc["seq_num"], "time": doc["time"]})
+        row.update({key: _to_scalar(doc["data"][key]) for key in keys if key in doc["data"]})
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+        return doc
+
+    def stop(self, doc):
+        self.flush()
+        run_uid = doc["run_start"]
+        self._md.pop(run_uid, None)
+        for uid in [uid for uid, d in self._descriptors.items() if d[0] == run_uid]:
+            del self._descriptors[uid]
+        return doc
+
+    def flush(self):
+        """Write the rows in memory."""
+        if not self._rows:
+            return
+        if self._writer is None:
+            writer = _ParquetWriter if self.format == "parquet" else _HDF5Writer
+            self._writer = writer(self.filename)
+        self._writer.write(self._rows)
+        self.num_rows += len(self._rows)
+        self._rows = []
+
+    def read(self) -> pd.DataFrame:
+        """Write the rows in memory and read the whole table. The rows after it go to a new Parquet part file."""
+        self.flush()
+        return self._writer.read() if self._writer is not None else pd.DataFrame()
+
+    def close(self):
+        """Write the rows in memory and close the file. The next row starts a new file."""
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def _to_scalar(value: tp.Any) -> tp.Any:
+    """Convert the value to a number, a boolean, a string or None."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    try:
+        return json.dumps(value, default=str)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _column_type(values: tp.List[tp.Any]) -> str:
+    """The type of a column from the values which are not None: 'bool', 'float' or 'str'."""
+    values = [v for v in values if v is not None]
+    if values and all(isinstance(v, bool) for v in values):
+        return "bool"
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        return "float"
+    return "str"
+
+
+def _merge_kinds(kinds: tp.Dict[str, str], rows: tp.List[dict]) -> tp.Dict[str, str]:
+    """Add the types of the new columns in the rows. A column whose values do not fit its type becomes 'str'."""
+    kinds = dict(kinds)
+    for key in dict.fromkeys(key for row in rows for key in row):
+        values = [row.get(key) for row in rows]
+        kind = _column_type(values)
+        if key not in kinds:
+            kinds[key] = kind
+        elif kind != kinds[key] and any(v is not None for v in values):
+            kinds[key] = "str"
+    return kinds
+
+
+def _column(values: tp.List[tp.Any], kind: str) -> np.ndarray:
+    """Convert the values to an array of the type. None becomes NaN, False or an empty string."""
+    if kind == "float":
+        return np.array([np.nan if v is None else v for v in values], dtype=float)
+    if kind == "bool":
+        return np.array([bool(v) for v in values], dtype=bool)
+    return np.array(["" if v is None else str(v) for v in values], dtype=object)
+
+
+class _ParquetWriter:
+    """Append the rows to a Parquet file in row groups. The schema of a Parquet file is fixed so a new part file
+    '<stem>-<k>.parquet' is started when the rows have a column which is not in the current part."""
+
+    def __init__(self, filename: str):
+        import pyarrow  # noqa: F401
+        self.filename = filename
+        self.parts = []  # type: tp.List[str]
+        self._writer = None
+        self._kinds = {}  # type: tp.Dict[str, str]
+
+    def write(self, rows: tp.List[dict]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        kinds = _merge_kinds(self._kinds, rows)
+        if self._writer is None or kinds != self._kinds:
+            self.close()
+            # keep the columns of the last part so that the parts can be concatenated
+            self._kinds = kinds
+            stem, ext = os.path.splitext(self.filename)
+            self.parts.append(self.filename if not self.parts else f"{stem}-{len(self.parts)}{ext}")
+            schema = pa.schema([(key, _arrow_type(kind)) for key, kind in self._kinds.items()])
+            self._writer = pq.ParquetWriter(self.parts[-1], schema)
+        table = pa.table(
+            {
+                key: pa.array(_column([row.get(key) for row in rows], kind), type=_arrow_type(kind))
+                for key, kind in self._kinds.items()
+            }
+        )
+        self._writer.write_table(table)
+
+    def read(self) -> pd.DataFrame:
+        # the footer of the current part is written when it is closed
+        self.close()
+        return pd.concat([pd.read_parquet(part) for part in self.parts], ignore_index=True, sort=False)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class _HDF5Writer:
+    """Append the rows to one resizable dataset per column in the group '/table' of an HDF5 file."""
+
+    def __init__(self, filename: str):
+        import h5py
+        self._file = h5py.File(filename, "w")
+        self._group = self._file.create_group("table")
+        self._length = 0
+
+    def write(self, rows: tp.List[dict]):
+        import h5py
+        old = {key: self._group[key].attrs["kind"] for key in self._group}
+        n = len(rows)
+        for key, kind in _merge_kinds(old, rows).items():
+            if old.get(key) == kind:
+                continue
+            # a new column or a column of numbers which gets strings
+            values = self._group[key].asstr()[()] if old.get(key) == "str" else (
+                self._group[key][()].astype(str) if key in self._group else np.array([], dtype=object)
+            )
+            if key in self._group:
+                del self._group[key]
+            dtype = h5py.string_dtype() if kind == "str" else kind
+            fill = {"float": np.nan, "bool": False, "str": ""}[kind]
+            dataset = self._group.create_dataset(key, shape=(self._length,), maxshape=(None,), dtype=dtype,
+                                                 chunks=True, fillvalue=fill)
+            dataset.attrs["kind"] = kind
+            if len(values):
+                dataset[:] = values.astype(object)
+        for key in self._group:
+            dataset = self._group[key]
+            dataset.resize((self._length + n,))
+            dataset[self._length:] = _column([row.get(key) for row in rows], dataset.attrs["kind"])
+        self._length += n
+        self._file.flush()
+
+    def read(self) -> pd.DataFrame:
+        self._file.flush()
+        return pd.DataFrame(
+            {
+                key: dataset.asstr()[()] if dataset.attrs["kind"] == "str" else dataset[()]
+                for key, dataset in self._group.items()
+            }
+        )
+
+    def close(self):
+        self._file.close()
+
+
+def _arrow_type(kind: str):
+    """The Arrow type of the column type."""
+    import pyarrow as pa
+    return {"float": pa.float64, "bool": pa.bool_, "str": pa.string}[kind]()
@@ -0,0 +1,142 @@
+"""Choose the frame time and the number of frames for a batch of exposures."""
+from typing import List, Sequence
+
+import numpy as np
+
+__all__ = [
+    "DetectorModel",
+    "optimize_frame_time"
+]
+
+
+class DetectorModel:
+    """
+    The timing model of an area detector.
+
+    Attributes
+    ----------
+    min_frame_time
+        The shortest time per frame in second.
+    max_frame_time
+        The longest time per frame in second before the detector saturates.
+    dead_time
+        The readout time per frame in second.
+    multi_frame
+        Whether the detector sums up multiple frames in one exposure, i.e. it has `images_per_set`.
+    """
+
+    def __init__(self, min_frame_time: float = 0.1, max_frame_time: float = 5., dead_time: float = 0.,
+                 multi_frame: bool = True):
+        if not 0 < min_frame_time <= max_frame_time:
+            raise ValueError(
+                f"Expect 0 < min_frame_time <= max_frame_time. They are {min_frame_time} and {max_frame_time}."
+            )
+        self.min_frame_time = min_frame_time
+        self.max_frame_time = max_frame_time
+        self.dead_time = dead_time
+        self.multi_frame = multi_frame
+
+    def num_frames(self, exposures: np.ndarray, frame_times: np.ndarray) -> np.ndarray:
+        """The number of frames to reach the exposures. Broadcast the exposures against the frame times."""
+        # the tolerance avoids an extra frame from the rounding error of e / (e / n)
+        return np.maximum(np.ceil(exposures / frame_times - 1e-9), 1).astype(int)
+
+
+def _candidates(exposures: np.ndarray, model: DetectorModel, extra_frames: int) -> np.ndarray:
+    """The frame times which give no overshoot for some exposure with the fewest frames or a few more."""
+    fewest = np.maximum(np.ceil(exposures / model.max_frame_time), 1)
+    num_frames = fewest[:, None] + np.arange(extra_frames + 1)
+    frame_times = (exposures[:, None] / num_frames).ravel()
+    frame_times = frame_times[(frame_times >= model.min_frame_time) & (frame_times <= model.max_frame_time)]
+    return np.unique(np.concatenate([frame_times, [model.min_frame_time, model.max_frame_time]]))
+
+
+def optimize_frame_time(
+        exposures: Sequence[float],
+        model: DetectorModel = None,
+        max_frame_times: int = 1,
+        overshoot_weight: float = 1.,
+        extra_frames: int = 4
+) -> List[dict]:
+    """
+    Choose the time per frame and the number of frames for each exposure in a batch.
+
+    The cost of an exposure is the wall time `num_frames * (frame_time + dead_time)` plus `overshoot_weight` times
+    the overshoot `num_frames * frame_time - exposure`. At most `max_frame_times` distinct frame times are used in
+    the batch because each change of the frame time costs a new dark frame. They are chosen greedily to minimize
+    the total cost of the batch.
+
+    Parameters
+    ----------
+    exposures
+        The requested exposures in second.
+    model
+        The timing model of the detector. Default DetectorModel().
+    max_frame_times
+        The maximum number of distinct frame times in the batch.
+    overshoot_weight
+        The weight of the overshoot in the cost.
+    extra_frames
+        The number of frames more than the fewest to consider for each exposure.
+
+    Returns
+    -------
+    mds
+        A list of metadata dictionary for each exposure. The template:
+        {
+            'sp_time_per_frame': acq_time (float),
+            'sp_num_frames': num_frame (int),
+            'sp_requested_exposure': exposure (float),
+            'sp_computed_exposure': computed_exposure (float),
+            'sp_frame_dead_time': dead_time (float),
+            'sp_estimated_wall_time': wall_time (float),
+            'sp_frame_time_optimized': True
+        }
+    """
+    model = model if model is not None else DetectorModel()
+    exposures = np.asarray(exposures, dtype=float)
+    if len(exposures) == 0:
+        return []
+    if np.any(exposures < model.min_frame_time):
+        raise ValueError(
+            f"The exposures {exposures[exposures < model.min_frame_time].tolist()} are shorter than the minimum "
+            f"frame time {model.min_frame_time} s."
+        )
+    if not model.multi_frame:
+        # one frame as long as the exposure
+        return _to_mds(exposures, exposures, np.ones(len(exposures), dtype=int), exposures, model.dead_time)
+    candidates = _candidates(exposures, model, extra_frames)
+    num_frames = model.num_frames(exposures[:, None], candidates[None, :])
+    computed = num_frames * candidates[None, :]
+    cost = num_frames * model.dead_time + computed + overshoot_weight * (computed - exposures[:, None])
+    # greedy selection of the columns of the cost matrix
+    chosen = []
+    best = np.full(len(exposures), np.inf)
+    for _ in range(min(max_frame_times, len(candidates))):
+        totals = np.minimum(best[:, None], cost).sum(axis=0)
+        totals[chosen] = np.inf
+        column = int(np.argmin(totals))
+        if chosen and totals[column] >= best.sum():
+            break
+        chosen.append(column)
+        best = np.minimum(best, cost[:, column])
+    chosen = np.array(chosen)
+    picks = chosen[np.argmin(cost[:, chosen], axis=1)]
+    rows = np.arange(len(exposures))
+    return _to_mds(exposures, candidates[picks], num_frames[rows, picks], computed[rows, picks], model.dead_time)
+
+
+def _to_mds(exposures, frame_times, num_frames, computed, dead_time) -> List[dict]:
+    """Make the metadata dictionaries."""
+    return [
+        {
+            'sp_time_per_frame': float(t),
+            'sp_num_frames': int(n),
+            'sp_requested_exposure': float(e),
+            'sp_computed_exposure': float(c),
+            'sp_frame_dead_time': dead_time,
+            'sp_estimated_wall_time': float(c + n * dead_time),
+            'sp_frame_time_optimized': True
+        }
+        for e, t, n, c in zip(exposures, frame_times, num_frames, computed)
+    ]
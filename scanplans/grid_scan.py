@@ -1,9 +1,16 @@
+import uuid
+
 import bluesky.plan_stubs as bps
 import bluesky.plans as bp
-from xpdacq.beamtime import _configure_area_det
-from xpdacq.glbl import glbl
-from xpdacq.xpdacq import open_shutter_stub, close_shutter_stub
-from xpdacq.xpdacq_conf import xpd_configuration
+import bluesky.preprocessors as bpp
+import numpy as np
+
+import scanplans.tools as tl
+from scanplans._lazy import lazy_import
+from scanplans.context import resolve_context
+from scanplans.settle import SettleModel
+
+Signal = lazy_import("ophyd", "Signal")
 
 
 def acq_rel_grid_scan(
@@ -11,25 +18,35 @@ def acq_rel_grid_scan(
     exposure: float,
     wait: float,
     start0: float, stop0: float, num0: int,
-    start1: float, stop1: float, num1: int
+    start1: float, stop1: float, num1: int,
+    adaptive: bool = False,
+    context=None,
+    settle: SettleModel = None,
+    **kwargs
 ):
-    """Make a plan of two dimensional grid scan."""
-    area_det = xpd_configuration["area_det"]
-    x_controller = xpd_configuration["x_controller"]
-    y_controller = xpd_configuration["y_controller"]
+    """Make a plan of two dimensional grid scan. If adaptive, use adaptive_rel_grid_scan with the kwargs, which
+    are only for the adaptive scan. The devices and glbl are read from the context. Default the globals. If the
+    settle is not None, the wait after each step is computed by the `~scanplans.settle.SettleModel` from the
+    distance moved instead of the wait."""
+    if kwargs and not adaptive:
+        raise ValueError(f"The arguments {', '.join(kwargs)} are only for the adaptive scan. Set adaptive=True.")
+    if adaptive:
+        return (
+            yield from adaptive_rel_grid_scan(
+                dets, exposure, wait, start0, stop0, num0, start1, stop1, num1, context=context, settle=settle,
+                **kwargs
+            )
+        )
+    context = resolve_context(context)
+    area_det = context.configuration["area_det"]
+    x_controller = context.configuration["x_controller"]
+    y_controller = context.configuration["y_controller"]
 
     def per_step(detectors, step: dict, pos_cache):
         """ customized step to ensure shutter is open before
         reading at each motor point and close shutter after reading
         """
-        yield from bps.checkpoint()
-        for motor, pos in step.items():
-            yield from bps.mv(motor, pos)
-        yield from bps.sleep(wait)
-        yield from open_shutter_stub()
-        yield from bps.sleep(glbl["shutter_sleep"])
-        yield from bps.trigger_and_read(list(detectors) + list(step.keys()))
-        yield from close_shutter_stub()
+        yield from _step_and_read(detectors, step, wait, context=context, settle=settle)
 
     plan = bp.rel_grid_scan(
         [area_det],
@@ -38,9 +55,178 @@ def acq_rel_grid_scan(
         snake_axes=True,
         per_step=per_step
     )
-    yield from _configure_area_det(exposure)
+    yield from tl.configure_exposure(exposure, context)
     yield from plan
 
+
+def _step_and_read(detectors, step: dict, wait: float, extra=(), context=None, settle: SettleModel = None):
+    """Move, wait or settle, open the shutter, read and close the shutter. Return the readings."""
+    yield from bps.checkpoint()
+    if settle is not None:
+        before = yield from settle.locate(*step)
+    for motor, pos in step.items():
+        yield from bps.mv(motor, pos)
+    if settle is not None:
+        yield from settle.settle(before, *step)
+    else:
+        yield from bps.sleep(wait)
+    return (yield from tl.shutter_read(list(detectors) + list(step.keys()) + list(extra), context))
+
+
+def adaptive_rel_grid_scan(
+    dets: list,
+    exposure: float,
+    wait: float,
+    start0: float, stop0: float, num0: int,
+    start1: float, stop1: float, num1: int,
+    *,
+    metric,
+    threshold: float = 0.1,
+    max_level: int = 3,
+    max_points: int = None,
+    context=None,
+    settle: SettleModel = None
+):
+    """
+    Make a plan of two dimensional grid scan which refines the cells where the readings change a lot.
+
+    A coarse pass measures the num0 by num1 grid. A cell is the square between four neighboring points. Its
+    score is the range of the metric at its corners divided by the range of the metric over all the points. The
+    cells with a score above the threshold are split into four by measuring the midpoints of the edges and the
+    center. The refinement is repeated on the new cells until no cell is above the threshold, the cells reach the
+    max_level or the number of points reaches max_points. All the points are in one run.
+
+    Parameters
+    ----------
+    dets : list
+        A list of detectors. Dummy. The area detector in the configuration of the context is used.
+    exposure : float
+        The exposure time in second.
+    wait : float
+        The time to wait after the motors arrive.
+    start0, stop0, num0 : float, float, int
+        The relative start, stop and number of points of the coarse grid of the x_controller.
+    start1, stop1, num1 : float, float, int
+        The relative start, stop and number of points of the coarse grid of the y_controller.
+    metric : callable
+        A function from the readings of a point to a float, e.g. the sum of the image plugin of the area detector.
+        The area detector saves the image in files and only puts a datum id in the reading so the metric has to
+        load the image or read a reduced signal.
+    threshold : float
+        The score above which a cell is refined. It is between 0 and 1.
+    max_level : int
+        The number of times a coarse cell can be split.
+    max_points : int
+        The maximum number of points in total. Default no limit.
+    context : PlanContext
+        The configuration to read the devices and glbl from. Default the globals.
+    settle : SettleModel
+        If not None, the wait after each step is computed by the model from the distance moved instead of the
+        wait. The refined points are close to each other and wait less. See `~scanplans.settle.SettleModel`.
+
+    Returns
+    -------
+    report : dict
+        The number of points measured, the number of points in the full grid of the finest resolution reached and
+        their difference.
+
+    Raises
+    ------
+    ValueError
+        If the metric is not a function or it returns no number for any point of the coarse grid.
+    """
+    if not callable(metric):
+        raise ValueError(f"The metric must be a function from the readings to a float. It is {metric!r}.")
+    if num0 < 2 or num1 < 2:
+        raise ValueError(f"The coarse grid must have at least 2 x 2 points. It is {num0} x {num1}.")
+    context = resolve_context(context)
+    area_det = context.configuration["area_det"]
+    x_controller = context.configuration["x_controller"]
+    y_controller = context.configuration["y_controller"]
+    motors = [x_controller, y_controller]
+    level_signal = Signal(name="refine_level", value=0)
+    # the points are on an integer lattice whose spacing is the finest resolution
+    scale = 2 ** max_level
+    step0 = (stop0 - start0) / ((num0 - 1) * scale)
+    step1 = (stop1 - start1) / ((num1 - 1) * scale)
+    values = {}
+    simulated = [False]
+    md = {
+        "sp_type": "adaptive_rel_grid_scan",
+        "sp_uid": str(uuid.uuid4()),
+        "sp_plan_name": "adaptive_rel_grid_scan",
+        "sp_requested_exposure": exposure,
+        "sp_coarse_shape": (num0, num1),
+        "sp_threshold": threshold,
+        "sp_max_level": max_level,
+        "sp_max_points": max_points,
+        "motors": [motor.name for motor in motors]
+    }
+
+    def measure(points, level):
+        for i, j in points:
+            yield from bps.mv(level_signal, level)
+            step = {x_controller: start0 + i * step0, y_controller: start1 + j * step1}
+            readings = yield from _step_and_read(
+                [area_det], step, wait, extra=[level_signal], context=context, settle=settle
+            )
+            # the readings are None only if the plan is simulated
+            values[(i, j)] = metric(readings) if readings is not None else np.nan
+            simulated[0] = readings is None
+
+    def scores(cells):
+        corners = np.array(
+            [[values[(i + di * s, j + dj * s)] for di in (0, 1) for dj in (0, 1)] for i, j, s in cells],
+            dtype=float
+        )
+        all_values = np.array(list(values.values()), dtype=float)
+        span = np.nanmax(all_values) - np.nanmin(all_values) if np.any(np.isfinite(all_values)) else np.nan
+        if not span > 0:
+            return np.zeros(len(cells))
+        return np.nan_to_num((corners.max(axis=1) - corners.min(axis=1)) / span)
+
+    @bpp.stage_decorator([area_det])
+    @bpp.run_decorator(md=md)
+    def inner():
+        coarse = [
+            (i * scale, (j if i % 2 == 0 else num1 - 1 - j) * scale)
+            for i in range(num0) for j in range(num1)
+        ]
+        yield from measure(coarse, 0)
+        if not simulated[0] and not np.any(np.isfinite(np.array(list(values.values()), dtype=float))):
+            raise ValueError(f"The metric returns no number for any of the {len(values)} coarse points.")
+        cells = [(i * scale, j * scale, scale) for i in range(num0 - 1) for j in range(num1 - 1)]
+        level = 0
+        while cells and level < max_level:
+            cell_scores = scores(cells)
+            selected = [cells[k] for k in np.argsort(-cell_scores, kind="stable") if cell_scores[k] > threshold]
+            level += 1
+            cells = []
+            for i, j, s in selected:
+                h = s // 2
+                new = [
+                    p for p in ((i + h, j), (i, j + h), (i + h, j + h), (i + s, j + h), (i + h, j + s))
+                    if p not in values
+                ]
+                if max_points is not None and len(values) + len(new) > max_points:
+                    break
+                yield from measure(new, level)
+                cells.extend((i + di, j + dj, h) for di in (0, h) for dj in (0, h))
+            if not cells:
+                level -= 1
+        full = ((num0 - 1) * 2 ** level + 1) * ((num1 - 1) * 2 ** level + 1)
+        report = {"num_points": len(values), "num_full_grid": full, "num_saved": full - len(values)}
+        print(
+            "INFO: measured {num_points} points. The full grid at the finest resolution has {num_full_grid} "
+            "points. Saved {num_saved} points.".format(**report)
+        )
+        return report
+
+    plan = bpp.relative_set_wrapper(inner(), motors)
+    plan = bpp.reset_positions_wrapper(plan, motors)
+    yield from tl.configure_exposure(exposure, context)
+    return (yield from plan)
+
 # below is the code to run at the beamtime
 # register the scanplan
 # ScanPlan(bt, acq_rel_grid_scan, 60, 30, -5, 5, 10, -5, 5, 10)
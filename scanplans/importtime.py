@@ -0,0 +1,82 @@
+"""Measure the cold start cost of importing the submodules of scanplans.
+
+Each module is imported in a fresh interpreter with `python -X importtime` so that nothing is cached from an
+earlier import. The report has the time of the import and whether the heavy dependencies were loaded by it. Run
+it from the command line to print the table.
+
+    'python -m scanplans.importtime'
+"""
+import pkgutil
+import re
+import subprocess
+import sys
+import typing as tp
+
+import numpy as np
+
+__all__ = [
+    "HEAVY_MODULES",
+    "measure_import_times"
+]
+HEAVY_MODULES = ("xpdacq", "xpdconf", "xpdan", "pandas", "ophyd", "matplotlib")
+_LINE = re.compile(r"import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)")
+
+
+def _submodules() -> tp.List[str]:
+    """The names of the public submodules of scanplans."""
+    import scanplans
+    names = [info.name for info in pkgutil.iter_modules(scanplans.__path__) if not info.name.startswith("_")]
+    return ["scanplans"] + [f"scanplans.{name}" for name in names]
+
+
+def _import_time(module: str) -> tp.Tuple[float, tp.List[str]]:
+    """Import the module in a new interpreter. Return the cumulative time in second and the heavy top level
+    packages imported."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True,
+                          text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Failed to import {module}:\n{proc.stderr[-2000:]}")
+    total, packages = np.nan, set()
+    for match in _LINE.finditer(proc.stderr):
+        name = match.group(4)
+        packages.add(name.split(".")[0])
+        if name == module:
+            total = int(match.group(2)) * 1e-6
+    return total, sorted(packages.intersection(HEAVY_MODULES))
+
+
+def measure_import_times(modules: tp.Sequence[str] = None, repeat: int = 1):
+    """
+    Measure the cold start time to import each module in a new interpreter.
+
+    Parameters
+    ----------
+    modules
+        The names of the modules. Default `scanplans` and all its public submodules.
+    repeat
+        The number of imports of each module. The minimum time is reported.
+
+    Returns
+    -------
+    report
+        A pandas table with the columns 'module', 'seconds' and 'heavy', the heavy dependencies in
+        `HEAVY_MODULES` loaded by the import, sorted from the slowest.
+    """
+    import pandas as pd
+    if repeat < 1:
+        raise ValueError(f"The repeat must be at least 1. It is {repeat}.")
+    rows = []
+    for module in (modules if modules is not None else _submodules()):
+        results = [_import_time(module) for _ in range(repeat)]
+        rows.append(
+            {
+                "module": module,
+                "seconds": min(seconds for seconds, _ in results),
+                "heavy": ", ".join(results[0][1])
+            }
+        )
+    return pd.DataFrame(rows).sort_values("seconds", ascending=False, ignore_index=True)
+
+
+if __name__ == "__main__":
+    print(measure_import_times().to_string(index=False))
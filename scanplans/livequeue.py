@@ -0,0 +1,247 @@
+"""Conduct the jobs of a queue file which can be edited while it runs.
+
+`move_and_do_many` and `autoplan` need all the samples before they start, so the samples added during the run
+wait until the list is done and the beam is idle while the next command is typed. A `LiveQueue` reads the jobs
+from a CSV file before each job and conducts them one by one in the same plan, so that a job appended, moved or
+cancelled in the file during the run is taken into account at the next job without any gap. The jobs done are
+appended to a journal next to the file so that the queue resumes where it stopped after a restart.
+
+The file has a header and one job per line. Only the columns 'sample' and 'plan' are required.
+
+    id,sample,plan,wait_time,status
+    1,Ni,ct_10,,
+    2,3,0,5,
+    3,Ni,ct_60,,cancel
+"""
+from __future__ import annotations
+
+import io
+import os
+import typing as tp
+
+import bluesky.plan_stubs as bps
+
+from scanplans._lazy import lazy_import
+from scanplans.context import PlanContext
+from scanplans.mdgetters import find_scanplan, get_from_sample, translate_to_sample
+from scanplans.move_and_do import move_and_do_one
+from scanplans.moves import MoveTracker
+
+pd = lazy_import("pandas")
+Beamtime = lazy_import("xpdacq.beamtime", "Beamtime")
+
+__all__ = [
+    "LiveQueue"
+]
+COLUMNS = ("id", "sample", "plan", "wait_time", "status")
+# the status of a job which is not conducted: removed for good or kept for later
+CANCEL = "cancel"
+HOLD = "hold"
+
+
+def _index_or_key(value: str) -> tp.Union[int, str]:
+    """The integer of a sample or plan index, else the name key."""
+    return int(value) if value.strip().isdigit() else value.strip()
+
+
+class LiveQueue:
+    """
+    A queue of (sample, plan) jobs in a CSV file which is read again before every job.
+
+    A job is identified by its 'id'. Without the column, the id is the sample, the plan and the number of the
+    same pair above it, e.g. 'Ni/ct_10/0'. A job is conducted at most once. A job with the status 'cancel' or
+    removed from the file is dropped and one with the status 'hold' waits until the status is cleared. The jobs
+    are conducted in the order of the file. Only the new lines are resolved when the file changes.
+
+    Attributes
+    ----------
+    path
+        The path of the queue file.
+    journal
+        The path of the file of the ids of the jobs done, one per line. Default the path plus '.done'.
+    done
+        The ids of the jobs done in the order.
+    errors
+        The message by the id of the jobs which can not be conducted, e.g. an unknown sample or plan or a wait
+        time which is not a number. A job in error is tried again when its sample, plan or wait time is changed
+        in the file.
+
+    Examples
+    --------
+    Conduct the queue and wait up to 10 minutes for new jobs when it is empty.
+    >>> queue = LiveQueue("queue.csv")
+    >>> xrun({}, queue.run(bt, idle_timeout=600.))
+    """
+
+    def __init__(self, path: str, journal: str = None):
+        self.path = path
+        self.journal = journal if journal is not None else path + ".done"
+        self.done = []  # type: tp.List[str]
+        self.errors = {}  # type: tp.Dict[str, str]
+        self._text = None  # type: tp.Optional[str]
+        self._jobs = pd.DataFrame(columns=list(COLUMNS))
+        # the position and wait time resolved for the (id, sample, plan, wait_time) of each job and the (sample,
+        # plan, wait_time) which failed for each id
+        self._resolved = {}  # type: tp.Dict[tp.Tuple[str, ...], tp.Tuple[tp.Tuple[float, float], float]]
+        self._failed = {}  # type: tp.Dict[str, tp.Tuple[str, str, str]]
+        if os.path.isfile(self.journal):
+            with open(self.journal) as f:
+                self.done = [line.strip() for line in f if line.strip()]
+
+    def read(self) -> pd.DataFrame:
+        """
+        Read the queue file if it has changed.
+
+        Returns
+        -------
+        jobs
+            A table with the columns 'id', 'sample', 'plan', 'wait_time' and 'status' as strings in the order of
+            the file. The missing file is an empty queue.
+        """
+        text = ""
+        if os.path.isfile(self.path):
+            with open(self.path) as f:
+                text = f.read()
+        if text == self._text:
+            return self._jobs
+        jobs = pd.DataFrame(columns=list(COLUMNS))
+        if text.strip():
+            jobs = pd.read_csv(io.StringIO(text), dtype=str, keep_default_na=False, skipinitialspace=True)
+        missing = {"sample", "plan"} - set(jobs.columns)
+        if missing:
+            raise ValueError(f"The queue file '{self.path}' has no column(s) {sorted(missing)}.")
+        for column in COLUMNS:
+            if column not in jobs:
+                jobs[column] = ""
+        jobs["status"] = jobs["status"].str.strip().str.lower()
+        no_id = jobs["id"].str.strip() == ""
+        occurrence = jobs.groupby(["sample", "plan"]).cumcount().astype(str)
+        jobs.loc[no_id, "id"] = (jobs["sample"] + "/" + jobs["plan"] + "/" + occurrence)[no_id]
+        duplicated = jobs["id"].duplicated()
+        if duplicated.any():
+            raise ValueError(f"The ids are not unique in '{self.path}': {jobs['id'][duplicated].tolist()}.")
+        self._text, self._jobs = text, jobs[list(COLUMNS)].reset_index(drop=True)
+        return self._jobs
+
+    def pending(self) -> pd.DataFrame:
+        """The jobs to conduct in the order, not done, cancelled, held or in error."""
+        jobs = self.read()
+        rows = pd.Series(list(zip(jobs["sample"], jobs["plan"], jobs["wait_time"])), index=jobs.index, dtype=object)
+        failed = jobs["id"].map(self._failed) == rows
+        skip = jobs["id"].isin(self.done) | failed | jobs["status"].isin([CANCEL, HOLD])
+        return jobs[~skip]
+
+    def _resolve(self, bt: Beamtime, job: pd.Series, plans: tp.Mapping[str, tp.Callable], wait_time: float,
+                 sample_x: str, sample_y: str) -> tp.Optional[tuple]:
+        """
+        The position of the sample and the wait time of the job or None if the sample or the plan can not be found
+        or the wait time is not a number. Each job is resolved once.
+        """
+        row = (job["sample"], job["plan"], job["wait_time"])
+        key = (job["id"],) + row
+        if key not in self._resolved:
+            try:
+                sample = translate_to_sample(bt, _index_or_key(job["sample"]))
+                if sample is None:
+                    raise ValueError(f"No sample {job['sample']} in the beamtime.")
+                position = (float(get_from_sample(sample, sample_x)), float(get_from_sample(sample, sample_y)))
+                if job["plan"] not in plans and (
+                        not hasattr(bt, "scanplans") or find_scanplan(bt, _index_or_key(job["plan"])) is None
+                ):
+                    raise ValueError(f"No plan {job['plan']} in the plans or the beamtime.")
+                try:
+                    wait = float(job["wait_time"]) if job["wait_time"].strip() else wait_time
+                except ValueError:
+                    raise ValueError(f"The wait time '{job['wait_time']}' is not a number.") from None
+            except (KeyError, IndexError, TypeError, ValueError) as error:
+                self._failed[job["id"]] = row
+                self.errors[job["id"]] = f"{type(error).__name__}: {error}"
+                print(f"WARNING: skip the job {job['id']}: {self.errors[job['id']]}")
+                return None
+            self._resolved[key] = (position, wait)
+            self.errors.pop(job["id"], None)
+        return self._resolved[key]
+
+    def _finish(self, job_id: str):
+        self.done.append(job_id)
+        with open(self.journal, "a") as f:
+            f.write(job_id + "\n")
+
+    def run(
+            self,
+            bt: Beamtime,
+            plans: tp.Mapping[str, tp.Callable[[], tp.Generator]] = None,
+            wait_time: float = 0.,
+            poll: float = 5.,
+            idle_timeout: tp.Optional[float] = None,
+            sample_x: str = "sample_x", sample_y: str = "sample_y",
+            move_tolerance: tp.Optional[float] = 1e-3,
+            context: PlanContext = None,
+            **kwargs
+    ) -> tp.Generator:
+        """
+        Conduct the jobs of the queue one by one by `~scanplans.move_and_do.move_and_do_one` until it is empty.
+
+        Parameters
+        ----------
+        bt
+            The beamtime object.
+        plans
+            The functions which make the plans by the name in the column 'plan', e.g. {'sleep': lambda:
+            bps.sleep(10.)}. The other plans are the ScanPlan indexes or name keys in the beamtime.
+        wait_time
+            The wait time after the move of the jobs without a 'wait_time'.
+        poll
+            The time in second between the reads of the empty queue.
+        idle_timeout
+            The time in second to wait for new jobs when the queue is empty before returning. If None, wait
+            forever. It can be stopped by the RunEngine.
+        sample_x, sample_y
+            The keys of the position in the sample information.
+        move_tolerance
+            A controller is only moved if the position differs from the last one by more than this. See
+            `~scanplans.moves.MoveTracker`. If None, both controllers are moved for every job.
+        context
+            The configuration to read the devices from. See `~scanplans.context.PlanContext`. Default the globals.
+        kwargs
+            The other keyword arguments of `move_and_do_one`, e.g. the 'x_controller'.
+
+        Yields
+        ------
+        Msg
+            The messages of the plans.
+
+        Returns
+        -------
+        report
+            The ids of the jobs 'done' in this run and the 'errors' by the id.
+        """
+        if poll <= 0:
+            raise ValueError(f"The poll must be positive. It is {poll}.")
+        plans = plans or {}
+        tracker = MoveTracker(move_tolerance) if move_tolerance is not None else None
+        num_done = len(self.done)
+        idle = 0.
+        while True:
+            pending = self.pending()
+            if pending.empty:
+                if idle_timeout is not None and idle >= idle_timeout:
+                    break
+                yield from bps.sleep(poll)
+                idle += poll
+                continue
+            idle = 0.
+            job = pending.iloc[0]
+            resolved = self._resolve(bt, job, plans, wait_time, sample_x, sample_y)
+            if resolved is None:
+                continue
+            position, wait = resolved
+            plan = plans[job["plan"]]() if job["plan"] in plans else _index_or_key(job["plan"])
+            print(f"INFO: job {job['id']}, {len(pending) - 1} job(s) pending.")
+            yield from move_and_do_one(
+                bt, _index_or_key(job["sample"]), plan, wait_time=wait,
+                sample_x=sample_x, sample_y=sample_y, position=position, context=context, tracker=tracker,
+                **kwargs
+            )
+            self._finish(job["id"])
+        return {"done": self.done[num_done:], "errors": dict(self.errors)}
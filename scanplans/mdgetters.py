@@ -1,14 +1,22 @@
 """The functions to get metadata related to the samples and plans from the Beamtime object."""
-from typing import Union, List, Generator
+import inspect
+from typing import Any, Union, List, Generator
 
 from bluesky.preprocessors import msg_mutator
-from xpdacq.beamtime import Beamtime, ScanPlan
-from xpdacq.xpdacq import _sample_injector_factory
+
+from scanplans._lazy import lazy_import
+
+Beamtime = lazy_import("xpdacq.beamtime", "Beamtime")
+ScanPlan = lazy_import("xpdacq.beamtime", "ScanPlan")
+_sample_injector_factory = lazy_import("xpdacq.xpdacq", "_sample_injector_factory")
 
 __all__ = [
     "translate_to_sample",
     "translate_to_plan",
-    "get_from_sample"
+    "get_from_sample",
+    "find_scanplan",
+    "get_plan_arguments",
+    "get_plan_exposure"
 ]
 
 
@@ -150,3 +158,47 @@ def get_from_sample(sample, key):
             "INFO: The sample '{}' does not have key '{}'.".format(sample.get('sample_name'), key)
         )
     return value
+
+
+def find_scanplan(beamtime: Beamtime, plan: Union[int, str]):
+    """Find the ScanPlan in the beamtime by the index or name key. Return None if it is not found."""
+    try:
+        if isinstance(plan, str):
+            return beamtime.scanplans[plan]
+        return list(beamtime.scanplans.values())[plan]
+    except (KeyError, IndexError):
+        return None
+
+
+def get_plan_arguments(sp) -> dict:
+    """
+    Get the arguments of a ScanPlan by the parameter names of its plan function, e.g. {'temp_setpoint': 300,
+    'exposure': 10, 'delay': 20, 'num': 10} for ScanPlan(bt, ttseries, 300, 10, 20, 10).
+
+    Parameters
+    ----------
+    sp
+        A ScanPlan or a dictionary with 'sp_args' and 'sp_kwargs'.
+
+    Returns
+    -------
+    arguments
+        The arguments by the name without the detectors. Only the keyword arguments if there is no plan function.
+    """
+    args = sp.get("sp_args", ())
+    kwargs = dict(sp.get("sp_kwargs", {}))
+    plan_func = getattr(sp, "plan_func", None)
+    if plan_func is None:
+        return kwargs
+    # the first argument of the plan functions is the detectors
+    arguments = dict(inspect.signature(plan_func).bind_partial([], *args, **kwargs).arguments)
+    arguments.pop(next(iter(inspect.signature(plan_func).parameters)), None)
+    return arguments
+
+
+def get_plan_exposure(sp) -> Any:
+    """Get the argument named 'exposure' of a ScanPlan. Return None if it is not known."""
+    try:
+        return get_plan_arguments(sp).get("exposure")
+    except (TypeError, ValueError):
+        return None
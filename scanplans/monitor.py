@@ -0,0 +1,160 @@
+"""Poll the signals at a fixed rate in a thread and record them in a separate event stream."""
+import threading
+import time
+from typing import Any, Callable, Dict, Generator, List
+
+import bluesky.preprocessors as bpp
+import numpy as np
+
+__all__ = [
+    "PolledMonitor",
+    "monitor_during"
+]
+
+
+class PolledMonitor:
+    """
+    A readable and subscribable object which polls the signals at a rate. Every `decimation` polls are averaged
+    into one reading and sent to the subscribers. When it is monitored in a run, e.g. by
+    `bluesky.preprocessors.monitor_during_wrapper`, each reading becomes an event in its own stream. The polling
+    only runs when there is any subscriber.
+
+    Attributes
+    ----------
+    name
+        The name of the object. The stream is named `<name>_monitor` by `monitor_during_wrapper`.
+    signals
+        The readable objects to poll.
+    rate
+        The number of polls per second.
+    decimation
+        The number of polls averaged into one reading.
+    parent
+        Always None.
+    """
+
+    def __init__(self, signals: List[Any], rate: float = 10., decimation: int = 1, name: str = "temperature"):
+        if rate <= 0:
+            raise ValueError(f"The rate must be positive. It is {rate}.")
+        if decimation < 1:
+            raise ValueError(f"The decimation must be at least 1. It is {decimation}.")
+        self.name = name
+        self.signals = list(signals)
+        self.rate = rate
+        self.decimation = int(decimation)
+        self.parent = None
+        self._callbacks = []  # type: List[Callable]
+        self._last = {}  # type: Dict[str, dict]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None  # type: threading.Thread
+
+    def describe(self) -> Dict[str, dict]:
+        description = {}
+        for signal in self.signals:
+            description.update(signal.describe())
+        return description
+
+    def read(self) -> Dict[str, dict]:
+        """The last averaged reading. If it has not polled yet, read the signals."""
+        with self._lock:
+            last = dict(self._last)
+        return last if last else self._poll()
+
+    def describe_configuration(self) -> Dict[str, dict]:
+        source = f"SIM:{self.name}"
+        return {
+            f"{self.name}_rate": {"dtype": "number", "shape": [], "source": source},
+            f"{self.name}_decimation": {"dtype": "integer", "shape": [], "source": source}
+        }
+
+    def read_configuration(self) -> Dict[str, dict]:
+        now = time.time()
+        return {
+            f"{self.name}_rate": {"value": self.rate, "timestamp": now},
+            f"{self.name}_decimation": {"value": self.decimation, "timestamp": now}
+        }
+
+    def subscribe(self, callback: Callable, **kwargs):
+        """Send each averaged reading to the callback. Start polling if it is the first subscriber."""
+        with self._lock:
+            self._callbacks.append(callback)
+            start = self._thread is None
+        if start:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-poll", daemon=True)
+            self._thread.start()
+        return callback
+
+    def clear_sub(self, callback: Callable, **kwargs):
+        """Stop sending the readings to the callback. Stop polling if there is no subscriber."""
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+            stop = not self._callbacks and self._thread is not None
+        if stop:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _poll(self) -> Dict[str, dict]:
+        readings = {}
+        for signal in self.signals:
+            readings.update(signal.read())
+        return readings
+
+    def _run(self):
+        """Poll at the absolute times so that the rate does not drift."""
+        period = 1. / self.rate
+        start = time.monotonic()
+        block = []
+        k = 0
+        while not self._stop.is_set():
+            block.append(self._poll())
+            if len(block) == self.decimation:
+                reading = _average(block)
+                block = []
+                with self._lock:
+                    self._last = reading
+                    callbacks = list(self._callbacks)
+                for callback in callbacks:
+                    callback(reading)
+            k += 1
+            self._stop.wait(max(start + k * period - time.monotonic(), 0.))
+
+
+def _average(block: List[Dict[str, dict]]) -> Dict[str, dict]:
+    """Average the float values of the readings. The other values and the timestamps are the last ones."""
+    reading = {key: dict(value) for key, value in block[-1].items()}
+    for key, value in reading.items():
+        values = [r[key]["value"] for r in block]
+        if all(isinstance(v, (float, np.floating)) for v in values):
+            value["value"] = float(np.mean(values))
+    return reading
+
+
+def monitor_during(plan: Generator, signals: List[Any], rate: float, decimation: int = 1,
+                   name: str = "temperature") -> Generator:
+    """
+    Record the signals at the rate in a separate stream during all the runs of the plan.
+
+    Parameters
+    ----------
+    plan
+        The plan.
+    signals
+        The readable objects to poll.
+    rate
+        The number of polls per second.
+    decimation
+        The number of polls averaged into one event.
+    name
+        The name of the monitor. The stream is named `<name>_monitor`.
+
+    Returns
+    -------
+    plan
+        The plan with the monitor.
+    """
+    monitor = PolledMonitor(signals, rate=rate, decimation=decimation, name=name)
+    return bpp.monitor_during_wrapper(plan, [monitor])
@@ -2,11 +2,19 @@
 import typing as tp
 
 import bluesky.plan_stubs as bps
-from xpdacq.beamtime import Beamtime
-from xpdacq.beamtime import xpd_configuration
+from bluesky.preprocessors import pchain
 
+import scanplans.singlerun as sr
+from scanplans._lazy import lazy_import
+from scanplans.autoexposure import AutoExposure, exposure_plan
+from scanplans.context import PlanContext, resolve_context
 from scanplans.mdgetters import get_from_sample
 from scanplans.mdgetters import translate_to_plan, translate_to_sample
+from scanplans.moves import MoveTracker
+from scanplans.preflight import preflight_move_and_do
+from scanplans.settle import SettleModel
+
+Beamtime = lazy_import("xpdacq.beamtime", "Beamtime")
 
 
 def move_and_do_many(
@@ -17,6 +25,13 @@ def move_and_do_many(
         sample_x: str = "sample_x", sample_y: str = "sample_y",
         x_controller: str = "x_controller",
         y_controller: str = "y_controller",
+        positions: tp.Sequence[tp.Tuple[float, float]] = None,
+        preflight: bool = False,
+        auto_exposure: AutoExposure = None,
+        context: PlanContext = None,
+        move_tolerance: tp.Optional[float] = 1e-3,
+        single_run: bool = False,
+        settle: SettleModel = None
 ) -> tp.List[tp.Generator]:
     """Move to the sample and conduct the bluesky plan on the sample one by one.
 
@@ -47,50 +62,116 @@ def move_and_do_many(
     y_controller : str
         The key to the x position controller in `~xpdacq.beamtime.xqd_configuration`.
 
+    positions : array-like of shape (n, 2)
+        The (x, y) positions of the samples, e.g. from `SampleTable.positions`. If None, the positions are read
+        from the sample information.
+
+    preflight : bool
+        Whether to check all the samples and plans before making the plans. If True, a ValueError listing all the
+        issues is raised when any check fails. See `~scanplans.preflight.preflight_move_and_do`.
+
+    auto_exposure : AutoExposure
+        If not None, take a probe frame at each sample and choose the exposure of the plan. See
+        `move_and_do_one`.
+
+    context : PlanContext
+        The configuration to read the position controllers and the detector from. See
+        `~scanplans.context.PlanContext`. Default the globals.
+
+    move_tolerance : float
+        A controller is only moved if the position of the sample differs from the last one by more than this, e.g.
+        the samples in a row of the rack share the y. See `~scanplans.moves.MoveTracker`. If None, both
+        controllers are moved for every sample. Default 1e-3.
+
+    single_run : bool
+        Whether to record all the samples in one run instead of one run per sample. The list has one plan. The
+        start document of each sample becomes an event in the stream 'samples'. See
+        `~scanplans.singlerun.single_run`. Default False.
+
+    settle : SettleModel
+        If not None, the wait after the move to each sample, including the first one, is computed by the model
+        from the distance moved instead of the wait_times. See `~scanplans.settle.SettleModel`.
+
     Returns
     -------
     plans : list
         A list of the bluesky plans. Each plan is a generator.
     """
+    if preflight:
+        preflight_move_and_do(
+            bt, sps,
+            sample_x=sample_x, sample_y=sample_y,
+            x_controller=x_controller, y_controller=y_controller, context=context
+        ).raise_for_issues()
     if isinstance(wait_times, (int, float)):
         wait_times = [wait_times] * len(sps)
     else:
         wait_times = wait_times[:]
     if not wait_at_first:
         wait_times[0] = 0
-    return [
+    if positions is None:
+        positions = [None] * len(sps)
+    tracker = MoveTracker(move_tolerance) if move_tolerance is not None else None
+    plans = [
         move_and_do_one(
             bt, s, p,
             wait_time=wt,
             sample_x=sample_x, sample_y=sample_y,
             x_controller=x_controller, y_controller=y_controller,
+            position=pos,
+            auto_exposure=auto_exposure,
+            context=context,
+            tracker=tracker,
+            settle=settle
         )
-        for (s, p), wt in zip(sps, wait_times)
+        for (s, p), wt, pos in zip(sps, wait_times, positions)
     ]
+    if single_run:
+        return [sr.single_run(pchain(*plans), md={"sp_plan_name": "move_and_do_many"})]
+    return plans
 
 
 def move_and_do_one(
         bt: Beamtime, sample_ind: tp.Union[int, str], plan_ind: tp.Union[int, str, tp.Generator],
         wait_time: float = 0., sample_x: str = "sample_x",
         sample_y: str = "sample_y", x_controller: str = "x_controller", y_controller: str =
-        "y_controller"
+        "y_controller", position: tp.Tuple[float, float] = None, auto_exposure: AutoExposure = None,
+        context: PlanContext = None, tracker: MoveTracker = None, settle: SettleModel = None
 ) -> tp.Generator:
-    """Move to the sample and conduct the plan."""
+    """Move to the sample and conduct the plan. If the position is None, it is read from the sample information.
+    If the auto_exposure is not None, a probe frame is taken after the wait and the plan, a ScanPlan index or name
+    or a function from the exposure metadata to a plan, is built with the chosen exposure. See
+    `~scanplans.autoexposure.exposure_plan`. The controllers are read from the context. Default the globals. If the
+    tracker is not None, the controllers already at the position are not moved. See
+    `~scanplans.moves.MoveTracker`. If the settle is not None, the wait is computed from the distance moved
+    instead of the wait_time. See `~scanplans.settle.SettleModel`."""
     sample = translate_to_sample(bt, sample_ind)
-    plan = translate_to_plan(bt, plan_ind, sample)
-    xc = xpd_configuration[x_controller]
-    yc = xpd_configuration[y_controller]
-    x = float(get_from_sample(sample, sample_x))
-    y = float(get_from_sample(sample, sample_y))
+    plan = translate_to_plan(bt, plan_ind, sample) if auto_exposure is None else None
+    context = resolve_context(context)
+    xc = context.configuration[x_controller]
+    yc = context.configuration[y_controller]
+    if position is None:
+        x = float(get_from_sample(sample, sample_x))
+        y = float(get_from_sample(sample, sample_y))
+    else:
+        x, y = map(float, position)
     yield from bps.checkpoint()
     print("Start moving to sample {} at ({}, {}).".format(sample_ind, x, y))
-    yield from bps.mv(xc, x, yc, y)
-    print("Finish. ")
-    yield from bps.checkpoint()
-    print("Start sleeping for {} s.".format(wait_time))
-    yield from bps.sleep(wait_time)
-    print("Wake up.")
+    move = tracker.mv if tracker is not None else bps.mv
+    if settle is not None:
+        yield from settle.mv(xc, x, yc, y, move=move)
+        print("Finish. ")
+    else:
+        yield from move(xc, x, yc, y)
+        print("Finish. ")
+        yield from bps.checkpoint()
+        print("Start sleeping for {} s.".format(wait_time))
+        yield from bps.sleep(wait_time)
+        print("Wake up.")
     yield from bps.checkpoint()
+    if auto_exposure is not None:
+        md = yield from auto_exposure.probe(context=context)
+        plan = translate_to_plan(bt, exposure_plan(bt, plan_ind, md, context), sample)
     print("Start plan {} for sample {}".format(plan_ind, sample_ind))
     yield from plan
     print("Finish.")
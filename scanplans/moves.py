@@ -0,0 +1,108 @@
+"""Move the motors only when their targets change.
+
+The step plans move every motor at every point even when only one of them has a new target, e.g. the crossed
+points of a well share the x of the center. A `MoveTracker` remembers the last setpoint commanded to each motor in
+the plan and drops the moves to a target within the tolerance of it.
+"""
+import typing as tp
+
+import bluesky.plan_stubs as bps
+import numpy as np
+
+__all__ = [
+    "MoveTracker"
+]
+
+
+class MoveTracker:
+    """
+    The last setpoints commanded to the motors in a plan, to skip the moves which would not change them.
+
+    After a pause, the motors can be moved by hand or stopped by the RunEngine, and the messages replayed from the
+    last checkpoint do not pass through the tracker. To stay correct, a move is only skipped if the readback of the
+    motor is also within the tolerance of the target, which costs a read instead of a move. The readback can not be
+    known when the plan is not run by a RunEngine, e.g. in `summarize_plan`, and then the setpoint is trusted.
+
+    Attributes
+    ----------
+    tolerance
+        The largest difference from the last setpoint, in the unit of the motor, of a target to skip.
+    verify
+        Whether to check the readback before skipping a move.
+    setpoints
+        The last setpoint commanded to each motor by the name.
+    num_moves
+        The number of moves commanded.
+    num_skipped
+        The number of moves skipped.
+
+    Examples
+    --------
+    Only move y to the second point.
+    >>> tracker = MoveTracker()
+    >>> def plan():
+    ...     yield from tracker.mv(x_motor, 1., y_motor, 1.)
+    ...     yield from tracker.mv(x_motor, 1., y_motor, 2.)
+    >>> RE(plan())
+    >>> print(tracker)
+    """
+
+    def __init__(self, tolerance: float = 1e-3, verify: bool = True):
+        if tolerance < 0:
+            raise ValueError(f"The tolerance must be non-negative. It is {tolerance}.")
+        self.tolerance = tolerance
+        self.verify = verify
+        self.setpoints = {}  # type: tp.Dict[str, float]
+        self.num_moves = 0
+        self.num_skipped = 0
+
+    def forget(self, *motors):
+        """Forget the setpoints of the motors, or all of them, e.g. after they are moved outside the tracker."""
+        if not motors:
+            self.setpoints.clear()
+        for motor in motors:
+            self.setpoints.pop(motor.name, None)
+
+    def _is_at(self, motor, target: float) -> tp.Generator:
+        """Whether the motor was commanded to the target and, if verify, is still there."""
+        setpoint = self.setpoints.get(motor.name)
+        if setpoint is None or not np.abs(target - setpoint) <= self.tolerance:
+            return False
+        if not self.verify:
+            return True
+        readback = yield from bps.rd(motor, default_value=None)
+        return readback is None or bool(np.abs(target - readback) <= self.tolerance)
+
+    def mv(self, *args, **kwargs) -> tp.Generator:
+        """
+        Move the motors to the targets like `bluesky.plan_stubs.mv`, except the ones at their targets.
+
+        Parameters
+        ----------
+        args
+            The motors and the targets, e.g. `x_motor, 1., y_motor, 2.`.
+        kwargs
+            The keyword arguments of `bluesky.plan_stubs.mv`, e.g. the group.
+
+        Yields
+        ------
+        Msg
+            The messages to move the motors.
+        """
+        if len(args) % 2 != 0:
+            raise ValueError("The arguments must be pairs of a motor and a target.")
+        moves = []
+        for motor, target in zip(args[::2], args[1::2]):
+            at_target = yield from self._is_at(motor, target)
+            if at_target:
+                self.num_skipped += 1
+            else:
+                moves.extend([motor, target])
+        if moves:
+            yield from bps.mv(*moves, **kwargs)
+            self.num_moves += len(moves) // 2
+            for motor, target in zip(moves[::2], moves[1::2]):
+                self.setpoints[motor.name] = target
+
+    def __str__(self):
+        return f"{self.num_moves} move(s) commanded, {self.num_skipped} skipped within {self.tolerance}."
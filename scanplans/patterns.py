@@ -0,0 +1,173 @@
+"""Multi-point sampling patterns around the wells of a well plate.
+
+All the functions work on all the wells at once. The offsets of a pattern are an array of shape (n, m, 2) where n
+is the number of wells and m is the number of points in each well.
+"""
+from typing import Tuple
+
+import numpy as np
+
+__all__ = [
+    "PATTERNS",
+    "center",
+    "cross",
+    "subgrid",
+    "circle",
+    "fermat_spiral",
+    "random_in_disk",
+    "make_offsets",
+    "nearest_neighbor_order",
+    "make_trajectories"
+]
+GOLDEN_ANGLE = np.pi * (3. - np.sqrt(5.))
+
+
+def center(num_wells: int) -> np.ndarray:
+    """A single point at the center of each well."""
+    return np.zeros((num_wells, 1, 2))
+
+
+def cross(num_wells: int, dx: float, dy: float) -> np.ndarray:
+    """The center and the four points at (-dx, 0), (dx, 0), (0, dy), (0, -dy)."""
+    offsets = np.array([[0., 0.], [-dx, 0.], [dx, 0.], [0., dy], [0., -dy]])
+    return np.broadcast_to(offsets, (num_wells,) + offsets.shape).copy()
+
+
+def subgrid(num_wells: int, nx: int, ny: int, dx: float, dy: float) -> np.ndarray:
+    """A nx by ny grid with the step dx and dy centered at the well."""
+    xs = (np.arange(nx) - (nx - 1) / 2.) * dx
+    ys = (np.arange(ny) - (ny - 1) / 2.) * dy
+    offsets = np.stack(np.meshgrid(xs, ys, indexing="ij"), axis=-1).reshape(-1, 2)
+    return np.broadcast_to(offsets, (num_wells,) + offsets.shape).copy()
+
+
+def circle(num_wells: int, radius: float, num: int) -> np.ndarray:
+    """The center and num points evenly spaced on a circle of the radius."""
+    theta = 2. * np.pi * np.arange(num) / num
+    ring = radius * np.stack([np.cos(theta), np.sin(theta)], axis=-1)
+    offsets = np.concatenate([np.zeros((1, 2)), ring])
+    return np.broadcast_to(offsets, (num_wells,) + offsets.shape).copy()
+
+
+def fermat_spiral(num_wells: int, radius: float, num: int) -> np.ndarray:
+    """The num points on a Fermat spiral filling the disk of the radius evenly. The first point is the center."""
+    k = np.arange(num)
+    r = radius * np.sqrt(k / max(num - 1, 1))
+    theta = k * GOLDEN_ANGLE
+    offsets = np.stack([r * np.cos(theta), r * np.sin(theta)], axis=-1)
+    return np.broadcast_to(offsets, (num_wells,) + offsets.shape).copy()
+
+
+def random_in_disk(num_wells: int, radius: float, num: int, seed: int = None) -> np.ndarray:
+    """The num points uniformly distributed in the disk of the radius. Each well has its own points."""
+    rng = np.random.default_rng(seed)
+    r = radius * np.sqrt(rng.uniform(size=(num_wells, num)))
+    theta = rng.uniform(0., 2. * np.pi, size=(num_wells, num))
+    return np.stack([r * np.cos(theta), r * np.sin(theta)], axis=-1)
+
+
+PATTERNS = {
+    "center": center,
+    "cross": cross,
+    "grid": subgrid,
+    "circle": circle,
+    "spiral": fermat_spiral,
+    "disk": random_in_disk
+}
+
+
+def make_offsets(pattern: str, num_wells: int, **kwargs) -> np.ndarray:
+    """
+    Make the offsets of a pattern for all the wells.
+
+    Parameters
+    ----------
+    pattern
+        The name of the pattern. One of the keys in PATTERNS.
+    num_wells
+        The number of wells.
+    kwargs
+        The parameters of the pattern function.
+
+    Returns
+    -------
+    offsets
+        The array of shape (num_wells, num_points, 2).
+    """
+    if pattern not in PATTERNS:
+        raise ValueError(f"Unknown pattern '{pattern}'. Expect one of {', '.join(PATTERNS)}.")
+    return PATTERNS[pattern](num_wells, **kwargs)
+
+
+def nearest_neighbor_order(points: np.ndarray, start: np.ndarray = None) -> np.ndarray:
+    """
+    Order the points in each group by always going to the nearest point not visited yet.
+
+    Parameters
+    ----------
+    points
+        The array of shape (n, m, 2). The points in each of the n groups are ordered independently.
+    start
+        (Optional) The index of the first point in each group of shape (n,). Default the point nearest to the
+        centroid of the group.
+
+    Returns
+    -------
+    order
+        The array of shape (n, m) of the indexes of the points in the order of visiting.
+    """
+    n, m = points.shape[:2]
+    rows = np.arange(n)
+    distances = np.linalg.norm(points[:, :, None, :] - points[:, None, :, :], axis=-1)
+    if start is None:
+        centroids = points.mean(axis=1, keepdims=True)
+        start = np.argmin(np.linalg.norm(points - centroids, axis=-1), axis=1)
+    current = np.asarray(start, dtype=int)
+    order = np.empty((n, m), dtype=int)
+    visited = np.zeros((n, m), dtype=bool)
+    for k in range(m):
+        order[:, k] = current
+        visited[rows, current] = True
+        if k < m - 1:
+            current = np.argmin(np.where(visited, np.inf, distances[rows, current]), axis=1)
+    return order
+
+
+def make_trajectories(
+        centers: np.ndarray, offsets: np.ndarray, optimize: bool = True
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Make the trajectories of all the wells.
+
+    Parameters
+    ----------
+    centers
+        The centers of the wells of shape (n, 2).
+    offsets
+        The offsets of the points of shape (n, m, 2).
+    optimize
+        If True, the wells are visited in the nearest neighbor order starting from the first well and the points
+        in each well are visited in the nearest neighbor order starting from the point nearest to the center.
+        Otherwise, the order is not changed.
+
+    Returns
+    -------
+    well_order
+        The indexes of the wells in the order of visiting of shape (n,).
+    trajectories
+        The absolute positions of shape (n, m, 2) in the order of visiting. The first axis follows `well_order`.
+    offsets
+        The offsets of shape (n, m, 2) in the same order as the trajectories.
+    """
+    centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+    offsets = np.asarray(offsets, dtype=float)
+    n, m = offsets.shape[:2]
+    if optimize and n > 0:
+        well_order = nearest_neighbor_order(centers[None], start=np.zeros(1, dtype=int))[0]
+        point_order = nearest_neighbor_order(offsets, start=np.argmin(np.linalg.norm(offsets, axis=-1), axis=1))
+    else:
+        well_order = np.arange(n)
+        point_order = np.broadcast_to(np.arange(m), (n, m))
+    offsets = np.take_along_axis(offsets, point_order[:, :, None], axis=1)[well_order]
+    trajectories = centers[well_order, None, :] + offsets
+    return well_order, trajectories, offsets
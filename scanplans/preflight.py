@@ -0,0 +1,301 @@
+"""Check a whole batch of samples and plans at once before anything is queued."""
+from __future__ import annotations
+
+import typing as tp
+
+import numpy as np
+
+from scanplans._lazy import lazy_import
+from scanplans.autoexposure import AutoExposure
+from scanplans.context import PlanContext, resolve_context
+from scanplans.cryostat import get_heater_ranges
+from scanplans.mdgetters import find_scanplan, get_plan_exposure
+from scanplans.sampletable import SampleTable, NAME_KEY
+from scanplans.spatial import SpatialIndex
+
+pd = lazy_import("pandas")
+Beamtime = lazy_import("xpdacq.beamtime", "Beamtime")
+glbl = lazy_import("xpdacq.glbl", "glbl")
+
+__all__ = [
+    "PreflightReport",
+    "check_lengths",
+    "check_positions",
+    "check_limits",
+    "check_exposures",
+    "check_heater_ranges",
+    "check_duplicates",
+    "preflight_move_and_do",
+    "preflight_autoplan",
+    "preflight_cryostat"
+]
+
+
+class PreflightReport:
+    """
+    A collection of the issues found in the preflight checks.
+
+    Attributes
+    ----------
+    issues
+        A list of (check, item, message). The check is the name of the check. The item is the sample, the plan
+        or the setpoint which fails the check.
+    """
+
+    def __init__(self):
+        self.issues = []  # type: tp.List[tp.Tuple[str, tp.Any, str]]
+
+    def add(self, check: str, item: tp.Any, message: str):
+        """Add an issue."""
+        self.issues.append((check, item, message))
+
+    @property
+    def ok(self) -> bool:
+        """True if there is no issue."""
+        return not self.issues
+
+    def to_frame(self) -> pd.DataFrame:
+        """Get the issues as a table with the columns 'check', 'item' and 'message'."""
+        return pd.DataFrame(self.issues, columns=["check", "item", "message"])
+
+    def raise_for_issues(self):
+        """Raise a ValueError with all the issues if there is any."""
+        if not self.ok:
+            raise ValueError(str(self))
+
+    def __str__(self):
+        if self.ok:
+            return "Preflight passed."
+        lines = [f"Preflight found {len(self.issues)} issue(s):"]
+        lines.extend(f"[{check}] {item}: {message}" for check, item, message in self.issues)
+        return "\n".join(lines)
+
+
+def check_lengths(report: PreflightReport, **sequences: tp.Sequence):
+    """Check that all the sequences have the same length."""
+    lengths = {key: len(value) for key, value in sequences.items()}
+    if len(set(lengths.values())) > 1:
+        report.add(
+            "lengths", ", ".join(lengths),
+            "Unmatched lengths: " + ", ".join(f"{k}={v}" for k, v in lengths.items()) + "."
+        )
+
+
+def check_positions(report: PreflightReport, rows: pd.DataFrame, keys: tp.Sequence[str]) -> np.ndarray:
+    """
+    Check that the samples have numeric positions.
+
+    Parameters
+    ----------
+    report
+        The report to add the issues to.
+    rows
+        The rows of the samples in a SampleTable.
+    keys
+        The keys of the positions.
+
+    Returns
+    -------
+    positions
+        The array of positions of shape (n, len(keys)). The invalid ones are NaN.
+    """
+    raw = rows.reindex(columns=list(keys))
+    missing = raw.isna().to_numpy()
+    positions = raw.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    non_numeric = np.isnan(positions) & ~missing
+    names = rows[NAME_KEY].to_numpy() if NAME_KEY in rows.columns else rows.index.to_numpy()
+    for i, j in zip(*np.nonzero(missing)):
+        report.add("positions", names[i], f"Missing '{keys[j]}'.")
+    for i, j in zip(*np.nonzero(non_numeric)):
+        report.add("positions", names[i], f"Non-numeric '{keys[j]}': {raw.iat[i, j]!r}.")
+    return positions
+
+
+def check_limits(report: PreflightReport, positions: np.ndarray, motors: tp.Sequence, names: tp.Sequence):
+    """Check that the positions of shape (n, len(motors)) are inside the soft limits of the motors. A motor
+    without limits or with the limits (0, 0) is not checked."""
+    positions = np.asarray(positions, dtype=float).reshape(len(names), len(motors))
+    for j, motor in enumerate(motors):
+        low, high = getattr(motor, "limits", (0, 0))
+        if low == high:
+            continue
+        with np.errstate(invalid="ignore"):
+            outside = (positions[:, j] < low) | (positions[:, j] > high)
+        for i in np.flatnonzero(outside):
+            report.add(
+                "limits", names[i],
+                f"Position {positions[i, j]} is outside the limits ({low}, {high}) of {motor.name}."
+            )
+
+
+def check_exposures(report: PreflightReport, exposures: tp.Sequence, names: tp.Sequence,
+                    frame_acq_time: float = None):
+    """Check that the exposures are numbers not shorter than the frame acquisition time. Default
+    glbl['frame_acq_time']."""
+    frame_acq_time = glbl["frame_acq_time"] if frame_acq_time is None else frame_acq_time
+    values = pd.to_numeric(pd.Series(list(exposures), dtype=object), errors="coerce").to_numpy(dtype=float)
+    for i in np.flatnonzero(np.isnan(values)):
+        report.add("exposures", names[i], f"Invalid exposure {exposures[i]!r}.")
+    for i in np.flatnonzero(values < frame_acq_time):
+        report.add(
+            "exposures", names[i],
+            f"Exposure {values[i]} s is shorter than the frame acquisition time {frame_acq_time} s."
+        )
+
+
+def check_heater_ranges(report: PreflightReport, temperatures: tp.Sequence[float], temp_to_power: dict = None):
+    """Check that all the temperatures are covered by a heater range. The ranges are open at left and close at
+    right."""
+    temps = np.asarray(temperatures, dtype=float)
+    try:
+        covered = np.array([value is not None for value in get_heater_ranges(temps, temp_to_power, strict=False)])
+    except ValueError as error:
+        report.add("heater_ranges", temp_to_power, str(error))
+        return
+    for i in np.flatnonzero(~covered):
+        report.add("heater_ranges", temps[i], f"No heater range for the temperature {temps[i]} K.")
+
+
+def check_duplicates(report: PreflightReport, positions: np.ndarray, names: tp.Sequence,
+                     min_distance: float = 1e-6):
+    """Check that no two samples are closer than the minimum distance."""
+    pairs, distances = SpatialIndex(positions).overlaps(min_distance)
+    for (i, j), distance in zip(pairs, distances):
+        report.add(
+            "duplicates", names[i],
+            f"Position is {distance:.3g} from the position of {names[j]}, closer than {min_distance}."
+        )
+
+
+def _labels(samples: tp.Sequence, n: int) -> np.ndarray:
+    """Label n items by the samples. The items without a sample are labeled by their index."""
+    return np.array([str(samples[i]) if i < len(samples) else f"#{i}" for i in range(n)], dtype=object)
+
+
+def _check_samples_and_plans(
+        report: PreflightReport, bt: Beamtime, samples: tp.Sequence, plans: tp.Sequence,
+        keys: tp.Tuple[str, str], motors: tp.Sequence, frame_acq_time: float, min_distance: float
+):
+    """Run the checks shared by the plans which move to the samples and conduct a plan."""
+    table = SampleTable(bt.samples, keys)
+    rows, missing = table.locate(samples)
+    for sample in missing:
+        report.add("samples", sample, "No such sample in the beamtime.")
+    positions = check_positions(report, rows, keys)
+    names = rows[NAME_KEY].to_numpy()
+    check_limits(report, positions, motors, names)
+    unique = ~rows.index.duplicated()
+    check_duplicates(report, positions[unique], names[unique], min_distance)
+    exposures = []
+    exposure_names = []
+    # a plan used by many samples is checked and reported once
+    for plan in dict.fromkeys(plan for plan in plans if isinstance(plan, (int, str))):
+        sp = find_scanplan(bt, plan)
+        if sp is None:
+            report.add("plans", plan, "No such plan in the beamtime.")
+        elif get_plan_exposure(sp) is not None:
+            exposures.append(get_plan_exposure(sp))
+            exposure_names.append(plan)
+    check_exposures(report, exposures, exposure_names, frame_acq_time)
+
+
+def preflight_move_and_do(
+        bt: Beamtime,
+        sps: tp.List[tp.Tuple[tp.Union[int, str], tp.Union[int, str, tp.Generator]]],
+        sample_x: str = "sample_x", sample_y: str = "sample_y",
+        x_controller: str = "x_controller",
+        y_controller: str = "y_controller",
+        frame_acq_time: float = None,
+        min_distance: float = 1e-6,
+        context: PlanContext = None
+) -> PreflightReport:
+    """
+    Check the arguments of `move_and_do_many` for all the samples and plans at once.
+
+    It checks the missing samples and plans, the missing or non-numeric positions, the soft limits of the
+    position controllers, the exposures shorter than the frame acquisition time and the different samples at the
+    same position.
+
+    Parameters
+    ----------
+    bt
+        The beamtime object.
+    sps
+        A list of (sample index, plan index).
+    sample_x, sample_y, x_controller, y_controller
+        The same as `move_and_do_many`.
+    frame_acq_time
+        The frame acquisition time. Default glbl['frame_acq_time'] of the context.
+    min_distance
+        Two different samples closer than this distance are reported.
+    context
+        The configuration to read the controllers and glbl from. See `~scanplans.context.PlanContext`. Default
+        the globals.
+
+    Returns
+    -------
+    report
+        The report of all the issues.
+    """
+    report = PreflightReport()
+    samples = [s for s, _ in sps]
+    plans = [p for _, p in sps]
+    context = resolve_context(context)
+    motors = [context.configuration[x_controller], context.configuration[y_controller]]
+    if frame_acq_time is None:
+        frame_acq_time = context.glbl["frame_acq_time"]
+    _check_samples_and_plans(report, bt, samples, plans, (sample_x, sample_y), motors, frame_acq_time,
+                             min_distance)
+    return report
+
+
+def preflight_autoplan(
+        bt: Beamtime, sample_index: tp.Sequence, plan_index: tp.Sequence,
+        frame_acq_time: float = None, min_distance: float = 1e-6, context: PlanContext = None
+) -> PreflightReport:
+    """Check the arguments of `autoplan` for all the samples and plans at once. See `preflight_move_and_do`."""
+    report = PreflightReport()
+    check_lengths(report, sample_index=sample_index, plan_index=plan_index)
+    context = resolve_context(context)
+    motors = [context.configuration["posx_controller"], context.configuration["posy_controller"]]
+    if frame_acq_time is None:
+        frame_acq_time = context.glbl["frame_acq_time"]
+    _check_samples_and_plans(
+        report, bt, [int(s) for s in sample_index], [int(p) for p in plan_index], ("position_x", "position_y"),
+        motors, frame_acq_time, min_distance
+    )
+    return report
+
+
+def preflight_cryostat(
+        bt: Beamtime, temp_motor: object, temperatures: tp.List[float], posi_motor: object,
+        positions: tp.List[float], samples: tp.List[int], exposures: tp.List[float], temp_to_power: dict = None,
+        frame_acq_time: float = None, min_distance: float = 1e-6, context: PlanContext = None
+) -> PreflightReport:
+    """Check the arguments of `cryostat_plan` for all the temperatures and samples at once. It checks the lengths,
+    the samples, the positions, the soft limits, the exposures, the heater ranges and the duplicated positions.
+    The frame acquisition time is read from the glbl of the context if it is None."""
+    report = PreflightReport()
+    if frame_acq_time is None:
+        frame_acq_time = resolve_context(context).glbl["frame_acq_time"]
+    check_lengths(report, positions=positions, samples=samples, exposures=exposures)
+    table = SampleTable(bt.samples)
+    _, missing = table.locate(samples)
+    for sample in missing:
+        report.add("samples", sample, "No such sample in the beamtime.")
+    position_names = _labels(samples, len(positions))
+    rows = pd.DataFrame({"position": list(positions), NAME_KEY: position_names})
+    pos = check_positions(report, rows, ["position"])
+    check_limits(report, pos, [posi_motor], position_names)
+    unique = ~pd.Index(position_names).duplicated()
+    check_duplicates(report, np.column_stack([pos[:, 0], np.zeros(len(pos))])[unique], position_names[unique],
+                     min_distance)
+    # the automatic exposures are chosen during the plan
+    fixed = [i for i, exposure in enumerate(exposures) if not isinstance(exposure, AutoExposure)]
+    check_exposures(report, [exposures[i] for i in fixed], _labels(samples, len(exposures))[fixed], frame_acq_time)
+    check_heater_ranges(report, temperatures, temp_to_power)
+    check_limits(report, np.asarray(temperatures, dtype=float)[:, None], [temp_motor],
+                 [f"{t} K" for t in temperatures])
+    if not hasattr(temp_motor, "heater_range"):
+        report.add("heater_ranges", getattr(temp_motor, "name", temp_motor), "No attribute 'heater_range'.")
+    return report
@@ -0,0 +1,212 @@
+"""A columnar view of the sample metadata in a Beamtime with vectorized selection."""
+from __future__ import annotations
+
+import copy
+from typing import Any, Dict, List, Mapping, Sequence, Tuple, Union
+
+import numpy as np
+
+from scanplans._lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+__all__ = [
+    "SampleTable",
+    "POS_KEYS",
+    "NAME_KEY"
+]
+POS_KEYS = (
+    "sample_x",
+    "sample_y"
+)
+NAME_KEY = "sample_name"
+
+
+class SampleTable:
+    """
+    A pandas table of all the samples in a beamtime. One row per sample, one column per metadata key.
+
+    The row index is the sample index shown in `bt.list()`. The values are kept as they are in the metadata. The
+    positions are converted to numbers when they are used and a missing or non-numeric position becomes NaN.
+
+    Attributes
+    ----------
+    _samples
+        The mapping from the sample name to the sample metadata, usually `bt.samples`.
+    _pos_key
+        The keys of the horizontal position and vertical position fields.
+    _records
+        The cache of the flat metadata of each sample. Key is the sample name.
+    _order
+        The sample names in the order of the rows.
+    frame
+        The table of the sample metadata.
+    version
+        A counter which increases every time the table changes.
+    """
+
+    def __init__(self, samples: Mapping[str, Mapping], pos_key: Tuple[str, str] = POS_KEYS):
+        """
+        Initiate the class instance and build the table.
+
+        Parameters
+        ----------
+        samples
+            The mapping from the sample name to the sample metadata, usually `bt.samples`.
+        pos_key
+            (Optional) The keys of the horizontal position and vertical position fields. Default POS_KEYS
+        """
+        self._samples = samples
+        self._pos_key = pos_key
+        self._records = {}  # type: Dict[str, Dict[str, Any]]
+        self._order = []
+        self.frame = pd.DataFrame(columns=[NAME_KEY] + list(pos_key))
+        self.version = 0
+        self.refresh()
+
+    def __len__(self):
+        return len(self.frame)
+
+    def refresh(self, *names: str) -> bool:
+        """
+        Update the table from the samples. The metadata of each sample is compared with the cached record and only
+        the new and changed samples are read into the table.
+
+        Parameters
+        ----------
+        names
+            The names of the samples to read again even if their metadata looks the same.
+
+        Returns
+        -------
+        changed
+            True if the table has been changed.
+        """
+        order = list(self._samples.keys())
+        # the samples are often edited in place so the records are compared by the values
+        records = {name: _to_record(name, self._samples[name]) for name in order}
+        stale = [name for name in order if name in names or self._records.get(name) != records[name]]
+        removed = set(self._records) - set(order)
+        if not stale and not removed and order == self._order:
+            return False
+        for name in removed:
+            del self._records[name]
+        for name in stale:
+            self._records[name] = records[name]
+        new_columns = set().union(*(self._records[name].keys() for name in stale)) - set(self.frame.columns)
+        if order == self._order and not new_columns:
+            rows = [order.index(name) for name in stale]
+            update = self._build([self._records[name] for name in stale], rows)
+            self.frame.loc[rows, update.columns] = update
+        else:
+            self.frame = self._build([self._records[name] for name in order], range(len(order)))
+        self._order = order
+        self.version += 1
+        return True
+
+    def _build(self, records: list, index) -> pd.DataFrame:
+        """Build a frame from the records with all the position columns."""
+        frame = pd.DataFrame.from_records(records, index=pd.Index(index))
+        for key in self._pos_key:
+            if key not in frame.columns:
+                frame[key] = None
+        return frame
+
+    def select(
+            self,
+            mask: Union[np.ndarray, pd.Series] = None,
+            name: str = None,
+            ranges: Dict[str, Tuple[float, float]] = None,
+            **equals
+    ) -> pd.DataFrame:
+        """
+        Select the rows of samples. All the conditions are combined by logical and.
+
+        Parameters
+        ----------
+        mask
+            (Optional) A boolean array of the same length as the table.
+        name
+            (Optional) A regular expression searched in the sample names.
+        ranges
+            (Optional) A mapping from a column to the (low, high) bounds. The bounds are included.
+        equals
+            The column and the value it should equal.
+
+        Returns
+        -------
+        rows
+            The selected rows of the table.
+
+        Examples
+        --------
+        The samples whose names start with "Ni" and are on the left half of the rack.
+        >>> table.select(name="^Ni", ranges={"sample_x": (0., 50.)})
+        """
+        frame = self.frame
+        selected = np.ones(len(frame), dtype=bool)
+        if mask is not None:
+            selected &= np.asarray(mask, dtype=bool)
+        if name is not None:
+            selected &= frame[NAME_KEY].astype(str).str.contains(name, regex=True).to_numpy()
+        for key, (low, high) in (ranges or {}).items():
+            selected &= pd.to_numeric(frame[key], errors="coerce").between(low, high).to_numpy()
+        for key, value in equals.items():
+            selected &= (frame[key] == value).to_numpy()
+        return frame[selected]
+
+    def locate(self, samples: Sequence[Union[int, str]]) -> Tuple[pd.DataFrame, List[Union[int, str]]]:
+        """
+        Get the rows of the samples by the sample index or sample name key.
+
+        Parameters
+        ----------
+        samples
+            The sample indexes or sample name keys. They can be mixed.
+
+        Returns
+        -------
+        rows
+            The rows of the samples found in the same order. The same sample can appear more than once.
+        missing
+            The samples not found.
+        """
+        positions = {name: i for i, name in enumerate(self._order)}
+        found, missing = [], []
+        for sample in samples:
+            if isinstance(sample, str):
+                i = positions.get(sample)
+            elif isinstance(sample, (int, np.integer)) and -len(self._order) <= sample < len(self._order):
+                i = int(sample) % len(self._order)
+            else:
+                i = None
+            if i is None:
+                missing.append(sample)
+            else:
+                found.append(i)
+        return self.frame.iloc[found], missing
+
+    def positions(self, rows: pd.DataFrame = None) -> np.ndarray:
+        """
+        Get the positions of the samples as an array of shape (n, 2).
+
+        Parameters
+        ----------
+        rows
+            (Optional) The selected rows. If None, all the samples.
+
+        Returns
+        -------
+        positions
+            The horizontal and vertical positions. Missing values are NaN.
+        """
+        rows = self.frame if rows is None else rows
+        return rows[list(self._pos_key)].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+
+
+def _to_record(name: str, sample: Mapping) -> Dict[str, Any]:
+    """Copy the metadata of a sample into a flat record. The values are deep copied so that the nested values
+    edited in place, e.g. a list of tags, are seen as changed by the next refresh."""
+    record = {key: copy.deepcopy(value) for key, value in sample.items()}
+    record.setdefault(NAME_KEY, name)
+    return record
@@ -0,0 +1,333 @@
+"""Choose and order the measurements of the samples to fit in the time left for the beamtime.
+
+A `Job` is a plan to conduct on a sample with a priority and a range of exposure. The work of a job is its priority
+times the fraction of the ideal exposure it gets. `make_schedule` estimates the time of each job from the motion
+to the sample, the wait time, the exposure and the overhead of the plan and orders the jobs to complete the most
+work in the time budget. `run_schedule` conducts the schedule by `move_and_do_one` and makes a new schedule when
+the real time drifts away from the forecast.
+"""
+from __future__ import annotations
+
+import time
+import typing as tp
+
+import bluesky.plan_stubs as bps
+import numpy as np
+
+from scanplans._lazy import lazy_import
+from scanplans.context import PlanContext, resolve_context
+from scanplans.mdgetters import find_scanplan, get_plan_exposure
+from scanplans.move_and_do import move_and_do_many, move_and_do_one
+from scanplans.sampletable import SampleTable, NAME_KEY
+from scanplans.sim import MotorModel
+
+pd = lazy_import("pandas")
+Beamtime = lazy_import("xpdacq.beamtime", "Beamtime")
+
+__all__ = [
+    "Job",
+    "Schedule",
+    "make_schedule",
+    "run_schedule"
+]
+
+
+class Job:
+    """
+    A plan to conduct on a sample.
+
+    Attributes
+    ----------
+    sample
+        The sample index or sample name key.
+    plan
+        The plan index or plan name key of a ScanPlan in the beamtime, or a function from the exposure time to a
+        plan.
+    priority
+        The work of the job if it gets the ideal exposure.
+    min_exposure
+        The shortest useful exposure in second. Default the exposure of the ScanPlan.
+    ideal_exposure
+        The exposure which gives all the work in second. Default the min_exposure.
+    duration
+        (Optional) The time of the plan in second if it is not the exposure, e.g. a temperature ramp. The overhead
+        is not added to it.
+    """
+
+    def __init__(self, sample: tp.Union[int, str], plan: tp.Union[int, str, tp.Callable[[float], tp.Generator]],
+                 priority: float = 1., min_exposure: float = None, ideal_exposure: float = None,
+                 duration: float = None):
+        self.sample = sample
+        self.plan = plan
+        self.priority = priority
+        self.min_exposure = min_exposure
+        self.ideal_exposure = ideal_exposure
+        self.duration = duration
+
+    def __repr__(self):
+        return f"Job({self.sample!r}, {self.plan!r}, priority={self.priority})"
+
+    def exposure_range(self, bt: Beamtime) -> tp.Tuple[float, float]:
+        """Get the (min, ideal) exposure. The exposure of a ScanPlan cannot be changed."""
+        if not callable(self.plan):
+            sp = find_scanplan(bt, self.plan)
+            if sp is None:
+                raise ValueError(f"No plan {self.plan!r} in the beamtime.")
+            exposure = float(get_plan_exposure(sp) or 0.)
+            return exposure, exposure
+        if self.min_exposure is None:
+            raise ValueError(f"{self} needs the min_exposure.")
+        ideal = self.ideal_exposure if self.ideal_exposure is not None else self.min_exposure
+        return float(self.min_exposure), float(max(ideal, self.min_exposure))
+
+    def make_plan(self, exposure: float) -> tp.Union[int, str, tp.Generator]:
+        """Get the plan for `move_and_do_one` with the exposure."""
+        return self.plan(exposure) if callable(self.plan) else self.plan
+
+
+class Schedule:
+    """
+    The jobs in the order to conduct them.
+
+    Attributes
+    ----------
+    entries
+        A list of dictionaries, one for each job in the order. The keys are 'job', 'position', 'exposure',
+        'start', 'duration' and 'work'. The start is the forecast time from the beginning of the schedule.
+    skipped
+        The jobs which do not fit in the budget.
+    budget
+        The time budget in second.
+    """
+
+    def __init__(self, entries: tp.List[dict], skipped: tp.List[Job], budget: float):
+        self.entries = entries
+        self.skipped = skipped
+        self.budget = budget
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def total_duration(self) -> float:
+        """The forecast time of all the jobs."""
+        return sum(e["duration"] for e in self.entries)
+
+    @property
+    def work(self) -> float:
+        """The forecast priority weighted work."""
+        return sum(e["work"] for e in self.entries)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Get the schedule as a table."""
+        return pd.DataFrame(
+            [
+                {
+                    "sample": e["job"].sample, "plan": e["job"].plan, "priority": e["job"].priority,
+                    "exposure": e["exposure"], "start": e["start"], "duration": e["duration"], "work": e["work"]
+                }
+                for e in self.entries
+            ],
+            columns=["sample", "plan", "priority", "exposure", "start", "duration", "work"]
+        )
+
+    def to_plans(self, bt: Beamtime, wait_time: float = 0., **kwargs) -> tp.List[tp.Generator]:
+        """Get the plans of the jobs in the order by `move_and_do_many`. The kwargs are passed to it."""
+        sps = [(e["job"].sample, e["job"].make_plan(e["exposure"])) for e in self.entries]
+        positions = [e["position"] for e in self.entries]
+        return move_and_do_many(bt, sps, wait_times=wait_time, wait_at_first=True, positions=positions, **kwargs)
+
+    def __str__(self):
+        return (
+            f"{len(self.entries)} job(s) in {self.total_duration:.0f} s of the {self.budget:.0f} s budget with "
+            f"the work {self.work:.3g}. {len(self.skipped)} job(s) skipped."
+        )
+
+
+def make_schedule(
+        bt: Beamtime,
+        jobs: tp.Sequence[Job],
+        budget: float,
+        start: tp.Tuple[float, float] = (0., 0.),
+        motor: MotorModel = None,
+        wait_time: float = 0.,
+        overhead: float = 0.,
+        sample_x: str = "sample_x", sample_y: str = "sample_y"
+) -> Schedule:
+    """
+    Choose, order and set the exposure of the jobs to complete the most priority weighted work in the budget.
+
+    From the current position, the next job is the one with the most work per second at its minimum exposure,
+    including the motion to the sample, which still fits in the budget. The time left at the end is given to the
+    jobs with the most work per second of extra exposure until they reach the ideal exposure.
+
+    Parameters
+    ----------
+    bt
+        The beamtime object.
+    jobs
+        The jobs to schedule.
+    budget
+        The time left in second.
+    start
+        The current (x, y) position.
+    motor
+        The motion model of both the x and y controller. They move at the same time. Default MotorModel().
+    wait_time
+        The time to wait after the motion in second.
+    overhead
+        The time of a plan besides the exposure in second, e.g. the dark frame and the shutter.
+    sample_x, sample_y
+        The keys of the position in the sample information.
+
+    Returns
+    -------
+    schedule
+        The ordered jobs.
+    """
+    motor = motor if motor is not None else MotorModel()
+    if not jobs:
+        return Schedule([], [], budget)
+    table = SampleTable(bt.samples, (sample_x, sample_y))
+    rows, missing = table.locate([job.sample for job in jobs])
+    if missing:
+        raise ValueError(f"No such samples in the beamtime: {missing}.")
+    positions = table.positions(rows)
+    no_position = np.isnan(positions).any(axis=1)
+    if np.any(no_position):
+        raise ValueError(f"No position for the samples: {rows[NAME_KEY][no_position].tolist()}.")
+    ranges = np.array([job.exposure_range(bt) for job in jobs], dtype=float).reshape(-1, 2)
+    fixed = np.array([job.duration if job.duration is not None else np.nan for job in jobs], dtype=float)
+    # the time at the sample with the minimum exposure and the work per second of extra exposure
+    base = np.where(np.isnan(fixed), ranges[:, 0] + overhead, fixed) + wait_time
+    priority = np.array([job.priority for job in jobs], dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(ranges[:, 1] > 0, ranges[:, 0] / ranges[:, 1], 1.)
+    min_work = priority * fraction
+    left = float(budget)
+    here = np.asarray(start, dtype=float)
+    todo = np.ones(len(jobs), dtype=bool)
+    order, durations = [], []
+    while todo.any():
+        move = np.max(motor.move_time(positions - here), axis=1) + motor.settle_time
+        cost = move + base
+        with np.errstate(divide="ignore", invalid="ignore"):
+            density = np.where(cost > 0, min_work / cost, np.inf)
+        density[~todo | (cost > left)] = -np.inf
+        i = int(np.argmax(density))
+        if density[i] == -np.inf:
+            break
+        order.append(i)
+        durations.append(cost[i])
+        left -= cost[i]
+        todo[i] = False
+        here = positions[i]
+    # give the time left to the extra exposure
+    exposures = ranges[:, 0].copy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gain = np.where(ranges[:, 1] > 0, priority / ranges[:, 1], 0.)
+    for i in sorted(order, key=lambda j: -gain[j]):
+        if left <= 0:
+            break
+        if not np.isnan(fixed[i]):
+            continue
+        extra = min(ranges[i, 1] - ranges[i, 0], left)
+        exposures[i] += extra
+        left -= extra
+    entries = []
+    now = 0.
+    for i, duration in zip(order, durations):
+        duration = duration + exposures[i] - ranges[i, 0]
+        work = priority[i] * (exposures[i] / ranges[i, 1] if ranges[i, 1] > 0 else 1.)
+        entries.append(
+            {
+                "job": jobs[i], "position": tuple(positions[i]), "exposure": exposures[i], "start": now,
+                "duration": duration, "work": work
+            }
+        )
+        now += duration
+    skipped = [jobs[i] for i in np.flatnonzero(todo)]
+    return Schedule(entries, skipped, budget)
+
+
+def run_schedule(
+        bt: Beamtime,
+        jobs: tp.Sequence[Job],
+        budget: float,
+        motor: MotorModel = None,
+        wait_time: float = 0.,
+        overhead: float = 0.,
+        tolerance: float = 60.,
+        clock: tp.Callable[[], float] = time.time,
+        sample_x: str = "sample_x", sample_y: str = "sample_y",
+        x_controller: str = "x_controller",
+        y_controller: str = "y_controller",
+        context: PlanContext = None
+):
+    """
+    Make a schedule and conduct the jobs. Before each job, if the elapsed time differs from the forecast by more
+    than the tolerance, a new schedule is made for the jobs not done yet in the budget left.
+
+    Parameters
+    ----------
+    bt, jobs, budget, motor, wait_time, overhead, sample_x, sample_y
+        The same as `make_schedule`.
+    tolerance
+        The drift from the forecast in second to make a new schedule.
+    clock
+        The function which returns the current time in second.
+    x_controller, y_controller
+        The keys of the position controllers in the configuration of the context.
+    context
+        The configuration to read the devices from. See `~scanplans.context.PlanContext`. Default the globals.
+
+    Yields
+    ------
+    Msg
+        The messages of the plans.
+
+    Returns
+    -------
+    report
+        The jobs done, the jobs skipped and the number of schedules made.
+
+    Examples
+    --------
+    Measure as much as possible in the next two hours.
+    >>> jobs = [Job(0, 0, priority=2.), Job(1, lambda t: count_plan(t), min_exposure=10, ideal_exposure=60)]
+    >>> xrun({}, run_schedule(bt, jobs, 7200., wait_time=5.))
+    """
+    context = resolve_context(context)
+    xc = context.configuration[x_controller]
+    yc = context.configuration[y_controller]
+    t0 = clock()
+    x = yield from bps.rd(xc)
+    y = yield from bps.rd(yc)
+    kwargs = dict(motor=motor, wait_time=wait_time, overhead=overhead, sample_x=sample_x, sample_y=sample_y)
+    schedule = make_schedule(bt, jobs, budget, start=(x, y), **kwargs)
+    print(f"INFO: {schedule}")
+    pending = list(schedule.entries)
+    offset = 0.
+    done = []
+    num_schedules = 1
+    while pending:
+        elapsed = clock() - t0
+        drift = elapsed - offset - pending[0]["start"]
+        if abs(drift) > tolerance:
+            remaining = [e["job"] for e in pending] + schedule.skipped
+            schedule = make_schedule(bt, remaining, budget - elapsed, start=(x, y), **kwargs)
+            print(f"INFO: {elapsed:.0f} s elapsed, {drift:+.0f} s from the forecast. New schedule: {schedule}")
+            pending = list(schedule.entries)
+            offset = elapsed
+            num_schedules += 1
+            continue
+        entry = pending.pop(0)
+        job = entry["job"]
+        yield from move_and_do_one(
+            bt, job.sample, job.make_plan(entry["exposure"]), wait_time=wait_time, sample_x=sample_x,
+            sample_y=sample_y, x_controller=x_controller, y_controller=y_controller, position=entry["position"],
+            context=context
+        )
+        x, y = entry["position"]
+        done.append(job)
+    return {"done": done, "skipped": schedule.skipped, "num_schedules": num_schedules}
@@ -0,0 +1,165 @@
+"""Wait after a move for a time which depends on how far each axis has moved.
+
+The plans wait the same time after every move, whether the stage moved 0.1 mm or 200 mm, so the short hops pay
+the settle time of the longest move. A `SettleModel` computes the wait from the distance each motor has actually
+moved, measured by its readback before and after the move, and starts it when the move is done. It can also wait
+until the readbacks stop changing.
+"""
+import typing as tp
+
+import bluesky.plan_stubs as bps
+import numpy as np
+
+__all__ = [
+    "SettleModel"
+]
+
+
+class SettleModel:
+    """
+    The wait after a move as a function of the distance moved by each axis.
+
+    The wait of an axis is `min(base + rate * distance, maximum)` or the function of the axis. An axis which has
+    not moved does not wait. The wait after a move is the longest wait of the axes. The distance is not known when
+    the plan is not run by a RunEngine, e.g. in `summarize_plan`, and is then taken as zero.
+
+    Attributes
+    ----------
+    base
+        The wait in second after any move.
+    rate
+        The extra wait in second per unit of distance.
+    maximum
+        The longest wait in second from the distance.
+    axes
+        The function from the distance to the wait in second by the name of the motor, e.g. a slower stage. They
+        replace the base, rate and maximum for these motors.
+    tolerance
+        If not None, after the wait, the readbacks are read every poll second until they change by no more than
+        the tolerance for the window second or the timeout.
+    window, poll, timeout
+        The time in second for the readbacks to be stable, between the reads and to give up with a warning.
+
+    Examples
+    --------
+    Wait 1 s plus 0.1 s per mm up to 10 s and until the stage is stable to 1 um.
+    >>> settle = SettleModel(base=1., rate=0.1, maximum=10., tolerance=1e-3)
+    >>> plans = move_and_do_many(bt, [(0, 0), (1, 0)], settle=settle)
+    """
+
+    def __init__(self, base: float = 0., rate: float = 0., maximum: float = np.inf,
+                 axes: tp.Mapping[str, tp.Callable[[float], float]] = None, tolerance: float = None,
+                 window: float = 0.5, poll: float = 0.1, timeout: float = 10.):
+        if base < 0 or rate < 0 or maximum < 0:
+            raise ValueError(f"The base, rate and maximum must be non-negative: {base}, {rate}, {maximum}.")
+        if tolerance is not None and (tolerance < 0 or poll <= 0):
+            raise ValueError(f"The tolerance must be non-negative and the poll positive: {tolerance}, {poll}.")
+        self.base = base
+        self.rate = rate
+        self.maximum = maximum
+        self.axes = dict(axes) if axes else {}
+        self.tolerance = tolerance
+        self.window = window
+        self.poll = poll
+        self.timeout = timeout
+
+    def wait_time(self, distances: tp.Mapping[str, float]) -> float:
+        """The wait in second after the motors moved the distances by the name."""
+        waits = [0.]
+        for name, distance in distances.items():
+            if not distance > 0:
+                continue
+            if name in self.axes:
+                waits.append(float(self.axes[name](distance)))
+            else:
+                waits.append(min(self.base + self.rate * distance, self.maximum))
+        return max(waits)
+
+    @staticmethod
+    def locate(*motors) -> tp.Generator:
+        """Read the positions of the motors. Return them by the name. A position is None if it can not be read."""
+        positions = {}
+        for motor in motors:
+            positions[motor.name] = yield from bps.rd(motor, default_value=None)
+        return positions
+
+    def _wait_stable(self, motors: tp.Sequence, last: tp.Mapping[str, tp.Any]) -> tp.Generator:
+        """Read the motors until they change by no more than the tolerance for the window or the timeout."""
+        stable = waited = 0.
+        while stable < self.window:
+            if waited >= self.timeout:
+                print(f"WARNING: {', '.join(last)} not stable to {self.tolerance} in {self.timeout} s.")
+                return
+            yield from bps.sleep(self.poll)
+            waited += self.poll
+            now = yield from self.locate(*motors)
+            if any(value is None for value in now.values()):
+                return
+            changes = [abs(now[name] - last[name]) for name in now]
+            stable = stable + self.poll if max(changes, default=0.) <= self.tolerance else 0.
+            last = now
+
+    def settle(self, before: tp.Mapping[str, tp.Any], *motors) -> tp.Generator:
+        """
+        Wait after the motors moved from the positions before, from `locate`.
+
+        Parameters
+        ----------
+        before
+            The positions of the motors by the name before the move.
+        motors
+            The motors which may have moved.
+
+        Yields
+        ------
+        Msg
+            The messages to read the motors and wait.
+
+        Returns
+        -------
+        wait
+            The wait in second from the distances, without the time for the readbacks to be stable.
+        """
+        after = yield from self.locate(*motors)
+        distances = {
+            name: abs(after[name] - before[name]) if after[name] is not None and before.get(name) is not None
+            else 0.
+            for name in after
+        }
+        wait = self.wait_time(distances)
+        print("INFO: settle for {:.3g} s after the move of {}.".format(
+            wait, ", ".join(f"{name} by {distance:.4g}" for name, distance in distances.items())
+        ))
+        if wait > 0:
+            yield from bps.sleep(wait)
+        if self.tolerance is not None and wait > 0 and all(value is not None for value in after.values()):
+            yield from self._wait_stable(motors, after)
+        return wait
+
+    def mv(self, *args, move: tp.Callable[..., tp.Generator] = None, **kwargs) -> tp.Generator:
+        """
+        Move the motors to the targets and wait for them to settle.
+
+        Parameters
+        ----------
+        args
+            The motors and the targets, e.g. `x_motor, 1., y_motor, 2.`.
+        move
+            The plan stub to move the motors, e.g. `~scanplans.moves.MoveTracker.mv`. Default `bps.mv`.
+        kwargs
+            The keyword arguments of the move.
+
+        Yields
+        ------
+        Msg
+            The messages to move and wait.
+
+        Returns
+        -------
+        wait
+            The wait in second from the distances.
+        """
+        motors = args[::2]
+        before = yield from self.locate(*motors)
+        yield from (move if move is not None else bps.mv)(*args, **kwargs)
+        return (yield from self.settle(before, *motors))
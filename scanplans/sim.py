@@ -0,0 +1,417 @@
+"""A simulated beamline with a virtual clock to run whole plans in no time.
+
+The `SimBeamline` consumes the messages of a plan like a RunEngine but never touches the devices and never
+sleeps. It keeps the values of the devices and a virtual clock. The time of each operation is given by the
+latency model of the device: the motion profile of a motor, the actuation delay of a shutter, the frames and
+readout of an area detector and the first-order lag of a temperature controller. At the end, it reports the
+simulated duration of the plan.
+"""
+import math
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Generator, Union
+
+import bluesky.plan_stubs as bps
+import numpy as np
+
+import scanplans.tools as tl
+
+__all__ = [
+    "VirtualClock",
+    "LatencyModel",
+    "MotorModel",
+    "ShutterModel",
+    "AreaDetectorModel",
+    "TemperatureModel",
+    "SimResult",
+    "SimBeamline"
+]
+
+
+class VirtualClock:
+    """
+    A clock which only moves forward when it is told to.
+
+    Attributes
+    ----------
+    time
+        The current time in second.
+    """
+
+    def __init__(self, start: float = 0.):
+        self.time = start
+
+    def advance(self, seconds: float):
+        """Move the clock forward by the seconds."""
+        if seconds > 0:
+            self.time += seconds
+
+    def advance_to(self, when: float):
+        """Move the clock forward to the time if it is later than now."""
+        self.time = max(self.time, when)
+
+
+class _ClockTime:
+    """The time module whose time() is the virtual clock. It counts the reads of the clock in 'calls'."""
+
+    def __init__(self, clock: VirtualClock):
+        self._clock = clock
+        self.calls = 0
+
+    def time(self) -> float:
+        self.calls += 1
+        return self._clock.time
+
+    def __getattr__(self, item):
+        return getattr(time, item)
+
+
+class LatencyModel:
+    """
+    The base class of the latency models. A model keeps the value of one device.
+
+    Attributes
+    ----------
+    setpoint
+        The last target of the device.
+    """
+
+    def __init__(self, value: Any = 0.):
+        self.setpoint = value
+        self._value = value
+
+    def set(self, target: Any, now: float) -> float:
+        """Start to move the device to the target at the time now. Return the time when it is done."""
+        self._value = self.setpoint = target
+        return now
+
+    def trigger(self, now: float, values: Dict[str, Any]) -> float:
+        """Start an acquisition at the time now. Return the time when it is done. The values are the values of
+        all the devices in the beamline by the name."""
+        return now
+
+    def value(self, now: float) -> Any:
+        """The value of the device at the time now."""
+        return self._value
+
+
+class MotorModel(LatencyModel):
+    """
+    A motor with a trapezoidal velocity profile.
+
+    Attributes
+    ----------
+    velocity
+        The maximum speed in unit per second.
+    acceleration
+        The acceleration in unit per second squared. If None, the motor reaches the velocity at once.
+    settle_time
+        The time to settle after the motion in second.
+    """
+
+    def __init__(self, velocity: float = 1., acceleration: float = None, settle_time: float = 0.,
+                 value: float = 0.):
+        super(MotorModel, self).__init__(value)
+        self.velocity = velocity
+        self.acceleration = acceleration
+        self.settle_time = settle_time
+        self._start = value
+        self._t0 = self._t1 = 0.
+
+    def move_time(self, distance: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        """The time to move over the distance, not including the settle time. It works on arrays."""
+        distance = np.abs(distance)
+        if not self.acceleration:
+            return distance / self.velocity
+        # the motor never reaches the maximum speed on a short distance
+        short = 2. * np.sqrt(distance / self.acceleration)
+        long = distance / self.velocity + self.velocity / self.acceleration
+        return np.where(distance < self.velocity ** 2 / self.acceleration, short, long)[()]
+
+    def set(self, target: float, now: float) -> float:
+        self._start = self.value(now)
+        self.setpoint = target
+        self._t0 = now
+        self._t1 = now + float(self.move_time(target - self._start))
+        return self._t1 + self.settle_time
+
+    def value(self, now: float) -> float:
+        if now >= self._t1:
+            return self.setpoint
+        fraction = (now - self._t0) / (self._t1 - self._t0)
+        return self._start + fraction * (self.setpoint - self._start)
+
+
+class ShutterModel(LatencyModel):
+    """
+    A shutter which takes the delay to open or close.
+
+    Attributes
+    ----------
+    delay
+        The actuation time in second.
+    ack_time
+        The time in second for the set to complete. Default the delay. A shorter one is a command which returns
+        before the blade has moved, so that only the readback tells when it is done.
+    """
+
+    def __init__(self, delay: float = 0.1, value: Any = 0, ack_time: float = None):
+        super(ShutterModel, self).__init__(value)
+        self.delay = delay
+        self.ack_time = delay if ack_time is None else ack_time
+        self._arrival = -math.inf
+
+    def set(self, target: Any, now: float) -> float:
+        changed = target != self.setpoint
+        if changed:
+            self._value, self._arrival = self.setpoint, now + self.delay
+        self.setpoint = target
+        return now + min(self.ack_time, self.delay) if changed else now
+
+    def value(self, now: float) -> Any:
+        return self.setpoint if now >= self._arrival else self._value
+
+
+class AreaDetectorModel(LatencyModel):
+    """
+    An area detector which sums up frames. The time of an acquisition is `num_frames * (frame_time +
+    readout_time)`. The frame time and the number of frames are the values set to the `cam.acquire_time` and
+    `images_per_set` of the detector.
+
+    Attributes
+    ----------
+    readout_time
+        The readout time per frame in second.
+    frame_time
+        The frame time in second if it has never been set.
+    num_frames
+        The number of frames if it has never been set.
+    frame_time_key, num_frames_key
+        The names of the signals of the frame time and the number of frames.
+    """
+
+    def __init__(self, readout_time: float = 0., frame_time: float = 0.1, num_frames: int = 1,
+                 frame_time_key: str = "acquire_time", num_frames_key: str = "images_per_set"):
+        super(AreaDetectorModel, self).__init__(0.)
+        self.readout_time = readout_time
+        self.frame_time = frame_time
+        self.num_frames = num_frames
+        self.frame_time_key = frame_time_key
+        self.num_frames_key = num_frames_key
+
+    def trigger(self, now: float, values: Dict[str, Any]) -> float:
+        frame_time = values.get(self.frame_time_key, self.frame_time)
+        num_frames = values.get(self.num_frames_key, self.num_frames)
+        return now + num_frames * (frame_time + self.readout_time)
+
+
+class TemperatureModel(LatencyModel):
+    """
+    A temperature controller with a first-order lag. After a new setpoint at t0, the temperature is
+    `setpoint + (T0 - setpoint) * exp(-(t - t0) / tau)`. A set is done when the temperature is within the
+    tolerance of the setpoint.
+
+    Attributes
+    ----------
+    tau
+        The time constant in second.
+    tolerance
+        The deadband of a set in kelvin.
+    """
+
+    def __init__(self, tau: float = 60., tolerance: float = 0.5, value: float = 295.):
+        super(TemperatureModel, self).__init__(value)
+        self.tau = tau
+        self.tolerance = tolerance
+        self._start = value
+        self._t0 = 0.
+
+    def set(self, target: float, now: float) -> float:
+        self._start = self.value(now)
+        self.setpoint = target
+        self._t0 = now
+        gap = abs(target - self._start)
+        if gap <= self.tolerance:
+            return now
+        return now + self.tau * math.log(gap / self.tolerance)
+
+    def value(self, now: float) -> float:
+        return self.setpoint + (self._start - self.setpoint) * math.exp(-(now - self._t0) / self.tau)
+
+
+class SimResult:
+    """
+    The summary of a simulated run of a plan.
+
+    Attributes
+    ----------
+    duration
+        The simulated time from the first to the last message in second.
+    wall_time
+        The real time spent on the simulation in second.
+    num_events
+        The number of events saved.
+    num_runs
+        The number of runs opened.
+    commands
+        The count of the messages by the command.
+    busy
+        The time each device is busy by the name in second.
+    sleep
+        The total time of sleep in second.
+    plan_result
+        The return value of the plan.
+    """
+
+    def __init__(self):
+        self.duration = 0.
+        self.wall_time = 0.
+        self.num_events = 0
+        self.num_runs = 0
+        self.commands = Counter()
+        self.busy = defaultdict(float)
+        self.sleep = 0.
+        self.plan_result = None
+
+    def __str__(self):
+        return (
+            f"Simulated {self.duration:.1f} s in {self.wall_time:.3f} s of wall time: {self.num_runs} run(s), "
+            f"{self.num_events} event(s), {sum(self.commands.values())} message(s)."
+        )
+
+
+class SimBeamline:
+    """
+    Run the plans against latency models of the devices on a virtual clock.
+
+    The devices without a model are set instantly and read as the last value set to them or 0. The readings use
+    the keys in `describe` of the device.
+
+    Attributes
+    ----------
+    clock
+        The virtual clock.
+    models
+        The latency models of the devices by the name.
+    values
+        The last values set to the devices without a model by the name.
+    result
+        The summary of the current or last run.
+
+    Examples
+    --------
+    >>> sim = SimBeamline()
+    >>> sim.add(xpd_configuration["temp_controller"], TemperatureModel(tau=120.))
+    >>> result = sim.run(Tramp3([], 60, 30, 300, 500, 10))
+    >>> print(result.duration)
+    """
+
+    def __init__(self, clock: VirtualClock = None):
+        self.clock = clock if clock is not None else VirtualClock()
+        self.models = {}  # type: Dict[str, LatencyModel]
+        self.values = {}  # type: Dict[str, Any]
+        self._groups = defaultdict(float)  # type: Dict[Any, float]
+        self.result = SimResult()
+
+    def add(self, obj: Any, model: LatencyModel) -> LatencyModel:
+        """Use the latency model for the device. Return the model."""
+        self.models[obj.name] = model
+        return model
+
+    def value(self, obj: Any) -> Any:
+        """The current value of the device."""
+        model = self.models.get(obj.name)
+        if model is not None:
+            return model.value(self.clock.time)
+        return self.values.get(obj.name, 0.)
+
+    @contextmanager
+    def virtual_time(self):
+        """Let the plan stubs which compute the sleeps from the wall clock, e.g. `bps.repeat` in `count` with a
+        delay and `~scanplans.tools.cadence_count`, use the virtual clock instead. Yield the time module, whose
+        'calls' is the number of reads of the clock."""
+        bps.time = tl.time = clock = _ClockTime(self.clock)
+        try:
+            yield clock
+        finally:
+            bps.time = tl.time = time
+
+    def _read(self, obj: Any) -> dict:
+        value = self.value(obj)
+        now = self.clock.time
+        keys = list(obj.describe()) if hasattr(obj, "describe") else [obj.name]
+        return {key: {"value": value, "timestamp": now} for key in keys}
+
+    def _locate(self, obj: Any) -> dict:
+        model = self.models.get(obj.name)
+        setpoint = model.setpoint if model is not None else self.values.get(obj.name, 0.)
+        return {"setpoint": setpoint, "readback": self.value(obj)}
+
+    def _done(self, obj: Any, group: Any, end: float):
+        self.result.busy[obj.name] += end - self.clock.time
+        self._groups[group] = max(self._groups[group], end)
+
+    def respond(self, msg) -> Any:
+        """Act on the message and return what a RunEngine would send back."""
+        command = msg.command
+        self.result.commands[command] += 1
+        now = self.clock.time
+        if command == "set":
+            model = self.models.get(msg.obj.name)
+            if model is None:
+                self.values[msg.obj.name] = msg.args[0]
+                return None
+            self._done(msg.obj, msg.kwargs.get("group"), model.set(msg.args[0], now))
+        elif command == "trigger":
+            model = self.models.get(msg.obj.name)
+            if model is not None:
+                self._done(msg.obj, msg.kwargs.get("group"), model.trigger(now, self.values))
+        elif command == "wait":
+            self.clock.advance_to(self._groups.pop(msg.kwargs.get("group"), now))
+        elif command == "sleep":
+            self.result.sleep += msg.args[0]
+            self.clock.advance(msg.args[0])
+        elif command == "read":
+            return self._read(msg.obj)
+        elif command == "locate":
+            return self._locate(msg.obj)
+        elif command == "open_run":
+            self.result.num_runs += 1
+            return str(uuid.uuid4())
+        elif command == "save":
+            self.result.num_events += 1
+        elif command == "configure":
+            return {}, {}
+        elif command == "subscribe":
+            return len(self.result.commands)
+        return None
+
+    def run(self, plan: Generator) -> SimResult:
+        """
+        Run the plan on the virtual clock.
+
+        Parameters
+        ----------
+        plan
+            The plan to run.
+
+        Returns
+        -------
+        result
+            The summary of the run, including the simulated duration.
+        """
+        self.result = result = SimResult()
+        self._groups.clear()
+        start, wall_start = self.clock.time, time.monotonic()
+        response = None
+        with self.virtual_time():
+            try:
+                while True:
+                    response = self.respond(plan.send(response))
+            except StopIteration as stop:
+                result.plan_result = stop.value
+        result.duration = self.clock.time - start
+        result.wall_time = time.monotonic() - wall_start
+        return result
@@ -0,0 +1,191 @@
+"""Record the runs of a multi-sample plan as one run and split it back into the tables of the samples.
+
+The plans open a run for each sample or well with its own start document, descriptors, callbacks and dark frame.
+For many short exposures, this overhead is comparable to the exposures. `single_run` merges the runs of a plan into
+one. The start document of each run becomes an event in the stream 'samples' with the fields 'sample_index',
+'sample_name' and 'sample_md', the metadata as a JSON string, and every other event gets 'sample_index' and
+'sample_name'. `split_samples` turns the table of the events, e.g. from `~scanplans.export.ColumnarExporter`, back
+into one table per sample with the metadata of the sample in the columns.
+"""
+from __future__ import annotations
+
+import json
+import typing as tp
+
+import bluesky.plan_stubs as bps
+from bluesky.preprocessors import plan_mutator
+
+from scanplans._lazy import lazy_import
+
+pd = lazy_import("pandas")
+Signal = lazy_import("ophyd", "Signal")
+
+__all__ = [
+    "SAMPLE_STREAM",
+    "single_run",
+    "split_samples"
+]
+SAMPLE_STREAM = "samples"
+
+
+def single_run(plan: tp.Generator, md: dict = None) -> tp.Generator:
+    """
+    Merge the runs of the plan into one run.
+
+    The first 'open_run' opens the run with the metadata and each 'close_run' but the last one is dropped. Each run
+    of the plan, e.g. a temperature ramp of `~scanplans.cryostat.cryostat_plan`, is a sample in the run. The
+    callbacks subscribed by the plan, e.g. its LiveTable, are dropped because they expect a run per sample.
+
+    A stream of a run can only read the same objects in all its events. The events of a stream which read other
+    objects than the first ones, e.g. the temperature ramps and the counts of a cryostat plan, go to a stream of
+    their own named with a suffix, e.g. 'primary_1'. The 'create' of an event is sent at its 'save' when the
+    objects are known, and the objects are read again after it.
+
+    Parameters
+    ----------
+    plan
+        The plan which opens one run per sample.
+    md
+        The metadata of the run. The 'plan_name' is 'single_run' and 'sp_single_run' is True by default.
+
+    Yields
+    ------
+    Msg
+        The messages of the plan in one run.
+
+    Returns
+    -------
+    uid
+        The uid of the run or None if the plan does not open any run.
+
+    Examples
+    --------
+    Measure the whole rack in one run and export the events.
+    >>> exporter = ColumnarExporter('rack.parquet', streams=('primary', 'samples'))
+    >>> xrun({}, single_run(bpp.pchain(*move_and_do_many(bt, sps))), exporter)
+    >>> tables = split_samples(exporter.read())
+    """
+    _md = {"plan_name": "single_run", "sp_single_run": True}
+    _md.update(md or {})
+    index = Signal(name="sample_index", value=-1)
+    name = Signal(name="sample_name", value="")
+    sample_md = Signal(name="sample_md", value="{}")
+    # the messages inserted here also pass through the mutator and are let through while inserting
+    state = {"uid": None, "count": 0, "inserting": False, "bundle": None, "objs": []}
+    # the stream name of each (requested name, names of the objects read) and the number of streams of each name
+    streams = {}  # type: tp.Dict[tp.Tuple[str, tp.Tuple[str, ...]], str]
+    num_streams = {}  # type: tp.Dict[str, int]
+
+    def open_sample(msg):
+        state["inserting"] = True
+        if state["uid"] is None:
+            state["uid"] = yield from bps.open_run(md=_md)
+        run_md = dict(msg.kwargs.get("md") or {})
+        run_md.update((key, value) for key, value in msg.kwargs.items() if key != "md")
+        yield from bps.mv(
+            index, state["count"],
+            name, str(run_md.get("sample_name", "")),
+            sample_md, json.dumps(run_md, default=str)
+        )
+        yield from bps.create(name=SAMPLE_STREAM)
+        for obj in (index, name, sample_md):
+            yield from bps.read(obj)
+        yield from bps.save()
+        state.update(count=state["count"] + 1, inserting=False)
+
+    def save_with_sample(msg):
+        state["inserting"] = True
+        requested, objs = state["bundle"], state["objs"]
+        key = (requested, tuple(sorted(obj.name for obj in objs)))
+        if key not in streams:
+            number = num_streams.get(requested, 0)
+            streams[key] = requested if number == 0 else f"{requested}_{number}"
+            num_streams[requested] = number + 1
+        yield from bps.create(name=streams[key])
+        yield from bps.read(index)
+        yield from bps.read(name)
+        for obj in objs:
+            yield from bps.read(obj)
+        state.update(bundle=None, objs=[], inserting=False)
+        return (yield msg)
+
+    def mutate(msg):
+        if state["inserting"]:
+            return None, None
+        if msg.command == "open_run":
+            return open_sample(msg), None
+        if msg.command in ("close_run", "subscribe", "unsubscribe"):
+            return bps.null(), None
+        if state["uid"] is None:
+            return None, None
+        if msg.command == "create":
+            # the stream is created at the save when the objects read are known
+            state.update(bundle=msg.kwargs.get("name", msg.args[0] if msg.args else "primary"), objs=[])
+            return bps.null(), None
+        if state["bundle"] is not None:
+            if msg.command == "read" and msg.obj not in state["objs"]:
+                state["objs"].append(msg.obj)
+            elif msg.command == "save":
+                return save_with_sample(msg), None
+            elif msg.command == "drop":
+                state.update(bundle=None, objs=[])
+                return bps.null(), None
+        return None, None
+
+    yield from plan_mutator(plan, mutate)
+    if state["uid"] is not None:
+        yield from bps.close_run(reason="{} sample(s) in one run".format(state["count"]))
+    return state["uid"]
+
+
+def split_samples(table: pd.DataFrame, samples: pd.DataFrame = None, stream: str = "primary",
+                  md_keys: tp.Sequence[str] = None) -> tp.Dict[int, pd.DataFrame]:
+    """
+    Split the events of a single run into one table per sample.
+
+    Parameters
+    ----------
+    table
+        The events with the column 'sample_index', e.g. the table of `~scanplans.export.ColumnarExporter`. If it
+        has the column 'stream', only the rows of the stream are split.
+    samples
+        The events of the stream 'samples' with the columns 'sample_index' and 'sample_md'. Default the rows of the
+        stream 'samples' in the table.
+    stream
+        The name of the stream to split.
+    md_keys
+        The keys of the metadata of the samples to add as the columns. The values which are not numbers, booleans
+        or strings are JSON strings. Default all the keys.
+
+    Returns
+    -------
+    tables
+        The table of each sample by the sample index in the order of the samples, without the empty columns. The
+        samples without events, e.g. the skipped ones, are not in it.
+    """
+    if samples is None:
+        if "stream" not in table:
+            raise ValueError("The samples are not given and the table has no column 'stream'.")
+        samples = table[table["stream"] == SAMPLE_STREAM]
+    if "stream" in table:
+        table = table[table["stream"] == stream]
+    if "sample_index" not in table:
+        raise ValueError("The table has no column 'sample_index'. Is it recorded by single_run?")
+    mds = {}
+    for _, row in samples.sort_values("sample_index").iterrows():
+        md = json.loads(row["sample_md"]) if isinstance(row.get("sample_md"), str) else {}
+        if md_keys is not None:
+            md = {key: md[key] for key in md_keys if key in md}
+        mds[int(row["sample_index"])] = {
+            key: value if value is None or isinstance(value, (bool, int, float, str)) else json.dumps(value)
+            for key, value in md.items()
+        }
+    tables = {}
+    for sample_index, part in table.groupby("sample_index", sort=True):
+        # the columns of the other streams
+        part = part.dropna(axis=1, how="all").reset_index(drop=True)
+        for key, value in mds.get(int(sample_index), {}).items():
+            if key not in part:
+                part[key] = value
+        tables[int(sample_index)] = part
+    return tables
@@ -0,0 +1,210 @@
+"""A spatial index over the sample positions for the nearest-sample and region queries."""
+from typing import Tuple
+
+import numpy as np
+
+__all__ = [
+    "SpatialIndex"
+]
+
+
+class SpatialIndex:
+    """
+    A uniform grid index of two dimensional points. The points are bucketed in square cells so that a query only
+    looks at the points in the cells it touches.
+
+    The returned indexes are the row positions in the array used to build the index. The points with NaN are
+    ignored.
+
+    Attributes
+    ----------
+    points
+        The array of points of shape (n, 2).
+    cell_size
+        The side length of a cell.
+    _ids
+        The row positions of the finite points sorted by cell.
+    _origin
+        The lower left corner of the grid.
+    _cells
+        The occupied cells of shape (m, 2).
+    _bounds
+        The (start, stop) slices of `_ids` for the occupied cells of shape (m, 2).
+    _buckets
+        The mapping from the cell (i, j) to the (start, stop) slice of `_ids`.
+    """
+
+    def __init__(self, points: np.ndarray, cell_size: float = None):
+        """
+        Build the index.
+
+        Parameters
+        ----------
+        points
+            The array of points of shape (n, 2).
+        cell_size
+            (Optional) The side length of a cell. If None, it is chosen so that there is about one point per cell.
+        """
+        self.points = np.asarray(points, dtype=float).reshape(-1, 2)
+        finite = np.flatnonzero(np.all(np.isfinite(self.points), axis=1))
+        valid = self.points[finite]
+        if len(valid) > 0:
+            self._origin = valid.min(axis=0)
+            span = valid.max(axis=0) - self._origin
+        else:
+            self._origin = np.zeros(2)
+            span = np.zeros(2)
+        if cell_size is None:
+            area = np.prod(np.where(span > 0, span, 1.))
+            cell_size = np.sqrt(area / max(len(valid), 1))
+        if cell_size <= 0:
+            raise ValueError(f"The cell size must be positive. It is {cell_size}.")
+        self.cell_size = float(cell_size)
+        cells = self._cell(valid)
+        order = np.lexsort((cells[:, 1], cells[:, 0]))
+        self._ids = finite[order]
+        cells = cells[order]
+        self._cells, starts = np.unique(cells.reshape(-1, 2), axis=0, return_index=True)
+        edges = np.append(starts, len(cells)).astype(int)
+        self._bounds = np.stack([edges[:-1], edges[1:]], axis=1)
+        self._buckets = {tuple(c): tuple(b) for c, b in zip(self._cells.tolist(), self._bounds.tolist())}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _cell(self, points: np.ndarray) -> np.ndarray:
+        """Get the cell of each point."""
+        return np.floor((points - self._origin) / self.cell_size).astype(int)
+
+    def _candidates(self, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+        """Get the row positions of the points in the cells overlapping the box."""
+        (i0, j0), (i1, j1) = self._cell(np.array([low, high], dtype=float))
+        if (i1 - i0 + 1) * (j1 - j0 + 1) <= len(self._buckets):
+            bounds = [
+                self._buckets[key]
+                for key in ((i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1))
+                if key in self._buckets
+            ]
+        else:
+            # the box covers more cells than there are occupied ones
+            inside = np.all((self._cells >= (i0, j0)) & (self._cells <= (i1, j1)), axis=1)
+            bounds = self._bounds[inside].tolist()
+        slices = [self._ids[a:b] for a, b in bounds]
+        return np.concatenate(slices) if slices else np.array([], dtype=int)
+
+    def query_radius(self, point: Tuple[float, float], radius: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the points within the radius from the point.
+
+        Parameters
+        ----------
+        point
+            The (x, y) of the center.
+        radius
+            The radius.
+
+        Returns
+        -------
+        ids
+            The row positions of the points sorted by the distance.
+        distances
+            The distances from the center.
+        """
+        point = np.asarray(point, dtype=float)
+        candidates = self._candidates(point - radius, point + radius)
+        distances = np.linalg.norm(self.points[candidates] - point, axis=1)
+        inside = distances <= radius
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.argsort(distances, kind="stable")
+        return candidates[order], distances[order]
+
+    def query_box(self, xlim: Tuple[float, float], ylim: Tuple[float, float]) -> np.ndarray:
+        """
+        Find the points inside the box. The edges are included.
+
+        Parameters
+        ----------
+        xlim
+            The (low, high) bounds of x.
+        ylim
+            The (low, high) bounds of y.
+
+        Returns
+        -------
+        ids
+            The row positions of the points in ascending order.
+        """
+        low = np.array([xlim[0], ylim[0]], dtype=float)
+        high = np.array([xlim[1], ylim[1]], dtype=float)
+        candidates = self._candidates(low, high)
+        pts = self.points[candidates]
+        inside = np.all((pts >= low) & (pts <= high), axis=1)
+        return np.sort(candidates[inside])
+
+    def nearest(self, point: Tuple[float, float], k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest points to the point.
+
+        Parameters
+        ----------
+        point
+            The (x, y) of the query.
+        k
+            The number of points.
+
+        Returns
+        -------
+        ids
+            The row positions of the points sorted by the distance.
+        distances
+            The distances from the query.
+
+        Raises
+        ------
+        ValueError
+            If the point is not finite.
+        """
+        point = np.asarray(point, dtype=float)
+        if not np.all(np.isfinite(point)):
+            raise ValueError(f"The point must be finite. It is {tuple(point)}.")
+        k = min(k, len(self))
+        if k <= 0:
+            return np.array([], dtype=int), np.array([])
+        # all the points are inside this radius
+        reach = np.max(np.linalg.norm(self.points[self._ids] - point, axis=1))
+        radius = self.cell_size
+        while radius < reach:
+            ids, distances = self.query_radius(point, radius)
+            if len(ids) >= k:
+                return ids[:k], distances[:k]
+            radius *= 2.
+        ids, distances = self.query_radius(point, reach)
+        return ids[:k], distances[:k]
+
+    def overlaps(self, min_distance: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the pairs of points that are closer than the minimum distance.
+
+        Parameters
+        ----------
+        min_distance
+            The minimum distance allowed between two points.
+
+        Returns
+        -------
+        pairs
+            The array of shape (m, 2) of row positions (i, j) with i < j.
+        distances
+            The distances between the pairs.
+        """
+        pairs = []
+        distances = []
+        for i in self._ids:
+            ids, dists = self.query_radius(self.points[i], min_distance)
+            keep = (ids > i) & (dists < min_distance)
+            pairs.extend((i, j) for j in ids[keep])
+            distances.extend(dists[keep])
+        pairs = np.array(pairs, dtype=int).reshape(-1, 2)
+        distances = np.array(distances, dtype=float)
+        order = np.lexsort((pairs[:, 1], pairs[:, 0]))
+        return pairs[order], distances[order]
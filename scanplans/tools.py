@@ -1,20 +1,36 @@
 """Tools for writing the bluesky plans."""
+import time
+import uuid
 from typing import Dict, Union
 
 import bluesky.plan_stubs as bps
+import bluesky.preprocessors as bpp
 import numpy as np
-from xpdacq.glbl import glbl
-from xpdacq.xpdacq_conf import xpd_configuration
-from xpdconf.conf import XPD_SHUTTER_CONF
+
+from scanplans._lazy import lazy_import
+from scanplans.context import PlanContext, resolve_context
+
+Signal = lazy_import("ophyd", "Signal")
+_configure_exposure = lazy_import("xpdacq.beamtime", "configure_area_det")
+
+# the default time in second to wait for the readback of the shutter and the period to poll it
+SHUTTER_TIMEOUT = 5.
+SHUTTER_POLL = 0.01
 
 __all__ = [
     "configure_area_det",
+    "configure_exposure",
     "open_shutter_stub",
     "close_shutter_stub",
     "calc_exposure",
     "shutter_step",
+    "shutter_read",
+    "shutter_readback",
+    "calibrate_shutter",
     "calc_delay",
     "inner_shutter_control",
+    "sum_readings",
+    "cadence_count",
 ]
 
 
@@ -50,7 +66,31 @@ def configure_area_det(det, md: Dict[str, Union[int, float]]):
         yield from bps.abs_set(det.images_per_set, num_frame, wait=True)
 
 
-def calc_exposure(det, exposure):
+def configure_exposure(exposure: float, context: PlanContext = None):
+    """
+    Yield the messages to configure the area detector of the context for the exposure with the frame time
+    glbl['frame_acq_time'] of the context. It is `_configure_area_det` of xpdacq reading the context instead of the
+    globals.
+
+    Parameters
+    ----------
+    exposure
+        The requested exposure time in second.
+    context
+        (Optional) The configuration. Default the globals.
+
+    Returns
+    -------
+    num_frame, acq_time, computed_exposure
+        The number of frames, the time per frame read back from the detector and their product.
+    """
+    context = resolve_context(context)
+    return (
+        yield from _configure_exposure(context.configuration["area_det"], exposure, context.glbl["frame_acq_time"])
+    )
+
+
+def calc_exposure(det, exposure, acq_time=None, context: PlanContext = None):
     """
     Calculate the number of frame and exposure time (s) for the detector. Return a dictionary of those information.
 
@@ -60,6 +100,11 @@ def calc_exposure(det, exposure):
         The area detector.
     exposure
         The requested exposure time in second.
+    acq_time
+        The time per frame in second, e.g. from `~scanplans.frametime.optimize_frame_time`. Default
+        glbl['frame_acq_time'].
+    context
+        (Optional) The configuration to read glbl from. Default the globals.
 
     Returns
     -------
@@ -73,7 +118,7 @@ def calc_exposure(det, exposure):
         }
 
     """
-    acq_time = glbl['frame_acq_time']
+    acq_time = resolve_context(context).glbl['frame_acq_time'] if acq_time is None else acq_time
     _check_mini_expo(exposure, acq_time)
     if hasattr(det, "images_per_set"):
         # compute number of frames
@@ -124,64 +169,338 @@ def _check_mini_expo(exposure, acq_time):
         )
 
 
-def shutter_step(detectors, motor, step):
+def shutter_step(detectors, motor, step, context: PlanContext = None, wait: float = 0.):
     """ customized step to ensure shutter is open before
-    reading at each motor point and close shutter after reading
+    reading at each motor point and close shutter after reading.
+    Wait the time in second after the move. Return the readings.
     """
     yield from bps.checkpoint()
     yield from bps.abs_set(motor, step, wait=True)
-    yield from open_shutter_stub()
-    yield from bps.sleep(glbl["shutter_sleep"])
-    yield from bps.trigger_and_read(list(detectors) + [motor])
-    yield from close_shutter_stub()
+    if wait:
+        yield from bps.sleep(wait)
+    return (yield from shutter_read(list(detectors) + [motor], context))
+
 
+def shutter_read(detectors, context: PlanContext = None):
+    """Open the shutter of the context, trigger and read the detectors and close the shutter. Return the
+    readings. It is the shared reading of the per_step functions of the plans."""
+    yield from open_shutter_stub(context)
+    readings = yield from bps.trigger_and_read(list(detectors))
+    yield from close_shutter_stub(context)
+    return readings
 
-def open_shutter_stub():
+
+def shutter_readback(context: PlanContext = None):
+    """
+    Find what tells that the shutter of the context has moved.
+
+    Parameters
+    ----------
+    context
+        (Optional) The configuration. Default the globals.
+
+    Returns
+    -------
+    readback
+        configuration['shutter_readback'], a signal to poll, if given. Else the shutter itself if its set completes
+        on its readback, a device with a 'readback' or an EPICS signal with a read PV different from its write PV.
+        None if the shutter can not be read back, e.g. a command PV.
+    """
+    context = resolve_context(context)
+    readback = context.configuration.get("shutter_readback")
+    if readback is not None:
+        return readback
+    shutter = context.configuration["shutter"]
+    if getattr(shutter, "readback", None) is not None:
+        return shutter
+    read_pv, write_pv = getattr(shutter, "_read_pvname", None), getattr(shutter, "_setpoint_pvname", None)
+    if read_pv is not None and write_pv is not None and read_pv != write_pv:
+        return shutter
+    return None
+
+
+def _is_value(value, target) -> bool:
+    try:
+        return bool(np.isclose(float(value), float(target)))
+    except (TypeError, ValueError):
+        return value == target
+
+
+def _set_shutter(context: PlanContext, state: str):
+    """Set the shutter to the value of the state, 'open' or 'close', and wait until it is done by its status and
+    its readback, or raise TimeoutError after glbl['shutter_timeout'] second. Without a readback, sleep
+    glbl['shutter_sleep'] after opening instead. Return the time it took or None if there is no readback."""
+    shutter = context.configuration["shutter"]
+    target = context.shutter_conf[state]
+    timeout = context.glbl.get("shutter_timeout", SHUTTER_TIMEOUT)
+    readback = shutter_readback(context)
+    group = "shutter-{}".format(uuid.uuid4())
+    start = time.time()
+    yield from bps.abs_set(shutter, target, group=group)
+    yield from bps.wait(group, timeout=timeout)
+    if readback is None:
+        if state == "open":
+            yield from bps.sleep(context.glbl["shutter_sleep"])
+        return None
+    # a separate readback, e.g. the position switch of a shutter set by a command PV, is polled
+    while readback is not shutter:
+        value = yield from bps.rd(readback, default_value=None)
+        # the value is None only if the plan is simulated without a RunEngine
+        if value is None or _is_value(value, target):
+            break
+        if time.time() - start > timeout:
+            raise TimeoutError(
+                "The shutter did not {} in {} s. Its readback is {} instead of {}.".format(
+                    state, timeout, value, target
+                )
+            )
+        yield from bps.sleep(SHUTTER_POLL)
+    return time.time() - start
+
+
+def open_shutter_stub(context: PlanContext = None):
     """simple function to return a generator that yields messages to
-    open the shutter"""
-    yield from bps.abs_set(
-        xpd_configuration["shutter"], XPD_SHUTTER_CONF["open"], wait=True
-    )
-    yield from bps.sleep(glbl["shutter_sleep"])
+    open the shutter of the context and wait until it reads open,
+    or sleep glbl['shutter_sleep'] if it can not be read back"""
+    context = resolve_context(context)
+    yield from _set_shutter(context, "open")
     yield from bps.checkpoint()
 
 
-def close_shutter_stub():
+def close_shutter_stub(context: PlanContext = None):
     """simple function to return a generator that yields messages to
-    close the shutter"""
-    yield from bps.abs_set(
-        xpd_configuration["shutter"], XPD_SHUTTER_CONF["close"], wait=True
-    )
+    close the shutter of the context and wait until it reads closed"""
+    context = resolve_context(context)
+    yield from _set_shutter(context, "close")
     yield from bps.checkpoint()
 
 
-def calc_delay(delay, computed_exposure, num):
-    """Calculate the real delay time. Return a dictionary of metadata."""
+def calibrate_shutter(num: int = 5, context: PlanContext = None):
+    """
+    Measure the time for the shutter of the context to open and to close, from the command to the readback.
+
+    Parameters
+    ----------
+    num
+        The number of times to open and close the shutter. The shutter is closed first and left closed.
+    context
+        (Optional) The configuration. Default the globals.
+
+    Returns
+    -------
+    latencies
+        The latencies in second by 'open' and 'close'.
+
+    Raises
+    ------
+    ValueError
+        If the shutter has no readback to time.
+
+    Examples
+    --------
+    Use the longest opening time as the sleep of the shutters which can not be read back.
+    >>> RE = RunEngine(call_returns_result=True)
+    >>> latencies = RE(calibrate_shutter(10)).plan_result
+    >>> glbl['shutter_sleep'] = latencies['open'].max()
+    """
+    if num < 1:
+        raise ValueError(f"The num must be at least 1. It is {num}.")
+    context = resolve_context(context)
+    if shutter_readback(context) is None:
+        raise ValueError("The shutter has no readback to time. Set the configuration['shutter_readback'].")
+    yield from close_shutter_stub(context)
+    latencies = {"open": [], "close": []}
+    for _ in range(num):
+        for state in ("open", "close"):
+            latencies[state].append((yield from _set_shutter(context, state)))
+    latencies = {state: np.asarray(values) for state, values in latencies.items()}
+    for state, values in latencies.items():
+        print(
+            "INFO: shutter {} latency: mean {:.3f} s, max {:.3f} s in {} times".format(
+                state, np.mean(values), np.max(values), num
+            )
+        )
+    return latencies
+
+
+def calc_delay(delay, computed_exposure, num, overhead=0.):
+    """Calculate the real delay time. Return a dictionary of metadata. Warn if the exposure and the estimated
+    overhead per reading, e.g. the shutter, do not fit in the delay."""
     real_delay = max(computed_exposure, delay)
     print(
         "INFO: requested delay = {}s  -> computed delay = {}s".format(
             delay, real_delay
         )
     )
+    if computed_exposure + overhead > real_delay:
+        print(
+            "WARNING: exposure {}s + overhead {}s > delay {}s. The readings will miss their time slots.".format(
+                computed_exposure, overhead, real_delay
+            )
+        )
     delay_md = {
         "sp_requested_delay": delay,
         "sp_requested_num": num,
         "sp_computed_delay": real_delay,
+        "sp_estimated_overhead": overhead,
     }
     return delay_md
 
 
-def inner_shutter_control(msg):
+def inner_shutter_control(msg, context: PlanContext = None):
     """Use plan_mutator(plan, inner_shutter_control) to make to shutter open when a detector is triggered and close
-    when the data is saved. """
+    when the data is saved. Bind the context by functools.partial to use the shutter of the context. """
     if msg.command == "trigger":
 
         def inner():
-            yield from open_shutter_stub()
+            yield from open_shutter_stub(context)
             yield msg
 
         return inner(), None
     elif msg.command == "save":
-        return None, close_shutter_stub()
+        return None, close_shutter_stub(context)
     else:
         return None, None
+
+
+def sum_readings(readings, exclude=()):
+    """Sum up the numeric values in the readings returned by trigger_and_read. Arrays are summed over all elements.
+    Return NaN if there is nothing to sum up, e.g. when the plan is simulated without a RunEngine."""
+    total = np.nan
+    for key, reading in (readings or {}).items():
+        if key in exclude:
+            continue
+        value = reading.get("value") if isinstance(reading, dict) else reading
+        try:
+            value = float(np.sum(np.asarray(value, dtype=float)))
+        except (TypeError, ValueError):
+            continue
+        total = value if np.isnan(total) else total + value
+    return total
+
+
+def cadence_count(detectors, num, period, md=None, convergence=None):
+    """
+    Take num readings of the detectors in one run. The readings start at the absolute times t0 + k * period so that
+    the overhead of each reading does not add up. If a reading would start more than half a period after its slot,
+    the slot is missed and the reading waits for the next slot.
+
+    Each event has the fields 'cadence_slot', the index k of the slot, 'cadence_jitter', the time from the start
+    of the slot to the start of the reading, and 'cadence_missed', the number of slots missed up to the reading.
+    The start document has the same keys as the one of `count`. The number of missed slots and the maximum jitter
+    are also in the reason of the stop document.
+
+    If the convergence is given, each event also has the field 'convergence_change', the change from the previous
+    reading or -1 if it is not known, and the run ends early when the criterion is met. The index of the last
+    reading is in the reason of the stop document.
+
+    Parameters
+    ----------
+    detectors
+        The detectors to trigger and read.
+    num
+        The number of readings.
+    period
+        The time between the starts of two consecutive slots in second.
+    md
+        The metadata of the run.
+    convergence
+        (Optional) A `~scanplans.convergence.Convergence` to end the run when the readings stop changing.
+
+    Returns
+    -------
+    report
+        The number of missed slots, the maximum and mean jitter, the mean time of a reading, the number of readings
+        and whether the run ended by the convergence.
+    """
+    jitter = Signal(name="cadence_jitter", value=0.)
+    slot = Signal(name="cadence_slot", value=0)
+    missed = Signal(name="cadence_missed", value=0)
+    change = Signal(name="convergence_change", value=0.)
+    extra = [slot, jitter, missed] + ([change] if convergence is not None else [])
+    _md = {
+        "detectors": [det.name for det in detectors],
+        "num_points": num,
+        "num_intervals": num - 1,
+        "plan_args": {"detectors": list(map(repr, detectors)), "num": num, "period": period},
+        "plan_name": "cadence_count",
+        "hints": {},
+        "sp_cadence_period": period
+    }
+    if convergence is not None:
+        _md.update(
+            {
+                "sp_convergence_threshold": convergence.threshold,
+                "sp_convergence_frames": convergence.consecutive,
+                "sp_convergence_min_duration": convergence.min_duration
+            }
+        )
+        convergence.reset()
+    _md.update(md or {})
+    _md["hints"].setdefault("dimensions", [(("time",), "primary")])
+
+    @bpp.stage_decorator(detectors)
+    def inner():
+        yield from bps.open_run(md=_md)
+        t0 = None
+        k = 0
+        jitters, busy = [], []
+        warned = converged = False
+        for _ in range(num):
+            yield from bps.checkpoint()
+            now = time.time()
+            if t0 is None:
+                t0 = now
+            late = now - (t0 + k * period)
+            if late > period / 2.:
+                k += int(np.ceil(late / period))
+            target = t0 + k * period
+            if target > now:
+                yield from bps.sleep(target - now)
+            start = time.time()
+            yield from bps.mv(jitter, start - target, slot, k, missed, k - len(jitters))
+            group = str(uuid.uuid4())
+            for det in detectors:
+                yield from bps.trigger(det, group=group)
+            yield from bps.wait(group=group)
+            yield from bps.create("primary")
+            readings = {}
+            for det in detectors:
+                readings.update((yield from bps.read(det)) or {})
+            if convergence is not None:
+                converged = convergence.update(readings if readings else None, start - t0)
+                # NaN never equals itself so a signal set to NaN would never finish
+                last_change = convergence.last_change
+                yield from bps.mv(change, last_change if np.isfinite(last_change) else -1.)
+            for obj in extra:
+                yield from bps.read(obj)
+            yield from bps.save()
+            jitters.append(start - target)
+            busy.append(time.time() - start)
+            if busy[-1] > period and not warned:
+                print("WARNING: a reading takes {:.3f}s > period {}s. Slots are missed.".format(busy[-1], period))
+                warned = True
+            k += 1
+            if converged:
+                break
+        report = {
+            "missed_slots": k - len(jitters),
+            "max_jitter": max(jitters, default=0.),
+            "mean_jitter": float(np.mean(jitters)) if jitters else 0.,
+            "mean_reading_time": float(np.mean(busy)) if busy else 0.,
+            "num_readings": len(jitters),
+            "converged": converged
+        }
+        print(
+            "INFO: missed {missed_slots} slot(s). Jitter: max {max_jitter:.3f}s, mean {mean_jitter:.3f}s. "
+            "Mean reading time: {mean_reading_time:.3f}s.".format(**report)
+        )
+        reason = "missed {missed_slots} slot(s), max jitter {max_jitter:.3f}s".format(**report)
+        if converged:
+            print("INFO: converged at reading {}. Stop {} reading(s) early.".format(
+                len(jitters) - 1, num - len(jitters)))
+            reason += ", converged at reading {}".format(len(jitters) - 1)
+        yield from bps.close_run(reason=reason)
+        return report
+
+    return (yield from inner())
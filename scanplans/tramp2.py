@@ -1,7 +1,9 @@
 """An advanced temperature ramping plan."""
-from ophyd.sim import SynAxis
-from xpdacq.beamtime import Tramp
-from xpdacq.xpdacq import xpd_configuration
+from scanplans._lazy import lazy_import
+
+SynAxis = lazy_import("ophyd.sim", "SynAxis")
+Tramp = lazy_import("xpdacq.beamtime", "Tramp")
+xpd_configuration = lazy_import("xpdacq.xpdacq", "xpd_configuration")
 
 __all__ = [
     "Tramp2"
@@ -1,13 +1,74 @@
 """A temperature ramping with waiting."""
+import typing as tp
+
 import bluesky.plan_stubs as bps
 import bluesky.plans as bp
-from xpdacq.beamtime import _nstep, _configure_area_det
-from xpdacq.beamtime import open_shutter_stub, close_shutter_stub
-from xpdacq.glbl import glbl
-from xpdacq.xpdacq_conf import xpd_configuration
+import bluesky.preprocessors as bpp
+import numpy as np
+
+import scanplans.tools as tl
+from scanplans._lazy import lazy_import
+from scanplans.context import PlanContext, resolve_context
+from scanplans.convergence import relative_change
+from scanplans.monitor import monitor_during
+
+_nstep = lazy_import("xpdacq.beamtime", "_nstep")
+
+__all__ = [
+    "Tramp3",
+    "next_setpoint"
+]
+
 
+def next_setpoint(setpoint: float, Tstop: float, step: float, change: float, threshold: float, Tstep: float,
+                  coarse_step: float, points_left: int) -> tp.Tuple[float, float]:
+    """
+    Choose the next temperature of an adaptive scan. The step is halved, down to Tstep, after a change above the
+    threshold and doubled, up to the coarse_step, after a change below half of it. It is never so small that the
+    points left can not reach Tstop.
 
-def Tramp3(dets: list, wait: float, exposure: float, Tstart: float, Tstop: float, Tstep: float):
+    Parameters
+    ----------
+    setpoint
+        The current temperature.
+    Tstop
+        The last temperature.
+    step
+        The current step size. Positive.
+    change
+        The change of the readings at the current temperature from the previous ones. NaN if it is not known.
+    threshold
+        The change above which the step is refined.
+    Tstep
+        The smallest step size.
+    coarse_step
+        The largest step size.
+    points_left
+        The number of setpoints left in the budget.
+
+    Returns
+    -------
+    setpoint, step
+        The next temperature, which is Tstop for the last point, and the step size.
+    """
+    if change > threshold:
+        step = max(step / 2., Tstep)
+    elif not change > threshold / 2.:
+        step = min(step * 2., coarse_step)
+    remaining = abs(Tstop - setpoint)
+    if points_left < 1:
+        raise ValueError("No setpoint is left in the budget to reach Tstop.")
+    distance = max(step, remaining / points_left)
+    if distance >= remaining:
+        return Tstop, step
+    return float(setpoint + np.sign(Tstop - setpoint) * distance), step
+
+
+def Tramp3(dets: list, wait: float, exposure: float, Tstart: float, Tstop: float, Tstep: float,
+           monitor_rate: float = None, monitor_decimation: int = 1, monitor_signals: list = None,
+           context: PlanContext = None, adaptive_threshold: float = None,
+           adaptive_reducer: tp.Callable[[dict], tp.Any] = None, coarse_step: float = None,
+           max_points: int = None):
     """
     Collect data over a range of temperatures
 
@@ -39,6 +100,52 @@ def Tramp3(dets: list, wait: float, exposure: float, Tstart: float, Tstop: float
     Tstep : float
         step size between Tstart and Tstop of this sequence.
 
+    monitor_rate : float
+        The number of times per second to poll the temperature
+        controller in the stream 'temperature_monitor', including the
+        ramps and waits. If None, there is no monitor. Default None.
+
+    monitor_decimation : int
+        The number of polls averaged into one event in the monitor
+        stream. Default 1.
+
+    monitor_signals : list
+        The signals to poll, e.g. the heater output. Default the
+        temperature controller.
+
+    context : PlanContext
+        The configuration to read the devices and glbl from. See
+        ``scanplans.context.PlanContext``. Default the globals.
+
+    adaptive_threshold : float
+        If given, scan adaptively instead of on the uniform grid of
+        ``Tstep``. The scan starts with the ``coarse_step`` and, after
+        each reading, compares it with the previous one by
+        ``scanplans.convergence.relative_change`` of the
+        ``adaptive_reducer``. The step is halved, down to ``Tstep``,
+        where the change is above this threshold and doubled back
+        after the change falls below half of it. See
+        ``next_setpoint``. The temperatures only go from ``Tstart`` to
+        ``Tstop`` and are never revisited so that a transition with
+        hysteresis is only crossed once. The wait and the shutter at
+        each temperature are the same as the uniform scan. The plan
+        returns the setpoints and the changes. Default None.
+
+    adaptive_reducer : callable
+        A function from the readings at a temperature to a number or an
+        array to compare, e.g. a scalar detector or the integrated
+        pattern. Required with the ``adaptive_threshold``.
+
+    coarse_step : float
+        The largest step of the adaptive scan. Default four times
+        ``Tstep``.
+
+    max_points : int
+        The largest number of setpoints of the adaptive scan including
+        ``Tstart`` and ``Tstop``. The steps grow if needed to reach
+        ``Tstop`` in the budget. Default the number of points of the
+        uniform grid.
+
     Notes
     -----
     1. To see which area detector and temperature controller
@@ -56,29 +163,83 @@ def Tramp3(dets: list, wait: float, exposure: float, Tstart: float, Tstop: float
     This will create a ``Tramp`` ScanPlan, with shutter always
     open during the ramping.
     """
-    area_det = xpd_configuration["area_det"]
-    temp_controller = xpd_configuration["temp_controller"]
+    context = resolve_context(context)
+    area_det = context.configuration["area_det"]
+    temp_controller = context.configuration["temp_controller"]
     Nsteps, _ = _nstep(Tstart, Tstop, Tstep)
+    if adaptive_threshold is not None and adaptive_reducer is None:
+        raise ValueError("The adaptive_threshold needs the adaptive_reducer.")
 
     def per_step(detectors, motor, step):
         """ customized step to ensure shutter is open before
         reading at each motor point and close shutter after reading
         """
-        yield from bps.checkpoint()
-        yield from bps.abs_set(motor, step, wait=True)
-        yield from bps.sleep(wait)
-        yield from open_shutter_stub()
-        yield from bps.sleep(glbl["shutter_sleep"])
-        yield from bps.trigger_and_read(list(detectors) + [motor])
-        yield from close_shutter_stub()
-
-    plan = bp.scan(
-        [area_det],
-        temp_controller,
-        Tstart,
-        Tstop,
-        Nsteps,
-        per_step=per_step
-    )
-    yield from _configure_area_det(exposure)
-    yield from plan
+        return (yield from tl.shutter_step(detectors, motor, step, context, wait=wait))
+
+    if adaptive_threshold is None:
+        plan = bp.scan(
+            [area_det],
+            temp_controller,
+            Tstart,
+            Tstop,
+            Nsteps,
+            per_step=per_step
+        )
+    else:
+        plan = _adaptive_scan(
+            [area_det], temp_controller, Tstart, Tstop, Tstep, per_step, adaptive_threshold, adaptive_reducer,
+            coarse_step if coarse_step is not None else 4. * abs(Tstep),
+            max_points if max_points is not None else Nsteps,
+            Nsteps
+        )
+    if monitor_rate:
+        signals = monitor_signals if monitor_signals else [temp_controller]
+        plan = monitor_during(plan, signals, monitor_rate, monitor_decimation)
+    yield from tl.configure_exposure(exposure, context)
+    return (yield from plan)
+
+
+def _adaptive_scan(detectors, motor, Tstart, Tstop, Tstep, per_step, threshold, reducer, coarse_step, max_points,
+                   num_uniform):
+    """Scan the temperature from Tstart to Tstop in one run choosing each setpoint by the change of the readings
+    at the last one. Return the setpoints, the changes and the number of points of the uniform grid."""
+    Tstep, coarse_step = abs(Tstep), abs(coarse_step)
+    if not 0 < Tstep <= coarse_step:
+        raise ValueError(f"The coarse_step {coarse_step} must be at least the Tstep {Tstep} > 0.")
+    if max_points < 2:
+        raise ValueError(f"The max_points must be at least 2. It is {max_points}.")
+    fields = getattr(motor, "hints", {}).get("fields", [motor.name])
+    md = {
+        "detectors": [det.name for det in detectors],
+        "motors": [motor.name],
+        "plan_name": "Tramp3",
+        "plan_args": {"Tstart": Tstart, "Tstop": Tstop, "Tstep": Tstep},
+        "hints": {"dimensions": [(fields, "primary")]},
+        "sp_adaptive_threshold": threshold,
+        "sp_adaptive_coarse_step": coarse_step,
+        "sp_adaptive_max_points": max_points,
+        "sp_uniform_points": num_uniform
+    }
+
+    @bpp.stage_decorator(list(detectors) + [motor])
+    def inner():
+        yield from bps.open_run(md=md)
+        setpoints, changes = [], []
+        setpoint, step, previous = Tstart, coarse_step, None
+        while True:
+            readings = yield from per_step(detectors, motor, setpoint)
+            current = reducer(readings) if readings else None
+            change = relative_change(previous, current) if previous is not None and current is not None else np.nan
+            setpoints.append(setpoint)
+            changes.append(change)
+            previous = current
+            if setpoint == Tstop:
+                break
+            setpoint, step = next_setpoint(setpoint, Tstop, step, change, threshold, Tstep, coarse_step,
+                                           max_points - len(setpoints))
+        print("INFO: the adaptive scan used {} setpoints. The uniform grid of {} has {}.".format(
+            len(setpoints), Tstep, num_uniform))
+        yield from bps.close_run(reason="used {} of the {} uniform setpoints".format(len(setpoints), num_uniform))
+        return {"setpoints": setpoints, "changes": changes, "num_uniform": num_uniform}
+
+    return (yield from inner())
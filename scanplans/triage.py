@@ -0,0 +1,165 @@
+"""Take a short exposure of each well and decide which wells are worth the full measurement."""
+import typing as tp
+import uuid
+
+import bluesky.plan_stubs as bps
+import bluesky.preprocessors as bpp
+import numpy as np
+
+from scanplans._lazy import lazy_import
+
+Signal = lazy_import("ophyd", "Signal")
+_configure_area_det = lazy_import("xpdacq.beamtime", "_configure_area_det")
+
+__all__ = [
+    "MEASURE",
+    "SHORTEN",
+    "SKIP",
+    "triage_scores",
+    "triage_decisions",
+    "triage_wells"
+]
+MEASURE = "measure"
+SHORTEN = "shorten"
+SKIP = "skip"
+
+
+def triage_scores(values: tp.Sequence, reference: tp.Any = None) -> np.ndarray:
+    """
+    Score the signal of each well against the reference.
+
+    Parameters
+    ----------
+    values
+        The metric of the wells. Either one number or one array of the same shape per well.
+    reference
+        (Optional) The metric of an empty well. If None, the scores are the values divided by the largest value.
+
+    Returns
+    -------
+    scores
+        The relative difference `sum|value - reference| / sum|reference|` of each well. NaN if the value is
+        unknown.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values.reshape(len(values), -1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if reference is None:
+            totals = np.abs(values).sum(axis=1)
+            scores = totals / np.nanmax(totals) if np.any(np.isfinite(totals)) else totals
+        else:
+            reference = np.broadcast_to(np.asarray(reference, dtype=float).ravel(), values.shape[1:])
+            scores = np.abs(values - reference).sum(axis=1) / np.abs(reference).sum()
+    scores[np.isnan(values).any(axis=1)] = np.nan
+    return scores
+
+
+def triage_decisions(scores: np.ndarray, threshold: float, action: str = SKIP) -> np.ndarray:
+    """Decide to measure the wells whose scores are not below the threshold and to skip or shorten the others.
+    A well with an unknown score is measured."""
+    if action not in (SKIP, SHORTEN):
+        raise ValueError(f"Unknown action '{action}'. Expect '{SKIP}' or '{SHORTEN}'.")
+    scores = np.asarray(scores, dtype=float)
+    with np.errstate(invalid="ignore"):
+        low = scores < threshold
+    return np.where(low, action, MEASURE).astype(object)
+
+
+def triage_wells(
+        area_det: tp.Any,
+        x_motor: tp.Any,
+        y_motor: tp.Any,
+        centers: np.ndarray,
+        exposure: float,
+        threshold: float,
+        metric: tp.Callable[[dict], tp.Any],
+        reference: tp.Any = None,
+        action: str = SKIP,
+        md: dict = None
+):
+    """
+    Take one short exposure at the center of each well in one run and decide which wells to measure.
+
+    The primary stream has the readings of the wells. The stream 'triage' has the 'triage_well', 'triage_score'
+    and 'triage_decision' of each well.
+
+    Parameters
+    ----------
+    area_det
+        The area detector.
+    x_motor, y_motor
+        The motors of the position.
+    centers
+        The (x, y) centers of the wells of shape (n, 2) in the order of visiting.
+    exposure
+        The exposure of the triage in second.
+    threshold
+        The score below which the well is skipped or shortened. See `triage_scores`.
+    metric
+        A function from the readings of a well to a number or an array, e.g. the sum of the image plugin of the
+        area detector. The area detectors save the image in files and only put a datum id in the reading so the
+        metric has to load the image or read a reduced signal.
+    reference
+        (Optional) The metric of an empty well.
+    action
+        'skip' or 'shorten'.
+    md
+        The metadata of the run.
+
+    Returns
+    -------
+    scores
+        The score of each well.
+    decisions
+        The decision of each well.
+
+    Raises
+    ------
+    ValueError
+        If the metric is not a function or it returns no number for any well.
+    """
+    if not callable(metric):
+        raise ValueError(f"The metric must be a function from the readings to a number or an array. It is "
+                         f"{metric!r}.")
+    well = Signal(name="triage_well", value=0)
+    score = Signal(name="triage_score", value=0.)
+    decision = Signal(name="triage_decision", value="")
+    _md = {
+        "sp_type": "triage",
+        "sp_plan_name": "triage",
+        "sp_uid": str(uuid.uuid4()),
+        "sp_triage_exposure": exposure,
+        "sp_triage_threshold": threshold,
+        "sp_triage_action": action
+    }
+    _md.update(md or {})
+    values = []
+    result = {}
+
+    @bpp.stage_decorator([area_det])
+    @bpp.run_decorator(md=_md)
+    def inner():
+        for x, y in np.asarray(centers, dtype=float).tolist():
+            yield from bps.checkpoint()
+            yield from bps.mv(x_motor, x, y_motor, y)
+            readings = yield from bps.trigger_and_read([area_det, x_motor, y_motor])
+            values.append(metric(readings) if readings is not None else None)
+        result["scores"] = triage_scores(_stack(values), reference)
+        # the values are None only if the plan is simulated
+        if any(v is not None for v in values) and np.all(np.isnan(result["scores"])):
+            raise ValueError(f"The metric returns no number for any of the {len(values)} wells.")
+        result["decisions"] = triage_decisions(result["scores"], threshold, action)
+        for i, (s, d) in enumerate(zip(result["scores"].tolist(), result["decisions"].tolist())):
+            yield from bps.mv(well, i, score, s, decision, d)
+            yield from bps.trigger_and_read([well, score, decision], name="triage")
+
+    yield from _configure_area_det(exposure)
+    yield from inner()
+    return result["scores"], result["decisions"]
+
+
+def _stack(values: list) -> np.ndarray:
+    """Stack the metric of the wells. The unknown ones become arrays of NaN."""
+    arrays = [np.asarray(v if v is not None else np.nan, dtype=float) for v in values]
+    shape = max((a.shape for a in arrays), key=len, default=())
+    return np.stack([np.broadcast_to(a, shape) for a in arrays]) if arrays else np.empty((0,))
@@ -1,18 +1,23 @@
 """The function for Rohan's insitu measurement."""
 import uuid
+from functools import partial
 
 from bluesky.callbacks import LiveTable
 from bluesky.plan_stubs import abs_set
 from bluesky.plans import count
 from bluesky.preprocessors import subs_wrapper, plan_mutator
-from xpdacq.xpdacq_conf import xpd_configuration
 
 import scanplans.tools as tl
+from scanplans.context import resolve_context
+from scanplans.convergence import Convergence
+from scanplans.monitor import monitor_during
 
 __all__ = ["ttseries"]
 
 
-def ttseries(dets, temp_setpoint, exposure, delay, num, auto_shutter=True, manual_set=False):
+def ttseries(dets, temp_setpoint, exposure, delay, num, auto_shutter=True, manual_set=False, monitor_rate=None,
+             monitor_decimation=1, monitor_signals=None, absolute_cadence=None, convergence_threshold=None,
+             convergence_frames=3, min_duration=0., convergence_reducer=None, shutter_overhead=None, context=None):
     """
     Set a target temperature. Make time series scan with area detector during the ramping and holding. Since
     abs_set is used, please do not set the temperature through CSstudio when the plan is running.
@@ -42,6 +47,38 @@ def ttseries(dets, temp_setpoint, exposure, delay, num, auto_shutter=True, manua
     manual_set : bool
         Option on whether to manual set the temperature set point outside the plan. If True, no temperature
         will be set in plan.
+    monitor_rate : float
+        The number of times per second to poll the temperature controller in the stream 'temperature_monitor'.
+        If None, there is no monitor. Default None.
+    monitor_decimation : int
+        The number of polls averaged into one event in the monitor stream. Default 1.
+    monitor_signals : list
+        The signals to poll, e.g. the heater output. Default the temperature controller.
+    absolute_cadence : bool
+        If True, the readings start at the absolute times t0 + k * delay so that the shutter, the readout and
+        other overheads do not add up, and the jitter and the missed slots are recorded. See
+        `~scanplans.tools.cadence_count`. If False, use `count` with the delay. Default True with the
+        convergence_threshold and False without it.
+    convergence_threshold : float
+        If not None, end the series early after `convergence_frames` consecutive readings whose relative change
+        from the previous reading is below the threshold. See `~scanplans.convergence.Convergence`. It needs the
+        absolute_cadence. Default None.
+    convergence_frames : int
+        The number of consecutive static readings to end the series. Default 3.
+    min_duration : float
+        The time from the first reading in seconds before the series can end early. Default 0.
+    convergence_reducer : callable
+        A function from the readings to an array to compare, e.g. the integrated pattern. It is required with the
+        convergence_threshold because the image of the area detector is saved in files, not in the readings.
+    shutter_overhead : float
+        The time in seconds the shutter adds to each reading, e.g. the longest latency measured by
+        `~scanplans.tools.calibrate_shutter`. It is only used to warn before the run when the exposure and the
+        overhead do not fit in the delay. Default an estimate: glbl['shutter_sleep'] for a shutter which can not
+        be read back and 0 otherwise, because the latency of a shutter which is read back is only known during
+        the run.
+    context : PlanContext
+        The configuration to read the devices and glbl from. See `~scanplans.context.PlanContext`. Default the
+        globals.
 
     Examples
     --------
@@ -57,8 +94,15 @@ def ttseries(dets, temp_setpoint, exposure, delay, num, auto_shutter=True, manua
 
         >>> ScanPlan(bt, ttseries, 300, 10, 20, 10, False)
     """
-    area_det = xpd_configuration["area_det"]
-    temp_controller = xpd_configuration["temp_controller"]
+    if absolute_cadence is None:
+        absolute_cadence = convergence_threshold is not None
+    if convergence_threshold is not None and not absolute_cadence:
+        raise ValueError("The convergence_threshold needs the absolute_cadence.")
+    if convergence_threshold is not None and convergence_reducer is None:
+        raise ValueError("The convergence_threshold needs the convergence_reducer.")
+    context = resolve_context(context)
+    area_det = context.configuration["area_det"]
+    temp_controller = context.configuration["temp_controller"]
     md = {
         "sp_type": "ttseries",
         "sp_uid": str(uuid.uuid4()),
@@ -66,21 +110,37 @@ def ttseries(dets, temp_setpoint, exposure, delay, num, auto_shutter=True, manua
         "temp_setpoint": temp_setpoint
     }
     # calculate number of frames
-    exposure_md = tl.calc_exposure(area_det, exposure)
+    exposure_md = tl.calc_exposure(area_det, exposure, context=context)
     md.update(exposure_md)
     # calculate the real delay and period
     computed_exposure = exposure_md.get("sp_computed_exposure")
-    delay_md = tl.calc_delay(delay, computed_exposure, num)
+    # without a measurement, estimate the overhead by the sleep of the shutters which are not read back
+    if not auto_shutter:
+        overhead = 0.
+    elif shutter_overhead is not None:
+        overhead = shutter_overhead
+    else:
+        overhead = context.glbl["shutter_sleep"] if tl.shutter_readback(context) is None else 0.
+    delay_md = tl.calc_delay(delay, computed_exposure, num, overhead)
     md.update(delay_md)
     # make the count plan
     real_delay = delay_md.get('sp_computed_delay')
-    plan = count([area_det, temp_controller], num, real_delay, md=md)
+    if absolute_cadence:
+        convergence = None
+        if convergence_threshold is not None:
+            convergence = Convergence(convergence_threshold, convergence_reducer, convergence_frames, min_duration)
+        plan = tl.cadence_count([area_det, temp_controller], num, real_delay, md=md, convergence=convergence)
+    else:
+        plan = count([area_det, temp_controller], num, real_delay, md=md)
     plan = subs_wrapper(plan, LiveTable([temp_controller]))
+    if monitor_rate:
+        signals = monitor_signals if monitor_signals else [temp_controller]
+        plan = monitor_during(plan, signals, monitor_rate, monitor_decimation)
     # open and close the shutter for each count
     if auto_shutter:
-        plan = plan_mutator(plan, tl.inner_shutter_control)
+        plan = plan_mutator(plan, partial(tl.inner_shutter_control, context=context))
     # yield messages
     yield from tl.configure_area_det(area_det, md)
     if not manual_set:
         yield from abs_set(temp_controller, temp_setpoint, wait=False)
-    yield from plan
+    return (yield from plan)
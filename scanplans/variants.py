@@ -0,0 +1,109 @@
+"""Simulate many variants of a plan and its configuration in parallel to compare them.
+
+A variant is a function which makes the plan from a `~scanplans.context.PlanContext` and the context to make it
+with, e.g. the same beamtime with another order of the samples or another exposure strategy. Each variant runs on
+its own `~scanplans.sim.SimBeamline` in a worker process. The plans and the devices are not sent to the workers.
+The workers are forked from the current process and find the variants by the name so that the devices, which can
+not be pickled, are shared as they are.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import threading
+import typing as tp
+from concurrent.futures import ProcessPoolExecutor
+
+from scanplans._lazy import lazy_import
+from scanplans.context import PlanContext
+from scanplans.sim import SimBeamline
+
+pd = lazy_import("pandas")
+
+__all__ = [
+    "simulate_variants"
+]
+Variant = tp.Tuple[tp.Callable[..., tp.Generator], tp.Optional[PlanContext]]
+
+# the variants and the beamline factory of the current call, inherited by the forked workers
+_JOBS = {}  # type: tp.Dict[str, tp.Any]
+
+
+def _forget_exit_hooks():
+    """Drop the thread exit hooks inherited from the parent, e.g. the client of the data broker stopping its
+    server thread, which would wait forever in the worker where the thread does not exist."""
+    hooks = getattr(threading, "_threading_atexits", None)
+    if hooks is not None:
+        hooks.clear()
+
+
+def _simulate(name: str) -> dict:
+    """Simulate the variant in the job table. The error is reported in the row instead of raised."""
+    factory, context = _JOBS["variants"][name]
+    row = {"variant": name}
+    try:
+        result = _JOBS["beamline"]().run(factory(context=context))
+    except Exception as error:
+        row.update(error=f"{type(error).__name__}: {error}")
+        return row
+    row.update(
+        duration=result.duration,
+        num_runs=result.num_runs,
+        num_events=result.num_events,
+        sleep=result.sleep,
+        messages=sum(result.commands.values()),
+        wall_time=result.wall_time,
+        error=""
+    )
+    return row
+
+
+def simulate_variants(variants: tp.Mapping[str, Variant], beamline: tp.Callable[[], SimBeamline],
+                      processes: int = None) -> pd.DataFrame:
+    """
+    Simulate each variant on a new simulated beamline and tabulate the results.
+
+    Parameters
+    ----------
+    variants
+        The variants by the name. A variant is a pair of the function to make the plan and the context. The
+        function is called as `function(context=context)`, e.g. `functools.partial(ttseries, [], 300, 10, 5, 10)`.
+        The context can be None to use the globals.
+    beamline
+        The function which makes a `~scanplans.sim.SimBeamline` with the latency models of the devices. It is
+        called once for each variant so that the variants do not share the state of the devices.
+    processes
+        The number of worker processes. Default the number of CPUs. If 1 or the platform can not fork, the
+        variants are simulated one by one in this process.
+
+    Returns
+    -------
+    table
+        A pandas table with the columns 'variant', 'duration', 'num_runs', 'num_events', 'sleep', 'messages',
+        'wall_time' and 'error', sorted from the shortest duration. The variants which fail have the error and NaN
+        elsewhere.
+
+    Examples
+    --------
+    Compare the frame time of the detector for the same temperature series.
+    >>> plan = partial(ttseries, [], 300, 10, 5, 10)
+    >>> variants = {f"{t} s": (plan, PlanContext(glbl={"frame_acq_time": t})) for t in (0.1, 0.2, 0.5)}
+    >>> simulate_variants(variants, make_sim_beamline)
+    """
+    if processes is not None and processes < 1:
+        raise ValueError(f"The processes must be at least 1. It is {processes}.")
+    if _JOBS:
+        raise RuntimeError("simulate_variants can not be called from a variant.")
+    names = list(variants)
+    _JOBS.update(variants=dict(variants), beamline=beamline)
+    try:
+        if processes == 1 or len(names) < 2 or "fork" not in multiprocessing.get_all_start_methods():
+            rows = [_simulate(name) for name in names]
+        else:
+            context = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(processes, mp_context=context, initializer=_forget_exit_hooks) as executor:
+                rows = list(executor.map(_simulate, names))
+    finally:
+        _JOBS.clear()
+    columns = ["variant", "duration", "num_runs", "num_events", "sleep", "messages", "wall_time", "error"]
+    table = pd.DataFrame(rows, columns=columns)
+    return table.sort_values("duration", ignore_index=True, na_position="last")
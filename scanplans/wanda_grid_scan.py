@@ -2,21 +2,34 @@ import os
 import uuid
 
 import bluesky.plan_stubs as bps
-import bluesky.plans as bp
 import bluesky.preprocessors as bpp
 import numpy as np
-import pandas as pd
 from bluesky.callbacks import LiveTable
-from xpdacq.beamtime import _configure_area_det
-from xpdacq.tools import xpdAcqException
-from xpdacq.utils import ExceltoYaml
+
+import scanplans.patterns as pt
+import scanplans.singlerun as sr
+import scanplans.tools as tl
+import scanplans.triage as tr
+from scanplans._lazy import lazy_import
+from scanplans.context import PlanContext
+from scanplans.moves import MoveTracker
+
+pd = lazy_import("pandas")
+Signal = lazy_import("ophyd", "Signal")
+_configure_area_det = lazy_import("xpdacq.beamtime", "_configure_area_det")
+xpdAcqException = lazy_import("xpdacq.tools", "xpdAcqException")
+ExceltoYaml = lazy_import("xpdacq.utils", "ExceltoYaml")
 
 gridScan_sample = {}
 
 
 def gridScan(dets, exp_spreadsheet_fn, glbl, xpd_configuration,
              XPD_SHUTTER_CONF, *,
-             crossed=False, dx=None, dy=None, wait_time=5):
+             crossed=False, dx=None, dy=None, wait_time=5,
+             pattern=None, pattern_kwargs=None, optimize_order=False,
+             triage_exposure=None, triage_threshold=0.5, triage_metric=None,
+             triage_reference=None, triage_action='skip', triage_factor=0.25,
+             auto_exposure=None, move_tolerance=1e-3, single_run=False):
     """
     Scan plan for the multi-sample grid scan.
 
@@ -30,6 +43,12 @@ def gridScan(dets, exp_spreadsheet_fn, glbl, xpd_configuration,
     also be set to avoid residuals (ghost image). Please see
     ``Examples`` below.
 
+    More general patterns of points in each well can be chosen by
+    ``pattern`` and ``pattern_kwargs``. All the points in a well are
+    collected in one run. The offsets of each point from the well
+    center are recorded in the event data as ``x_offset`` and
+    ``y_offset``.
+
     Parameters
     ----------
     dets : list
@@ -53,6 +72,55 @@ def gridScan(dets, exp_spreadsheet_fn, glbl, xpd_configuration,
         a float if ``crossed`` is set to True. Default to None.
     wait_time : float, optional
         Wait time between each count, default is 5s
+    pattern : str, optional
+        The pattern of points in each well. One of "center", "cross",
+        "grid", "circle", "spiral" and "disk". See
+        ``scanplans.patterns``. If None, it is "cross" when ``crossed``
+        is True and "center" otherwise. Default to None.
+    pattern_kwargs : dict, optional
+        The parameters of the pattern, e.g. ``{"radius": 0.2, "num": 8}``
+        for "spiral". For "cross", the default is ``dx`` and ``dy``.
+        Default to None.
+    optimize_order : bool, optional
+        option if to visit the wells and the points in each well in the
+        nearest neighbor order to reduce the motion. Default to False.
+    triage_exposure : float, optional
+        If given, take one exposure of this time at the center of each
+        well in a triage run before the measurements. The wells whose
+        scores are below ``triage_threshold`` are skipped or shortened.
+        Default to None, no triage.
+    triage_threshold : float, optional
+        The score below which a well is considered empty. See
+        ``scanplans.triage.triage_scores``. Default to 0.5.
+    triage_metric : callable, optional
+        A function from the readings of a well to a number or an array,
+        e.g. the integrated intensity in a region of interest. Required
+        with ``triage_exposure``.
+    triage_reference : float or array, optional
+        The metric of an empty well. If None, the score is the metric
+        relative to the largest one of all wells. Default to None.
+    triage_action : str, optional
+        "skip" to drop the empty wells or "shorten" to measure them
+        with ``triage_factor`` times the exposure. Default to "skip".
+    triage_factor : float, optional
+        The fraction of the exposure of the shortened wells. Default to
+        0.25.
+    auto_exposure : AutoExposure, optional
+        If given, take a probe frame at the first point of each well and
+        choose the exposure by ``scanplans.autoexposure.AutoExposure``
+        instead of the ``Exposure time`` column. Default to None.
+    move_tolerance : float, optional
+        The motors are only moved if the target of a point differs from
+        the last one by more than this, e.g. the x motor stays at the
+        center for the crossed points along y. See
+        ``scanplans.moves.MoveTracker``. If None, both motors are moved
+        at every point. Default to 1e-3.
+    single_run : bool, optional
+        option if to record all the wells in one run instead of one run
+        per well. The start document of each well becomes an event in
+        the "samples" stream and the events of the well have the
+        ``sample_index`` and ``sample_name``. The triage run stays a run
+        of its own. See ``scanplans.singlerun``. Default to False.
 
     Examples
     --------
@@ -87,13 +155,29 @@ def gridScan(dets, exp_spreadsheet_fn, glbl, xpd_configuration,
     grid_plan = gridScan(dets,  'wandaHY1_sample.xlsx', wait_time=5)
     uids = xrun(gridScan_sample, grid_plan)
 
-    # finally, retrieve event information as a dataframe
-    hdrs = db[-len(uids):]
-    df = db.get_table(hdrs)
+    # case 3
+    # collect 12 points on a Fermat spiral of radius 0.3 in each well
+    # and visit the wells in the order of the shortest motion
+    grid_plan = gridScan(dets, 'wandaHY1_sample.xlsx', pattern='spiral',
+                         pattern_kwargs={'radius': 0.3, 'num': 12},
+                         optimize_order=True)
+
+    # case 4
+    # take a 0.1 s shot of each well first and skip the wells with less
+    # than 20 % more intensity than the empty well ``empty``
+    grid_plan = gridScan(dets, 'wandaHY1_sample.xlsx',
+                         triage_exposure=0.1, triage_reference=empty,
+                         triage_threshold=0.2)
+
+    # finally, export the event information while the scan runs so
+    # that the table is ready as soon as it ends
+    exporter = ColumnarExporter('wandaHY1_spatial_scan.parquet')
+    grid_plan = gridScan(dets, 'wandaHY1_sample.xlsx', wait_time=5)
+    uids = xrun(gridScan_sample, grid_plan, exporter)
     # visualize the dataframe
+    df = exporter.read()
     df
-    # save the dataframe as a csv
-    df.to_csv('wandaHY1_spatial_scan_df.csv')
+    exporter.close()
 
     Notes
     -----
@@ -106,12 +190,36 @@ def gridScan(dets, exp_spreadsheet_fn, glbl, xpd_configuration,
       it every time after using it. As demonstrated in the Example,
       we redefine the ``grid_plan`` again after printing the summary.
       Similarly, if you wish to execute the same scan plan, you would
-      have to repeat the syntax.
+      have to repeat the syntax. Alternatively, compile the plan once
+      with ``scanplans.compiled.compile_plan`` and use
+      ``compiled.plan()`` to preview or run it as many times as needed.
+
+    3. The triage run has the readings of the wells in the primary
+      stream and the score and decision of each well in the "triage"
+      stream. Each measured well has ``sp_triage_score``,
+      ``sp_triage_decision`` and ``sp_triage_uid``, the ``sp_uid`` of
+      the triage run, in its metadata.
     """
 
-    def count_dets(_dets, _full_md):
-        _count_plan = bp.count(_dets, md=_full_md)
-        _count_plan = bpp.subs_wrapper(_count_plan, LiveTable(_dets))
+    x_offset = Signal(name='x_offset', value=0.)
+    y_offset = Signal(name='y_offset', value=0.)
+    tracker = MoveTracker(move_tolerance) if move_tolerance is not None else None
+    move = tracker.mv if tracker is not None else bps.mv
+
+    def count_dets(_dets, _full_md, _trajectory, _offsets):
+        """Collect all the points in a well in one run."""
+
+        @bpp.stage_decorator(_dets)
+        @bpp.run_decorator(md=_full_md)
+        def _inner():
+            for (_x, _y), (_dx, _dy) in zip(_trajectory.tolist(), _offsets.tolist()):
+                yield from bps.checkpoint()
+                yield from move(x_motor, _x)
+                yield from move(y_motor, _y)
+                yield from bps.mv(x_offset, _dx, y_offset, _dy)
+                yield from bps.trigger_and_read(_dets + [x_offset, y_offset])
+
+        _count_plan = bpp.subs_wrapper(_inner(), LiveTable(_dets))
         _count_plan = bpp.finalize_wrapper(_count_plan,
                                            bps.abs_set(xpd_configuration['shutter'],
                                                        XPD_SHUTTER_CONF['close'],
@@ -126,6 +234,8 @@ def gridScan(dets, exp_spreadsheet_fn, glbl, xpd_configuration,
     spreadsheet_parser.parse_sample_md()
     # get detectors
     area_det = xpd_configuration['area_det']
+    # the probe of the auto exposure uses the same shutter and settings
+    context = PlanContext(xpd_configuration, glbl, XPD_SHUTTER_CONF)
     x_motor, y_motor = list(dets)[:2]
     dets = [area_det] + dets
     # compute Nsteps
@@ -148,35 +258,87 @@ def gridScan(dets, exp_spreadsheet_fn, glbl, xpd_configuration,
     # validate crossed scan
     if crossed and (not dx or not dy):
         raise xpdAcqException("dx and dy must both be provided if crossed is set to True")
+    # compute the trajectories of all wells
+    if pattern is None:
+        pattern = 'cross' if crossed else 'center'
+    if pattern_kwargs is None:
+        pattern_kwargs = {'dx': dx, 'dy': dy} if pattern == 'cross' else {}
+    if pattern == 'cross' and (not pattern_kwargs.get('dx') or not pattern_kwargs.get('dy')):
+        raise xpdAcqException("dx and dy must both be provided for the cross pattern")
+    sa_md_list = spreadsheet_parser.parsed_sa_md_list
+    centers = np.array(
+        [[float(md_dict['x-position']), float(md_dict['y-position'])] for md_dict in sa_md_list]
+    ).reshape(-1, 2)
+    offsets = pt.make_offsets(pattern, len(sa_md_list), **pattern_kwargs)
+    well_order, trajectories, offsets = pt.make_trajectories(centers, offsets, optimize=optimize_order)
+    _md['sp_pattern'] = pattern
+    _md['sp_pattern_kwargs'] = pattern_kwargs
+    _md['sp_num_points'] = offsets.shape[1]
+    # take a short shot of each well and decide which wells to measure
+    if triage_action not in (tr.SKIP, tr.SHORTEN):
+        raise xpdAcqException("triage_action must be 'skip' or 'shorten'")
+    scores = np.full(len(sa_md_list), np.nan)
+    decisions = np.full(len(sa_md_list), tr.MEASURE, dtype=object)
+    triage_md = {'sp_triage_uid': str(uuid.uuid4())}
+    if triage_exposure is not None:
+        if triage_metric is None:
+            raise xpdAcqException("triage_metric is required with triage_exposure")
+        triage_plan = tr.triage_wells(area_det, x_motor, y_motor, centers[well_order], triage_exposure,
+                                      triage_threshold, metric=triage_metric, reference=triage_reference,
+                                      action=triage_action,
+                                      md={'sp_uid': triage_md['sp_triage_uid'],
+                                          'sp_triage_wells': [sa_md_list[w]['sample_name'] for w in well_order]})
+        triage_plan = bpp.finalize_wrapper(triage_plan,
+                                           bps.abs_set(xpd_configuration['shutter'],
+                                                       XPD_SHUTTER_CONF['close'],
+                                                       wait=True))
+        yield from bps.abs_set(xpd_configuration['shutter'], XPD_SHUTTER_CONF['open'], wait=True)
+        scores[well_order], decisions[well_order] = yield from triage_plan
+        print("INFO: triage of {} wells: {} measured, {} {}.".format(
+            len(sa_md_list), int(np.sum(decisions == tr.MEASURE)),
+            int(np.sum(decisions == triage_action)),
+            'skipped' if triage_action == tr.SKIP else 'shortened'))
+
     # construct scan plan
-    for md_dict in spreadsheet_parser.parsed_sa_md_list:
-        expo = float(md_dict['exposure_time(s)'])
-        # setting up area_detector
-        yield from _configure_area_det(expo)
-        expo_md = calc_expo_md(dets[0], expo)
-        # inject md for each sample
-        full_md = dict(_md)
-        full_md.update(expo_md)
-        full_md.update(md_dict)
-        # Manually open shutter before collecting. See the reason
-        # stated below.
-        # main plan
-        x_center = float(md_dict['x-position'])
-        y_center = float(md_dict['y-position'])
-        yield from bps.mv(x_motor, x_center)
-        yield from bps.mv(y_motor, y_center)
-        yield from count_dets(dets, full_md)  # no crossed
-        if crossed:
-            x_traj = [-dx + x_center, x_center + dx, x_center, x_center]
-            y_traj = [y_center, y_center, y_center + dy, y_center - dy]
-            for x_setpoint, y_setpoint in zip(x_traj, y_traj):
-                yield from bps.mv(x_motor, x_setpoint)
-                yield from bps.mv(y_motor, y_setpoint)
-                full_md['x-position'] = x_setpoint
-                full_md['y-position'] = y_setpoint
-                yield from count_dets(dets, full_md)
-        # use specified sleep time -> avoid residual from the calibrant
-        yield from bps.sleep(wait_time)
+    def measure():
+        for well, trajectory, offset in zip(well_order, trajectories, offsets):
+            md_dict = sa_md_list[well]
+            expo = float(md_dict['exposure_time(s)'])
+            if decisions[well] == tr.SKIP:
+                print("INFO: skip the empty well {}.".format(md_dict['sample_name']))
+                continue
+            scale = triage_factor if decisions[well] == tr.SHORTEN else 1.
+            if auto_exposure is not None:
+                # probe at the first point of the well
+                yield from move(x_motor, trajectory[0, 0], y_motor, trajectory[0, 1])
+                expo_md = yield from auto_exposure.probe(area_det, scale=scale, context=context)
+                yield from tl.configure_area_det(area_det, expo_md)
+            else:
+                expo *= scale
+                # setting up area_detector
+                yield from _configure_area_det(expo)
+                expo_md = calc_expo_md(dets[0], expo)
+            # inject md for each sample
+            full_md = dict(_md)
+            full_md.update(expo_md)
+            if triage_exposure is not None:
+                full_md.update(triage_md)
+                full_md['sp_triage_score'] = float(scores[well])
+                full_md['sp_triage_decision'] = decisions[well]
+            full_md.update(md_dict)
+            # Manually open shutter before collecting. See the reason
+            # stated below.
+            # main plan
+            yield from count_dets(dets, full_md, trajectory, offset)
+            # use specified sleep time -> avoid residual from the calibrant
+            yield from bps.sleep(wait_time)
+        if tracker is not None:
+            print("INFO: {}".format(tracker))
+
+    plan = measure()
+    if single_run:
+        plan = sr.single_run(plan, md={k: v for k, v in _md.items() if v is not None})
+    yield from plan
 
 
 def calc_expo_md(det, exposure):
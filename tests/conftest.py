@@ -1,17 +1,21 @@
+import typing as tp
 from importlib.resources import path
 
 import pytest
 from bluesky import RunEngine
-from ophyd.sim import hw
+from ophyd.sim import hw, SynAxis
 from xpdacq.beamtime import Beamtime
 from xpdacq.beamtime import xpd_configuration
 from xpdacq.beamtimeSetup import load_beamtime
 from xpdacq.simulation import xpd_pe1c, shctl1
 
+from scanplans.sim import SimBeamline, MotorModel, ShutterModel, AreaDetectorModel, TemperatureModel
+
 with path("data", "__init__.py") as p:
     DATA = p.parent
 
 HW = hw()
+TEMP_CONTROLLER = SynAxis(name="temp_controller")
 
 
 @pytest.fixture()
@@ -25,11 +29,32 @@ def RE():
     return RunEngine()
 
 
+def make_sim_beamline() -> SimBeamline:
+    sim = SimBeamline()
+    sim.add(HW.motor1, MotorModel(velocity=1., acceleration=4., settle_time=0.1))
+    sim.add(HW.motor2, MotorModel(velocity=1., acceleration=4., settle_time=0.1))
+    sim.add(shctl1, ShutterModel(delay=0.05))
+    sim.add(xpd_pe1c, AreaDetectorModel(readout_time=0.01))
+    sim.add(TEMP_CONTROLLER, TemperatureModel(tau=60., tolerance=0.5, value=295.))
+    return sim
+
+
+@pytest.fixture
+def sim_beamline() -> SimBeamline:
+    return make_sim_beamline()
+
+
+@pytest.fixture
+def sim_beamline_factory() -> tp.Callable[[], SimBeamline]:
+    return make_sim_beamline
+
+
 xpd_configuration.update(
     {
         "area_det": xpd_pe1c,
         "x_controller": HW.motor1,
         "y_controller": HW.motor2,
-        "shutter": shctl1
+        "shutter": shctl1,
+        "temp_controller": TEMP_CONTROLLER
     }
 )
@@ -0,0 +1,96 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from xpdacq.simulation import xpd_pe1c
+
+import scanplans.autoexposure as mod
+from scanplans.context import PlanContext
+from scanplans.frametime import DetectorModel
+
+
+def test_choose():
+    # 100 counts per pixel in the 0.1 s probe and a few bright pixels of 1000 counts
+    image = np.full((100, 100), 100.)
+    image[:5, :5] = 1000.
+    auto = mod.AutoExposure(target_counts=1e4, peak_percentile=99.9, saturation=16000., fill=0.5,
+                            model=DetectorModel(0.1, 5.))
+    assert np.allclose(auto.rates(image), (1000., 10000.))
+    md = auto.choose(image)
+    # 10 s to reach 1e4 counts in frames of at most 0.8 s to keep the peak below half of the saturation
+    assert md["sp_requested_exposure"] == 10.
+    assert md["sp_time_per_frame"] <= 0.8
+    assert md["sp_num_frames"] * md["sp_time_per_frame"] >= 10.
+    assert md["sp_auto_exposure"]
+    assert auto.choose(image, scale=0.5)["sp_requested_exposure"] == 5.
+    assert auto.choose(None)["sp_requested_exposure"] == auto.max_exposure
+
+
+def test_probe(RE):
+    image = np.full((10, 10), 50.)
+    auto = mod.AutoExposure(target_counts=1e3, image_getter=lambda readings: image)
+    result = []
+
+    def plan():
+        result.append((yield from auto.probe(xpd_pe1c)))
+
+    RE(plan())
+    assert result[0]["sp_requested_exposure"] == 2.
+    assert xpd_pe1c.cam.acquire_time.get() == auto.probe_time
+
+
+def test_exposure_plan():
+    md = {"sp_requested_exposure": 3.}
+    assert mod.exposure_plan(None, lambda _md: _md["sp_requested_exposure"], md) == 3.
+
+
+def test_exposure_plan_by_name():
+    def plan_func(dets, temp_setpoint, exposure, delay):
+        return temp_setpoint, exposure, delay
+
+    def no_exposure(dets, wait):
+        return wait
+
+    class FakeScanPlan(dict):
+        pass
+
+    sp = FakeScanPlan(sp_args=(300., 10., 20.), sp_kwargs={})
+    sp.plan_func = plan_func
+    bt = SimpleNamespace(scanplans={"ttseries": sp})
+    md = {"sp_requested_exposure": 3., "sp_time_per_frame": 1.}
+    # the exposure is replaced and not the temperature
+    assert mod.exposure_plan(bt, "ttseries", md) == (300., 3., 20.)
+    sp = FakeScanPlan(sp_args=(5.,), sp_kwargs={})
+    sp.plan_func = no_exposure
+    bt.scanplans["wait"] = sp
+    with pytest.raises(ValueError):
+        mod.exposure_plan(bt, "wait", md)
+
+
+def test_exposure_plan_frame_time():
+    def with_context(dets, exposure, context=None):
+        return context.glbl["frame_acq_time"]
+
+    def without_context(dets, exposure):
+        return exposure
+
+    class FakeScanPlan(dict):
+        pass
+
+    bt = SimpleNamespace(scanplans={})
+    for name, func in (("with", with_context), ("without", without_context)):
+        bt.scanplans[name] = FakeScanPlan(sp_args=(10.,), sp_kwargs={})
+        bt.scanplans[name].plan_func = func
+    md = {"sp_requested_exposure": 3., "sp_time_per_frame": 0.2}
+    context = PlanContext(glbl={"frame_acq_time": 0.5})
+    # the chosen frame time is given to the plan or the plan can not run at it
+    assert mod.exposure_plan(bt, "with", md, context) == 0.2
+    with pytest.raises(ValueError):
+        mod.exposure_plan(bt, "without", md, context)
+    assert mod.exposure_plan(bt, "without", md, context.replace(glbl={"frame_acq_time": 0.1})) == 3.
+
+
+def test_probe_without_image(RE):
+    auto = mod.AutoExposure(image_getter=lambda readings: None)
+    with pytest.raises(ValueError):
+        RE(auto.probe(xpd_pe1c))
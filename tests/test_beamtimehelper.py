@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+from bluesky.simulators import summarize_plan
+
+from scanplans.beamtimehelper import BeamtimeHelper
+from scanplans.sampletable import SampleTable
+
+
+def test_aim_at_samples():
+    samples = {
+        "Ni0": {"sample_name": "Ni0", "sample_x": 1.0, "sample_y": 2.0},
+        "Ni1": {"sample_name": "Ni1", "sample_y": 2.0},
+    }
+    bthelper = BeamtimeHelper(SimpleNamespace(samples=samples))
+    rows = bthelper.select_samples(name="^Ni")
+    assert len(rows) == 2
+    summarize_plan(bthelper.aim_at_samples(rows))
+
+
+def test_nearest_sample():
+    samples = {
+        "Ni0": {"sample_name": "Ni0", "sample_x": 1.0, "sample_y": 2.0},
+        "Ni1": {"sample_name": "Ni1", "sample_x": 1.2, "sample_y": 2.0},
+        "Ni2": {"sample_name": "Ni2", "sample_x": 9.0, "sample_y": 9.0},
+    }
+    bthelper = BeamtimeHelper(SimpleNamespace(samples=samples))
+    assert list(bthelper.nearest_sample((8., 8.))["sample_name"]) == ["Ni2"]
+    assert list(bthelper.samples_within(2., (0., 2.)).index) == [0, 1]
+    assert list(bthelper.samples_in_box((0., 5.), (0., 5.)).index) == [0, 1]
+    assert list(bthelper.find_overlaps(0.5)["name_b"]) == ["Ni1"]
+    samples["Ni3"] = {"sample_name": "Ni3", "sample_x": 8.0, "sample_y": 8.0}
+    assert list(bthelper.nearest_sample((8., 8.))["sample_name"]) == ["Ni3"]
+    # a sample moved in place
+    samples["Ni0"]["sample_y"] = 20.0
+    assert list(bthelper.nearest_sample((1., 19.))["sample_name"]) == ["Ni0"]
+
+
+def test_refresh_once_per_call(monkeypatch):
+    samples = {"Ni0": {"sample_name": "Ni0", "sample_x": 1.0, "sample_y": 2.0}}
+    bthelper = BeamtimeHelper(SimpleNamespace(samples=samples))
+    bthelper.nearest_sample((0., 0.))
+    calls = []
+    refresh = SampleTable.refresh
+    monkeypatch.setattr(SampleTable, "refresh", lambda self, *names: calls.append(names) or refresh(self, *names))
+    bthelper.nearest_sample((0., 0.))
+    bthelper.samples_within(1., (0., 0.))
+    bthelper.samples_in_box((0., 5.), (0., 5.))
+    bthelper.find_overlaps(0.5)
+    assert len(calls) == 4
@@ -0,0 +1,62 @@
+import uuid
+
+import bluesky.plans as bp
+import pytest
+
+import scanplans.compiled as mod
+from scanplans.tramp3 import Tramp3
+from scanplans.ttseries import ttseries
+from tests.conftest import HW
+
+
+def test_compile_plan(tmp_path):
+    compiled = mod.compile_plan(ttseries([], 300., 0.1, 0.1, 2))
+    assert not compiled.readback_dependent
+    # the count with a delay computes its sleeps from the clock
+    assert compiled.clock_dependent
+    assert len(compiled.runs) == 1
+    assert "2 event(s)" in str(compiled)
+    filename = tmp_path.joinpath("ttseries.json")
+    compiled.save(str(filename))
+    loaded = mod.CompiledPlan.load(str(filename), compiled.devices)
+    assert loaded.lines() == [
+        line for line in compiled.lines() if not line.startswith(("subscribe", "unsubscribe"))
+    ]
+    assert compiled.estimate().num_events == 2
+    assert loaded.clock_dependent
+    with pytest.raises(ValueError):
+        loaded.plan()
+
+
+def test_replay(RE):
+    compiled = mod.compile_plan(bp.count([HW.det], 2, md={"sp_uid": str(uuid.uuid4())}))
+    assert not compiled.clock_dependent
+    starts = []
+    uids = RE(compiled.plan(), lambda name, doc: starts.append(doc) if name == "start" else None)
+    uids += RE(compiled.plan(), lambda name, doc: starts.append(doc) if name == "start" else None)
+    assert len(uids) == 2
+    # each replay is a new scan plan run
+    assert starts[0]["sp_uid"] != starts[1]["sp_uid"]
+
+
+def test_diff():
+    compiled = mod.compile_plan(ttseries([], 300., 0.1, 0.1, 2))
+    assert compiled.diff(mod.compile_plan(ttseries([], 300., 0.1, 0.1, 2))) == []
+    diff = compiled.diff(mod.compile_plan(ttseries([], 310., 0.1, 0.1, 2)))
+    assert any(line.startswith("+set temp_controller [300.0]") for line in diff)
+
+
+def test_readback_dependent():
+    compiled = mod.compile_plan(lambda: Tramp3([], 1., 1., 300., 310., 10.))
+    assert compiled.readback_dependent
+    assert compiled.readbacks == ["acquire_time"]
+    assert compiled.plan() is not compiled.plan()
+
+
+def test_clock_dependent(RE):
+    # the slots and the sleeps of the cadence are computed again in each run
+    compiled = mod.compile_plan(lambda: ttseries([], 300., 0.1, 0.1, 2, absolute_cadence=True))
+    assert compiled.clock_dependent and not compiled.readback_dependent
+    assert "Clock dependent" in str(compiled)
+    assert compiled.plan() is not compiled.plan()
+    assert len(RE(compiled.plan())) == 1
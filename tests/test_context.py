@@ -0,0 +1,36 @@
+import pytest
+from xpdacq.beamtime import xpd_configuration
+from xpdacq.glbl import glbl
+
+from scanplans.context import PlanContext, resolve_context
+from scanplans.ttseries import ttseries
+
+
+def test_context_falls_back_to_globals():
+    context = resolve_context()
+    assert context.configuration["area_det"] is xpd_configuration["area_det"]
+    assert context.glbl["frame_acq_time"] == glbl["frame_acq_time"]
+    context = PlanContext(glbl={"frame_acq_time": 5.})
+    assert context.glbl["frame_acq_time"] == 5.
+    assert context.glbl["shutter_sleep"] == glbl["shutter_sleep"]
+    assert context.configuration["area_det"] is xpd_configuration["area_det"]
+    assert glbl["frame_acq_time"] != 5.
+    context = context.replace(glbl={"shutter_sleep": 0.})
+    assert context.glbl["frame_acq_time"] == 5.
+    assert context.glbl["shutter_sleep"] == 0.
+
+
+def test_ttseries_with_context(sim_beamline):
+    dets = [xpd_configuration["area_det"]]
+    context = PlanContext(glbl={"frame_acq_time": 0.5, "shutter_sleep": 0.})
+    sim_beamline.run(ttseries(dets, 400., 1., 10., 3, auto_shutter=False, context=context))
+    assert sim_beamline.value(xpd_configuration["area_det"].cam.acquire_time) == pytest.approx(0.5)
+
+
+def test_context_configuration(sim_beamline):
+    motor = xpd_configuration["x_controller"]
+    context = PlanContext(configuration={"temp_controller": motor})
+    result = sim_beamline.run(ttseries([], 3., 1., 1., 2, context=context))
+    assert result.num_events == 2
+    assert sim_beamline.models[motor.name].setpoint == 3.
+    assert sim_beamline.value(xpd_configuration["temp_controller"]) == 295.
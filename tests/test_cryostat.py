@@ -0,0 +1,84 @@
+import pytest
+from ophyd import Signal
+from ophyd.sim import SynAxis
+
+import scanplans.cryostat as mod
+from scanplans.monitor import monitor_during
+
+
+def test_ramp_temperature(RE):
+    temp_motor = SynAxis(name="temp_motor")
+    temp_motor.heater_range = Signal(name="heater_range", value=0)
+    docs = []
+    plan = monitor_during(mod.ramp_temperature(temp_motor, 50.), [temp_motor], rate=50.)
+    RE(plan, lambda name, doc: docs.append((name, doc)))
+    assert docs[0][1]["sp_temperature_setpoint"] == 50.
+    assert {doc["name"] for name, doc in docs if name == "descriptor"} >= {"primary", "temperature_monitor"}
+    assert temp_motor.heater_range.get() == 2
+
+
+def test_cryostat_plan_single_run(RE, bt):
+    temp_motor = SynAxis(name="temp_motor")
+    temp_motor.heater_range = Signal(name="heater_range", value=0)
+    posi_motor = SynAxis(name="posi_motor")
+    docs = []
+    plan = mod.cryostat_plan(bt, temp_motor, [50., 60.], posi_motor, [0., 1.], [0, 1], [0.1, 0.1], single_run=True)
+    RE(plan, lambda name, doc: docs.append((name, doc)))
+    names = [name for name, doc in docs]
+    assert names.count("start") == names.count("stop") == 1
+    assert docs[0][1]["sp_temperature_setpoints"] == [50., 60.]
+    assert docs[-1][1]["num_events"] == {"samples": 4, "primary": 4}
+    events = [doc for name, doc in docs if name == "event" and "sample_name" in doc["data"]]
+    assert [e["data"]["sample_index"] for e in events if "sample_md" not in e["data"]] == [0, 1, 2, 3]
+
+
+def test_cryostat_plan_single_run_monitor(RE, bt):
+    temp_motor = SynAxis(name="temp_motor")
+    temp_motor.heater_range = Signal(name="heater_range", value=0)
+    posi_motor = SynAxis(name="posi_motor")
+    docs = []
+    plan = mod.cryostat_plan(
+        bt, temp_motor, [50., 60.], posi_motor, [0., 1.], [0, 1], [0.1, 0.1], single_run=True, monitor_rate=20.
+    )
+    RE(plan, lambda name, doc: docs.append((name, doc)))
+    num_events = docs[-1][1]["num_events"]
+    # the ramps read the temperature only and the counts the detector and the motors
+    assert num_events["samples"] == 6
+    assert num_events["primary"] == 2 and num_events["primary_1"] == 4
+    assert num_events["temperature_monitor"] > 0
+
+
+def test_get_heater_ranges():
+    assert list(mod.get_heater_ranges([10., 30., 30.5, 100., 300.])) == [1, 1, 2, 2, 3]
+    assert mod.get_heater_range(50.) == 2
+    temp_to_power = {(100., 200.): "high", (0., 50.): "low"}
+    assert list(mod.get_heater_ranges([75., 150.], temp_to_power, strict=False)) == [None, "high"]
+    with pytest.raises(ValueError):
+        mod.get_heater_range(75., temp_to_power)
+    with pytest.raises(ValueError):
+        mod.get_heater_range(75., {(0., 100.): 1, (50., 200.): 2})
+
+
+def test_order_temperatures():
+    temperatures = [300., 80., 20., 150.]
+    assert mod.order_temperatures(temperatures, "ascending") == [20., 80., 150., 300.]
+    assert mod.order_temperatures(temperatures, "descending") == [300., 150., 80., 20.]
+    assert mod.order_temperatures(temperatures, "shortest", start=295.) == [300., 150., 80., 20.]
+    assert mod.order_temperatures(temperatures, "shortest", start=10.) == [20., 80., 150., 300.]
+
+
+def test_cryostat_plan_order(RE, bt):
+    temp_motor = SynAxis(name="temp_motor", value=295.)
+    temp_motor.heater_range = Signal(name="heater_range", value=3)
+    posi_motor = SynAxis(name="posi_motor")
+    sets = []
+    RE.msg_hook = lambda msg: sets.append((msg.obj.name, msg.args[0])) if msg.command == "set" else None
+    plan = mod.cryostat_plan(
+        bt, temp_motor, [20., 300., 80., 150.], posi_motor, [0.], [0], [0.1], order="shortest"
+    )
+    RE(plan)
+    # the sweep starts from the end closer to 295 K and the heater range is only written when it changes
+    assert [value for name, value in sets if name == "temp_motor"] == [300., 150., 80., 20.]
+    assert [value for name, value in sets if name == "heater_range"] == [2, 1]
+    with pytest.raises(ValueError):
+        next(mod.cryostat_plan(bt, temp_motor, [20.], posi_motor, [0.], [0], [0.1], order="random"))
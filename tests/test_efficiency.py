@@ -0,0 +1,59 @@
+import json
+
+import msgpack
+import pytest
+from bluesky.plans import count
+from ophyd.sim import hw
+
+import scanplans.efficiency as mod
+
+HW = hw()
+
+
+def _run(uid, plan, start, readings, stop, exposure=1.):
+    yield "start", {"uid": uid, "time": start, "plan_name": "count", "sp_plan_name": plan,
+                    "sp_requested_exposure": exposure, "sp_computed_exposure": exposure * 1.2}
+    yield "descriptor", {"uid": uid + "-d", "run_start": uid, "name": "primary", "time": start}
+    yield "descriptor", {"uid": uid + "-m", "run_start": uid, "name": "monitor", "time": start}
+    for t in readings:
+        yield "event", {"descriptor": uid + "-d", "time": t}
+        yield "event", {"descriptor": uid + "-m", "time": t}
+    yield "stop", {"run_start": uid, "time": stop, "exit_status": "success"}
+
+
+def _documents():
+    # 10 s and 20 s of runs and 10 s of dead time between them
+    yield from _run("a", "ttseries", 0., [2., 4., 6.], 10.)
+    yield from _run("b", "gridScan", 20., [22., 32.], 40.)
+
+
+def test_efficiency_report():
+    runs = mod.run_table(_documents())
+    assert list(runs["num_readings"]) == [3, 2]
+    report = mod.efficiency_report(runs, by=["plan"])
+    grid, ttseries = report.to_dict("records")
+    assert ttseries["plan"] == "ttseries" and ttseries["runs"] == 1
+    assert ttseries["beam_on"] == pytest.approx(3 * 1.2)
+    assert ttseries["setup"] == 2. and ttseries["teardown"] == 4.
+    assert ttseries["step_overhead"] == pytest.approx(4. - 2 * 1.2)
+    assert grid["dead_time"] == 10. and grid["elapsed"] == 30.
+    assert grid["exposure_ratio"] == pytest.approx(1.2)
+    total = mod.efficiency_report(runs, by=[])
+    assert len(total) == 1
+    assert total["beam_on_fraction"][0] == pytest.approx(5 * 1.2 / 40.)
+    assert total["runs_per_hour"][0] == pytest.approx(2 * 3600. / 40.)
+    assert list(mod.efficiency_report(runs)["hour"].astype(str)) == ["1970-01-01 00:00:00+00:00"] * 2
+
+
+def test_read_documents(tmp_path, RE):
+    docs = []
+    RE(count([HW.det], 3, md={"sp_plan_name": "count"}), lambda name, doc: docs.append((name, doc)))
+    with open(tmp_path / "runs.jsonl", "w") as f:
+        for name, doc in docs:
+            f.write(json.dumps([name, doc]) + "\n")
+    with open(tmp_path / "runs.msgpack", "wb") as f:
+        for name, doc in _documents():
+            f.write(msgpack.packb([name, doc]))
+    runs = mod.run_table(mod.read_documents(str(tmp_path)))
+    assert list(runs["plan"]) == ["ttseries", "gridScan", "count"]
+    assert list(runs["num_readings"]) == [3, 2, 3]
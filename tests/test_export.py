@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from bluesky.plans import count, scan
+
+import scanplans.export as mod
+from tests.conftest import HW
+
+
+@pytest.mark.parametrize("ext, backend", [(".parquet", "pyarrow"), (".h5", "h5py")])
+def test_columnar_exporter(RE, tmp_path, ext, backend):
+    pytest.importorskip(backend)
+    exporter = mod.ColumnarExporter(str(tmp_path / f"table{ext}"), batch_size=2)
+    RE(count([HW.det], num=3, md={"sample_name": "Ni", "sp_uid": "a", "sp_num_frames": 2}), exporter)
+    # a new metadata column and a string in the column of numbers
+    RE(scan([HW.det], HW.motor1, 0, 1, 2, md={"sample_name": "kapton", "sp_num_frames": "two",
+                                              "temperature": 300.}), exporter)
+    assert exporter.num_rows == 5
+    df = exporter.read()
+    exporter.close()
+    assert df["sample_name"].tolist() == ["Ni"] * 3 + ["kapton"] * 2
+    assert df["seq_num"].tolist() == [1, 2, 3, 1, 2]
+    assert np.allclose(df["motor1"].iloc[3:], [0., 1.])
+    assert np.isnan(df["temperature"].iloc[0])
+    assert df["sp_num_frames"].astype(str).tolist()[-1] == "two"
+    assert "plan_name" in df
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+import scanplans.frametime as mod
+
+
+def test_optimize_frame_time_no_overshoot():
+    exposures = [1., 30.05, 60., 7.5]
+    model = mod.DetectorModel(min_frame_time=0.1, max_frame_time=5.)
+    mds = mod.optimize_frame_time(exposures, model, max_frame_times=len(exposures))
+    assert [md["sp_requested_exposure"] for md in mds] == exposures
+    for md in mds:
+        assert md["sp_computed_exposure"] == pytest.approx(md["sp_requested_exposure"])
+        assert model.min_frame_time <= md["sp_time_per_frame"] <= model.max_frame_time
+
+
+def test_optimize_frame_time_max_frame_times():
+    exposures = np.linspace(1., 20., 11)
+    mds = mod.optimize_frame_time(exposures, mod.DetectorModel(dead_time=0.05), max_frame_times=2)
+    assert len({md["sp_time_per_frame"] for md in mds}) <= 2
+    for md in mds:
+        assert md["sp_computed_exposure"] >= md["sp_requested_exposure"] - 1e-9
+        assert md["sp_computed_exposure"] == pytest.approx(md["sp_time_per_frame"] * md["sp_num_frames"])
+
+
+def test_optimize_frame_time_single_frame():
+    mds = mod.optimize_frame_time([0.5, 2.], mod.DetectorModel(multi_frame=False))
+    assert [md["sp_num_frames"] for md in mds] == [1, 1]
+    assert [md["sp_time_per_frame"] for md in mds] == [0.5, 2.]
+
+
+def test_optimize_frame_time_too_short():
+    with pytest.raises(ValueError):
+        mod.optimize_frame_time([0.05, 1.], mod.DetectorModel(min_frame_time=0.1))
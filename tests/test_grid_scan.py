@@ -1,3 +1,5 @@
+import numpy as np
+import pytest
 from bluesky.simulators import summarize_plan
 
 import scanplans.grid_scan as mod
@@ -6,3 +8,31 @@ import scanplans.grid_scan as mod
 def test_acq_rel_grid_scan():
     plan = mod.acq_rel_grid_scan([], 30, 5, -1, 1, 3, -1, 1, 3)
     summarize_plan(plan)
+
+
+def test_adaptive_rel_grid_scan(RE):
+    # the readings change only across x = 0.3 so only the cells crossing it are refined
+    def metric(readings):
+        return float(readings["motor1"]["value"] > 0.3)
+
+    events = []
+    plan = mod.acq_rel_grid_scan(
+        [], 0.1, 0., -1, 1, 3, -1, 1, 3,
+        adaptive=True, metric=metric, threshold=0.5, max_level=1
+    )
+    RE(plan, lambda name, doc: events.append(doc) if name == "event" else None)
+    # 9 coarse points and 5 new points in each of the 2 cells crossing x = 0.3 minus the 1 shared edge midpoint
+    assert len(events) == 18
+    assert [e["data"]["refine_level"] for e in events].count(1) == 9
+
+
+def test_adaptive_rel_grid_scan_without_numbers(RE):
+    # e.g. a metric which finds only the datum id of the image
+    plan = mod.acq_rel_grid_scan([], 0.1, 0., -1, 1, 3, -1, 1, 3, adaptive=True, metric=lambda readings: np.nan)
+    with pytest.raises(ValueError):
+        RE(plan)
+
+
+def test_acq_rel_grid_scan_kwargs_without_adaptive():
+    with pytest.raises(ValueError):
+        next(mod.acq_rel_grid_scan([], 30, 5, -1, 1, 3, -1, 1, 3, threshold=0.5))
@@ -0,0 +1,18 @@
+import scanplans
+import scanplans.importtime as mod
+from scanplans._lazy import lazy_import
+
+
+def test_measure_import_times():
+    report = mod.measure_import_times(["scanplans", "scanplans.cryostat", "scanplans.tools"])
+    assert set(report["module"]) == {"scanplans", "scanplans.cryostat", "scanplans.tools"}
+    # the beamline configuration is only loaded when a plan uses it
+    assert (report["heavy"] == "").all()
+
+
+def test_lazy_api():
+    assert scanplans.get_heater_range(50.) == 2
+    assert "cryostat_plan" in dir(scanplans)
+    odict = lazy_import("collections", "OrderedDict")
+    assert isinstance(odict(), odict)
+    assert "OrderedDict" in repr(odict)
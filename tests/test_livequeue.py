@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import bluesky.plan_stubs as bps
+import pytest
+
+import scanplans.livequeue as mod
+
+BT = SimpleNamespace(
+    samples={
+        "A": {"sample_x": 0., "sample_y": 0.},
+        "B": {"sample_x": 1., "sample_y": 0.},
+        "C": {"sample_x": 2., "sample_y": 0.}
+    }
+)
+
+
+def test_live_queue(sim_beamline, tmp_path):
+    path = tmp_path.joinpath("queue.csv")
+    path.write_text("id,sample,plan\n1,A,edit\n2,B,sleep\n3,C,sleep\n")
+
+    def edit():
+        # the user cancels 2, puts a new job before 3 and adds a job with an unknown sample during the first job
+        path.write_text("id,sample,plan,status\n1,A,edit,\n2,B,sleep,cancel\n4,B,sleep,\n3,C,sleep,\n5,Z,sleep,\n")
+        yield from bps.sleep(10.)
+
+    plans = {"edit": edit, "sleep": lambda: bps.sleep(10.)}
+    queue = mod.LiveQueue(str(path))
+    result = sim_beamline.run(queue.run(BT, plans, poll=1., idle_timeout=5.))
+    assert result.plan_result["done"] == ["1", "4", "3"]
+    assert list(result.plan_result["errors"]) == ["5"]
+    # three jobs of 10 s, the short moves between them and 5 s of waiting for new jobs at the end
+    assert 35. < result.duration < 40.
+    # the journal resumes the queue
+    again = mod.LiveQueue(str(path))
+    assert again.done == ["1", "4", "3"]
+    assert sim_beamline.run(again.run(BT, plans, poll=1., idle_timeout=0.)).plan_result["done"] == []
+
+
+def test_live_queue_ids(tmp_path):
+    path = tmp_path.joinpath("queue.csv")
+    path.write_text("sample,plan,status\nA,0,\nA,0,hold\nB,0,\n")
+    queue = mod.LiveQueue(str(path))
+    assert queue.read()["id"].tolist() == ["A/0/0", "A/0/1", "B/0/0"]
+    assert queue.pending()["id"].tolist() == ["A/0/0", "B/0/0"]
+    path.write_text("sample\nA\n")
+    with pytest.raises(ValueError):
+        queue.read()
+
+
+def test_live_queue_bad_rows(sim_beamline, tmp_path):
+    path = tmp_path.joinpath("queue.csv")
+    path.write_text("id,sample,plan,wait_time\n1,A,nothing,\n2,B,sleep,abc\n3,C,sleep,\n")
+    plans = {"sleep": lambda: bps.sleep(10.)}
+    queue = mod.LiveQueue(str(path))
+    result = sim_beamline.run(queue.run(BT, plans, poll=1., idle_timeout=0.))
+    # the bad rows are recorded and the queue goes on
+    assert result.plan_result["done"] == ["3"]
+    assert sorted(result.plan_result["errors"]) == ["1", "2"]
+    assert queue.pending().empty
+    # a fixed row is tried again
+    path.write_text("id,sample,plan,wait_time\n1,A,sleep,\n2,B,sleep,abc\n3,C,sleep,\n")
+    assert queue.pending()["id"].tolist() == ["1"]
+    result = sim_beamline.run(queue.run(BT, plans, poll=1., idle_timeout=0.))
+    assert result.plan_result["done"] == ["1"]
+    assert list(result.plan_result["errors"]) == ["2"]
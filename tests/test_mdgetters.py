@@ -0,0 +1,16 @@
+import scanplans.mdgetters as mod
+from scanplans.ttseries import ttseries
+
+
+class FakeScanPlan(dict):
+    plan_func = staticmethod(ttseries)
+
+
+def test_get_plan_exposure():
+    # the exposure is the second argument of ttseries after the temperature
+    sp = FakeScanPlan(sp_args=(300, 10, 20, 10), sp_kwargs={})
+    assert mod.get_plan_arguments(sp)["temp_setpoint"] == 300
+    assert mod.get_plan_exposure(sp) == 10
+    sp = FakeScanPlan(sp_args=(300,), sp_kwargs={"exposure": 5})
+    assert mod.get_plan_exposure(sp) == 5
+    assert mod.get_plan_exposure({"sp_args": (), "sp_kwargs": {"exposure": 3}}) == 3
@@ -0,0 +1,35 @@
+import time
+
+from bluesky.plans import count
+from ophyd.sim import SynAxis
+
+import scanplans.monitor as mod
+from scanplans.ttseries import ttseries
+
+
+def test_polled_monitor():
+    motor = SynAxis(name="motor")
+    readings = []
+    monitor = mod.PolledMonitor([motor], rate=100., decimation=2)
+    monitor.subscribe(readings.append)
+    time.sleep(0.2)
+    monitor.clear_sub(readings.append)
+    assert 3 < len(readings) < 15
+    assert set(readings[0]) == set(monitor.describe())
+
+
+def test_monitor_during(RE):
+    motor = SynAxis(name="motor")
+    docs = []
+    plan = mod.monitor_during(count([motor], 2, delay=0.2), [motor], rate=50., decimation=5)
+    RE(plan, lambda name, doc: docs.append((name, doc)))
+    streams = {doc["uid"]: doc["name"] for name, doc in docs if name == "descriptor"}
+    events = [streams[doc["descriptor"]] for name, doc in docs if name == "event"]
+    assert events.count("primary") == 2
+    assert events.count("temperature_monitor") >= 1
+
+
+def test_ttseries_monitor(RE):
+    docs = []
+    RE(ttseries([], 300., 0.1, 0.5, 2, monitor_rate=20.), lambda name, doc: docs.append((name, doc)))
+    assert "temperature_monitor" in {doc["name"] for name, doc in docs if name == "descriptor"}
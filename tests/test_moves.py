@@ -0,0 +1,49 @@
+import bluesky.plan_stubs as bps
+import pytest
+from ophyd.sim import hw
+
+from scanplans.moves import MoveTracker
+
+HW = hw()
+
+
+def _crossed(tracker, motor1, motor2):
+    for x, y in [(0., 0.), (-1., 0.), (1., 0.), (0., -1.), (0., 1.)]:
+        yield from tracker.mv(motor1, x)
+        yield from tracker.mv(motor2, y)
+
+
+def test_move_tracker(sim_beamline):
+    tracker = MoveTracker()
+    motor1, motor2 = HW.motor1, HW.motor2
+    sim_beamline.run(_crossed(tracker, motor1, motor2))
+    assert tracker.num_moves == 7
+    assert tracker.num_skipped == 3
+    assert sim_beamline.result.commands["set"] == 7
+    assert tracker.setpoints == {"motor1": 0., "motor2": 1.}
+
+
+def test_move_tracker_after_outside_move(RE):
+    tracker = MoveTracker()
+    motor = HW.motor1
+
+    def plan():
+        yield from tracker.mv(motor, 1.)
+        # e.g. moved by hand in a pause
+        yield from bps.mv(motor, 5.)
+        yield from tracker.mv(motor, 1.)
+
+    RE(plan())
+    assert motor.position == 1.
+    assert tracker.num_moves == 2
+    assert tracker.num_skipped == 0
+
+
+def test_move_tracker_without_run_engine():
+    tracker = MoveTracker(verify=True)
+    msgs = list(_crossed(tracker, HW.motor1, HW.motor2))
+    assert [msg.command for msg in msgs].count("set") == 7
+    tracker.forget(HW.motor1)
+    assert list(tracker.setpoints) == ["motor2"]
+    with pytest.raises(ValueError):
+        list(tracker.mv(HW.motor1))
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+import scanplans.patterns as mod
+
+
+@pytest.mark.parametrize(
+    "pattern,kwargs,num_points",
+    [
+        ("center", {}, 1),
+        ("cross", {"dx": 0.2, "dy": 0.1}, 5),
+        ("grid", {"nx": 3, "ny": 2, "dx": 0.1, "dy": 0.1}, 6),
+        ("circle", {"radius": 0.2, "num": 6}, 7),
+        ("spiral", {"radius": 0.3, "num": 12}, 12),
+        ("disk", {"radius": 0.3, "num": 5, "seed": 0}, 5)
+    ]
+)
+def test_make_offsets(pattern, kwargs, num_points):
+    offsets = mod.make_offsets(pattern, 4, **kwargs)
+    assert offsets.shape == (4, num_points, 2)
+    radius = kwargs.get("radius")
+    if radius:
+        assert np.all(np.linalg.norm(offsets, axis=-1) <= radius + 1e-12)
+
+
+def test_make_trajectories():
+    centers = np.array([[0., 0.], [10., 0.], [1., 0.], [11., 0.]])
+    offsets = mod.make_offsets("cross", 4, dx=0.2, dy=0.1)
+    well_order, trajectories, ordered = mod.make_trajectories(centers, offsets)
+    assert well_order.tolist() == [0, 2, 1, 3]
+    assert np.allclose(trajectories, centers[well_order, None, :] + ordered)
+    assert np.allclose(ordered[:, 0], 0.)
+    # every point is visited exactly once
+    assert np.allclose(np.sort(ordered[0], axis=0), np.sort(offsets[0], axis=0))
+    well_order, _, same = mod.make_trajectories(centers, offsets, optimize=False)
+    assert well_order.tolist() == [0, 1, 2, 3]
+    assert np.allclose(same, offsets)
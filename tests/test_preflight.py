@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import scanplans.preflight as mod
+from scanplans.context import PlanContext
+
+
+def make_bt():
+    samples = {
+        "Ni0": {"sample_name": "Ni0", "sample_x": 1.0, "sample_y": 2.0},
+        "Ni1": {"sample_name": "Ni1", "sample_x": "a", "sample_y": 2.0},
+        "Ni2": {"sample_name": "Ni2", "sample_y": 2.0},
+        "Ni3": {"sample_name": "Ni3", "sample_x": 1.0, "sample_y": 2.0},
+        "Ni4": {"sample_name": "Ni4", "sample_x": 100.0, "sample_y": 2.0},
+    }
+    scanplans = {
+        "ct_5": {"sp_args": (5,), "sp_kwargs": {}},
+        "ct_0.01": {"sp_args": (), "sp_kwargs": {"exposure": 0.01}},
+    }
+    return SimpleNamespace(samples=samples, scanplans=scanplans)
+
+
+def test_preflight_move_and_do():
+    report = mod.preflight_move_and_do(
+        make_bt(), [(0, 0), (1, 0), (2, 1), (3, 0), (0, 1), ("Cu", 0), (4, 2)], frame_acq_time=0.1
+    )
+    checks = report.to_frame().groupby("check")["item"].apply(list).to_dict()
+    assert checks == {
+        "duplicates": ["Ni0"],
+        "exposures": [1],
+        "plans": [2],
+        "positions": ["Ni2", "Ni1"],
+        "samples": ["Cu"]
+    }
+    assert not report.ok
+    assert str(report).startswith("Preflight found 6 issue(s):")
+
+
+def test_preflight_cryostat():
+    temp_motor = SimpleNamespace(name="temp", limits=(0., 500.), heater_range=None)
+    posi_motor = SimpleNamespace(name="x", limits=(0., 50.))
+    report = mod.preflight_cryostat(
+        make_bt(), temp_motor, [300., 600., -1.], posi_motor, [10., 60., 10.], [0, 1], [30., 60.],
+        frame_acq_time=0.1
+    )
+    checks = report.to_frame().groupby("check")["item"].apply(list).to_dict()
+    assert checks == {
+        "duplicates": ["0"],
+        "heater_ranges": [-1.],
+        "lengths": ["positions, samples, exposures"],
+        "limits": ["1", "600.0 K", "-1.0 K"]
+    }
+
+
+def test_preflight_move_and_do_context():
+    # the controllers and the frame acquisition time are read from the context
+    context = PlanContext(
+        configuration={
+            "x_controller": SimpleNamespace(name="x", limits=(0., 50.)),
+            "y_controller": SimpleNamespace(name="y", limits=(0., 50.))
+        },
+        glbl={"frame_acq_time": 0.001}
+    )
+    report = mod.preflight_move_and_do(make_bt(), [(0, 0), (4, 1)], context=context)
+    checks = report.to_frame().groupby("check")["item"].apply(list).to_dict()
+    assert checks == {"limits": ["Ni4"]}
@@ -0,0 +1,45 @@
+import numpy as np
+
+from scanplans.sampletable import SampleTable
+
+
+def make_samples():
+    return {
+        "Ni0": {"sample_name": "Ni0", "sample_x": "1.0", "sample_y": 2.0},
+        "Ni1": {"sample_name": "Ni1", "sample_x": 11.0, "sample_y": 2.0},
+        "TiO2": {"sample_name": "TiO2", "sample_x": "bad", "sample_y": 3.0, "exposure": 30},
+    }
+
+
+def test_select():
+    table = SampleTable(make_samples())
+    assert len(table) == 3
+    assert list(table.select(name="^Ni").index) == [0, 1]
+    assert list(table.select(ranges={"sample_x": (0., 5.)}).index) == [0]
+    assert list(table.select(exposure=30).index) == [2]
+    assert list(table.select(mask=table.frame["sample_y"] > 2.5).index) == [2]
+    positions = table.positions()
+    assert positions.shape == (3, 2)
+    assert np.isnan(positions[2, 0])
+
+
+def test_refresh():
+    samples = make_samples()
+    table = SampleTable(samples)
+    version = table.version
+    assert not table.refresh()
+    samples["Ni1"]["sample_x"] = 12.0
+    assert table.refresh()
+    assert table.frame.loc[1, "sample_x"] == 12.0
+    assert not table.refresh()
+    samples["Cu"] = {"sample_name": "Cu", "sample_x": 5.0, "sample_y": 5.0, "color": "red"}
+    del samples["Ni0"]
+    assert table.refresh()
+    assert list(table.frame["sample_name"]) == ["Ni1", "TiO2", "Cu"]
+    assert table.version == version + 2
+    # a nested value edited in place
+    samples["Cu"]["tags"] = ["powder"]
+    assert table.refresh()
+    samples["Cu"]["tags"].append("capillary")
+    assert table.refresh()
+    assert table.frame.loc[2, "tags"] == ["powder", "capillary"]
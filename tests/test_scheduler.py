@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+import bluesky.plan_stubs as bps
+import pytest
+
+import scanplans.scheduler as mod
+from scanplans.sim import MotorModel
+
+BT = SimpleNamespace(
+    samples={
+        "A": {"sample_x": 0., "sample_y": 0.},
+        "B": {"sample_x": 10., "sample_y": 0.},
+        "C": {"sample_x": 1., "sample_y": 0.},
+        "D": {"sample_x": 2., "sample_y": 0.}
+    }
+)
+
+
+def sleep_plan(exposure):
+    return bps.sleep(exposure)
+
+
+def test_make_schedule():
+    jobs = [
+        mod.Job("A", sleep_plan, priority=1., min_exposure=10., ideal_exposure=20.),
+        mod.Job("B", sleep_plan, priority=1., min_exposure=10., ideal_exposure=20.),
+        mod.Job("C", sleep_plan, priority=3., min_exposure=10., ideal_exposure=40.),
+        mod.Job("D", sleep_plan, priority=1., min_exposure=10., ideal_exposure=10.)
+    ]
+    schedule = mod.make_schedule(BT, jobs, 45., motor=MotorModel(velocity=1.))
+    # B is too far away
+    assert [e["job"].sample for e in schedule.entries] == ["D", "C", "A"]
+    assert [job.sample for job in schedule.skipped] == ["B"]
+    assert schedule.total_duration == pytest.approx(45.)
+    # the time left goes to C which has the most work per second
+    assert schedule.to_frame()["exposure"].tolist() == pytest.approx([10., 21., 10.])
+
+
+def test_run_schedule(sim_beamline):
+    jobs = [
+        mod.Job(name, sleep_plan, priority=1., min_exposure=10., ideal_exposure=10.) for name in "ABCD"
+    ]
+    # the first job takes much longer than the forecast
+    jobs[0] = mod.Job("A", lambda t: bps.sleep(100.), min_exposure=10.)
+    plan = mod.run_schedule(BT, jobs, 120., motor=MotorModel(velocity=1.), tolerance=5.,
+                            clock=lambda: sim_beamline.clock.time)
+    report = sim_beamline.run(plan).plan_result
+    assert report["num_schedules"] == 2
+    assert len(report["done"]) == 2
@@ -0,0 +1,37 @@
+import pytest
+
+import scanplans.settle as mod
+from scanplans.grid_scan import acq_rel_grid_scan
+from tests.conftest import HW
+
+
+def test_wait_time():
+    settle = mod.SettleModel(base=1., rate=0.5, maximum=5., axes={"motor2": lambda d: 2. * d})
+    assert settle.wait_time({"motor1": 0., "motor2": 0.}) == 0.
+    assert settle.wait_time({"motor1": 0.2, "motor2": 0.}) == pytest.approx(1.1)
+    assert settle.wait_time({"motor1": 100., "motor2": 0.}) == 5.
+    assert settle.wait_time({"motor1": 0.2, "motor2": 3.}) == 6.
+    with pytest.raises(ValueError):
+        mod.SettleModel(rate=-1.)
+
+
+def test_settle_mv(sim_beamline):
+    settle = mod.SettleModel(base=1., rate=0.5)
+    result = sim_beamline.run(settle.mv(HW.motor1, 4., HW.motor2, 1.))
+    assert result.plan_result == 3.
+    assert result.sleep == 3.
+    # the motors at their targets do not wait
+    assert sim_beamline.run(settle.mv(HW.motor1, 4., HW.motor2, 1.)).plan_result == 0.
+    settle = mod.SettleModel(base=1., tolerance=1e-3, window=0.5, poll=0.1)
+    result = sim_beamline.run(settle.mv(HW.motor1, 5.))
+    assert result.sleep == pytest.approx(1.5)
+
+
+def test_grid_scan_settle(sim_beamline):
+    plan = acq_rel_grid_scan([], 0.1, 10., -1., 1., 3, -1., 1., 3)
+    fixed = sim_beamline.run(plan).sleep
+    settle = mod.SettleModel(base=0.5, rate=1.)
+    plan = acq_rel_grid_scan([], 0.1, 10., -1., 1., 3, -1., 1., 3, settle=settle)
+    # the steps of 1 along a row and the first move of 1 in both
+    assert sim_beamline.run(plan).sleep == pytest.approx(9 * 1.5)
+    assert fixed == pytest.approx(90.)
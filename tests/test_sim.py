@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+import pytest
+
+import scanplans.sim as mod
+from scanplans.grid_scan import acq_rel_grid_scan
+from scanplans.tramp3 import Tramp3
+from scanplans.ttseries import ttseries
+
+
+def test_motor_model():
+    motor = mod.MotorModel(velocity=2., acceleration=4.)
+    # accelerate to 2 in 0.5 s over 0.5, cruise and decelerate
+    assert motor.move_time(3.) == pytest.approx(2.)
+    # triangular profile
+    assert motor.move_time(0.25) == pytest.approx(0.5)
+    assert motor.set(3., 10.) == pytest.approx(12.)
+    assert motor.value(13.) == 3.
+
+
+def test_temperature_model():
+    temp = mod.TemperatureModel(tau=10., tolerance=1., value=300.)
+    done = temp.set(400., 0.)
+    assert done == pytest.approx(10. * math.log(100.))
+    assert temp.value(done) == pytest.approx(399.)
+    assert temp.value(10.) == pytest.approx(400. - 100. / math.e)
+
+
+def test_tramp3(sim_beamline):
+    result = sim_beamline.run(Tramp3([], 5., 1., 300., 320., 10.))
+    assert result.num_runs == 1
+    assert result.num_events == 3
+    # the first step waits for the lag from 295 K, the others for 10 K steps and 5 s
+    lag = 60. * (math.log(5. / 0.5) + 2. * math.log(10. / 0.5))
+    assert result.duration > lag + 3 * 5.
+    assert result.wall_time < 10.
+
+
+def test_ttseries(sim_beamline):
+    result = sim_beamline.run(ttseries([], 400., 1., 10., 5))
+    assert result.num_events == 5
+    assert result.duration >= 40.
+    temp = sim_beamline.models["temp_controller"]
+    assert 295. < temp.value(sim_beamline.clock.time) < 400.
+
+
+def test_grid_scan(sim_beamline):
+    result = sim_beamline.run(acq_rel_grid_scan([], 1., 2., -1, 1, 3, -1, 1, 3))
+    assert result.num_events == 9
+    assert result.busy["motor1"] > 0.
+    assert result.sleep >= 9 * 2.
+
+
+def test_adaptive_tramp3(sim_beamline):
+    # a sharp transition at 310 K in the readings of the temperature controller
+    def reducer(readings):
+        return 1. + np.tanh(readings["temp_controller"]["value"] - 310.)
+
+    plan = Tramp3([], 1., 1., 300., 340., 1., adaptive_threshold=0.05, adaptive_reducer=reducer, coarse_step=4.)
+    result = sim_beamline.run(plan)
+    report = result.plan_result
+    setpoints = np.array(report["setpoints"])
+    assert report["num_uniform"] == 41
+    assert result.num_events == len(setpoints) < 41
+    assert setpoints[0] == 300. and setpoints[-1] == 340.
+    assert np.all(np.diff(setpoints) > 0)
+    steps = np.diff(setpoints)
+    # fine steps after the transition, coarse steps in the flat regions
+    assert steps.min() == pytest.approx(1.)
+    assert steps[0] == pytest.approx(4.) and steps[-1] == pytest.approx(4.)
+
+
+def test_adaptive_tramp3_budget(sim_beamline):
+    plan = Tramp3([], 1., 1., 300., 340., 1., adaptive_threshold=0., adaptive_reducer=lambda r: 1., max_points=5)
+    report = sim_beamline.run(plan).plan_result
+    assert len(report["setpoints"]) <= 5
+    assert report["setpoints"][-1] == 340.
@@ -0,0 +1,60 @@
+import bluesky.plan_stubs as bps
+import bluesky.preprocessors as bpp
+import pandas as pd
+from bluesky.plans import count
+from ophyd.sim import hw
+
+from scanplans.singlerun import single_run, split_samples
+
+HW = hw()
+
+
+def _samples():
+    for i in range(3):
+        plan = count([HW.det], 2, md={"sample_name": f"sample{i}", "position": [i, 2 * i]})
+        yield from bpp.subs_wrapper(plan, lambda name, doc: None)
+
+
+def _table(docs):
+    streams, rows = {}, []
+    for name, doc in docs:
+        if name == "descriptor":
+            streams[doc["uid"]] = doc["name"]
+        elif name == "event":
+            rows.append(dict(stream=streams[doc["descriptor"]], **doc["data"]))
+    return pd.DataFrame(rows)
+
+
+def test_single_run(RE):
+    docs = []
+    uids = RE(single_run(_samples(), md={"operator": "me"}), lambda name, doc: docs.append((name, doc)))
+    names = [name for name, doc in docs]
+    assert names.count("start") == names.count("stop") == 1
+    assert docs[0][1]["uid"] == uids[0]
+    assert docs[0][1]["operator"] == "me" and docs[0][1]["sp_single_run"]
+    assert docs[-1][1]["num_events"] == {"samples": 3, "primary": 6}
+    tables = split_samples(_table(docs))
+    assert list(tables) == [0, 1, 2]
+    assert len(tables[1]) == 2
+    assert (tables[1]["sample_name"] == "sample1").all()
+    assert tables[2]["position"][0] == "[2, 4]"
+    assert "sample_md" not in tables[0]
+
+
+def test_single_run_without_runs():
+    msgs = list(single_run(bps.null()))
+    assert [msg.command for msg in msgs] == ["null"]
+
+
+def test_single_run_other_objects(RE, bt):
+    from scanplans.move_and_do import move_and_do_many
+
+    docs = []
+    plans = move_and_do_many(
+        bt, [(0, count([HW.det])), (1, count([HW.det, HW.det1]))], positions=[(0., 0.), (1., 1.)], single_run=True
+    )
+    RE(plans[0], lambda name, doc: docs.append((name, doc)))
+    assert [doc["name"] for name, doc in docs if name == "descriptor"] == ["samples", "primary", "primary_1"]
+    assert docs[-1][1]["num_events"] == {"samples": 2, "primary": 1, "primary_1": 1}
+    table = _table(docs)
+    assert table[table["stream"] == "primary_1"]["sample_index"].tolist() == [1]
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from scanplans.spatial import SpatialIndex
+
+
+def brute_radius(points, point, radius):
+    distances = np.linalg.norm(points - point, axis=1)
+    return set(np.flatnonzero(distances <= radius))
+
+
+def test_queries():
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0., 100., (200, 2))
+    points[3] = np.nan
+    index = SpatialIndex(points)
+    assert len(index) == 199
+    for point in ([50., 50.], [-20., 3.], [99., 0.]):
+        ids, distances = index.query_radius(point, 12.)
+        assert set(ids) == brute_radius(points, point, 12.) - {3}
+        assert np.all(np.diff(distances) >= 0)
+        ids, distances = index.nearest(point, 3)
+        all_distances = np.linalg.norm(points - point, axis=1)
+        all_distances[3] = np.inf
+        assert list(ids) == list(np.argsort(all_distances)[:3])
+    box = index.query_box((10., 30.), (40., 45.))
+    inside = np.flatnonzero(
+        (points[:, 0] >= 10.) & (points[:, 0] <= 30.) & (points[:, 1] >= 40.) & (points[:, 1] <= 45.)
+    )
+    assert list(box) == list(inside)
+    # the far queries and the ones for all the points end
+    assert len(index.nearest([1e6, -1e6], 500)[0]) == 199
+    with pytest.raises(ValueError):
+        index.nearest([np.nan, 0.])
+
+
+def test_overlaps():
+    points = np.array([[0., 0.], [0.5, 0.], [10., 10.], [10., 10.2], [np.nan, 1.]])
+    pairs, distances = SpatialIndex(points).overlaps(1.)
+    assert pairs.tolist() == [[0, 1], [2, 3]]
+    assert np.allclose(distances, [0.5, 0.2])
+    pairs, _ = SpatialIndex(np.empty((0, 2))).overlaps(1.)
+    assert pairs.shape == (0, 2)
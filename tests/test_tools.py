@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+from ophyd import Signal
+from xpdacq.simulation import xpd_pe1c
+
+import scanplans.tools as mod
+from scanplans.context import PlanContext
+from scanplans.convergence import Convergence
+from scanplans.sim import ShutterModel
+from scanplans.ttseries import ttseries
+from tests.conftest import HW
+
+
+def test_ttseries_cadence(sim_beamline):
+    result = sim_beamline.run(ttseries([], 300., 1., 10., 5, absolute_cadence=True))
+    assert result.num_events == 5
+    # four periods and the last reading
+    assert 40. < result.duration < 42.
+
+
+def test_ttseries_shutter_overhead(RE, capsys):
+    docs = []
+    # the default is the count of the existing calls, warned about the measured overhead of the shutter
+    RE(ttseries([], 300., 0.1, 0.1, 2, shutter_overhead=0.5), lambda name, doc: docs.append((name, doc)))
+    start = docs[0][1]
+    assert start["plan_name"] == "count" and start["sp_estimated_overhead"] == 0.5
+    assert "overhead 0.5s > delay" in capsys.readouterr().out
+
+
+def test_cadence_count_missed_slots(sim_beamline):
+    # a reading of 15 frames takes 1.65 s on a period of 1 s so every other slot is missed
+    sim_beamline.values["images_per_set"] = 15
+    result = sim_beamline.run(mod.cadence_count([xpd_pe1c], 4, 1.))
+    assert result.num_events == 4
+    assert result.plan_result["missed_slots"] == 3
+    assert result.plan_result["max_jitter"] == 0.
+
+
+def test_ttseries_convergence(sim_beamline):
+    # the pattern grows by 1, 0.5 and then stops changing
+    patterns = iter([[1.], [2.], [3.]] + [[3.]] * 10)
+    result = sim_beamline.run(
+        ttseries([], 300., 1., 10., 10, convergence_threshold=0.01, convergence_frames=2,
+                 convergence_reducer=lambda readings: np.array(next(patterns)))
+    )
+    assert result.num_events == 5
+    assert result.plan_result["converged"]
+    assert result.plan_result["num_readings"] == 5
+
+
+def test_cadence_count_convergence(RE, sim_beamline):
+    docs = []
+    convergence = Convergence(0.01, lambda readings: np.atleast_1d(readings["det"]["value"]), consecutive=2)
+
+    async def sleep(msg):
+        # the sleeps advance the virtual clock so that no slot is missed on a slow machine
+        sim_beamline.clock.advance(msg.args[0])
+
+    RE.register_command("sleep", sleep)
+    with sim_beamline.virtual_time():
+        RE(mod.cadence_count([HW.det], 10, 0.2, convergence=convergence), lambda name, doc: docs.append((name, doc)))
+    events = [doc for name, doc in docs if name == "event"]
+    assert len(events) == 3
+    assert events[0]["data"]["convergence_change"] == -1.
+    assert "converged at reading 2" in docs[-1][1]["reason"]
+    start = docs[0][1]
+    assert start["plan_name"] == "cadence_count"
+    assert start["detectors"] == ["det"] and start["num_points"] == 10
+    assert start["hints"]["dimensions"] == [(("time",), "primary")]
+    assert [e["data"]["cadence_missed"] for e in events] == [0, 0, 0]
+    assert [e["data"]["cadence_jitter"] for e in events] == [0., 0., 0.]
+
+
+def test_open_shutter_stub_readback(sim_beamline):
+    # the set of the shutter completes on its readback so that no fixed sleep is needed
+    result = sim_beamline.run(mod.open_shutter_stub())
+    assert result.sleep == 0.
+    assert result.duration == pytest.approx(0.05)
+
+
+def test_open_shutter_stub_sleep(sim_beamline):
+    context = PlanContext(configuration={"shutter": Signal(name="command")}, glbl={"shutter_sleep": 0.5})
+    result = sim_beamline.run(mod.open_shutter_stub(context))
+    assert result.sleep == result.duration == 0.5
+    assert sim_beamline.run(mod.close_shutter_stub(context)).duration == 0.
+
+
+def test_open_shutter_stub_poll(sim_beamline):
+    command, readback = Signal(name="command"), Signal(name="readback")
+    model = sim_beamline.add(command, ShutterModel(delay=0.05, ack_time=0.))
+    sim_beamline.add(readback, model)
+    context = PlanContext(configuration={"shutter": command, "shutter_readback": readback})
+    result = sim_beamline.run(mod.open_shutter_stub(context))
+    assert 0.05 <= result.duration <= 0.05 + mod.SHUTTER_POLL + 1e-9
+    assert sim_beamline.value(readback) == 60
+    context = context.replace(glbl={"shutter_timeout": 0.02})
+    with pytest.raises(TimeoutError):
+        sim_beamline.run(mod.close_shutter_stub(context))
+
+
+def test_calibrate_shutter(sim_beamline):
+    latencies = sim_beamline.run(mod.calibrate_shutter(3)).plan_result
+    assert latencies["open"] == pytest.approx([0.05] * 3)
+    assert latencies["close"] == pytest.approx([0.05] * 3)
+    with pytest.raises(ValueError):
+        sim_beamline.run(mod.calibrate_shutter(3, PlanContext(configuration={"shutter": Signal(name="command")})))
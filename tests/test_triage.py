@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from xpdacq.simulation import xpd_pe1c
+
+import scanplans.triage as mod
+from tests.conftest import HW
+
+
+def test_triage_scores_and_decisions():
+    reference = np.ones((2, 2))
+    values = np.stack([reference, 3. * reference, np.full((2, 2), np.nan), 1.1 * reference])
+    scores = mod.triage_scores(values, reference)
+    assert np.allclose(scores[[0, 1, 3]], [0., 2., 0.1])
+    assert np.isnan(scores[2])
+    decisions = mod.triage_decisions(scores, 0.5, "shorten")
+    assert decisions.tolist() == ["shorten", "measure", "measure", "shorten"]
+    assert np.allclose(mod.triage_scores([1., 4., 2.]), [0.25, 1., 0.5])
+    with pytest.raises(ValueError):
+        mod.triage_decisions(scores, 0.5, "drop")
+
+
+def test_triage_wells(RE):
+    # the well at x = 0 is as empty as the reference
+    def metric(readings):
+        return 1. + 9. * float(readings["motor1"]["value"] > 0.5)
+
+    docs = []
+    centers = np.array([[0., 0.], [1., 0.], [2., 1.]])
+    result = []
+
+    def plan():
+        result.extend((
+            yield from mod.triage_wells(xpd_pe1c, HW.motor1, HW.motor2, centers, 0.1, 0.5, metric=metric,
+                                        reference=1.)
+        ))
+
+    RE(plan(), lambda name, doc: docs.append((name, doc)))
+    descriptors = {doc["uid"]: doc["name"] for name, doc in docs if name == "descriptor"}
+    events = [doc for name, doc in docs if name == "event" and descriptors[doc["descriptor"]] == "triage"]
+    assert [e["data"]["triage_decision"] for e in events] == ["skip", "measure", "measure"]
+    assert np.allclose([e["data"]["triage_score"] for e in events], [0., 9., 9.])
+    scores, decisions = result
+    assert decisions.tolist() == ["skip", "measure", "measure"]
+
+
+def test_triage_wells_without_numbers(RE):
+    # e.g. a metric which finds only the datum id of the image
+    centers = np.array([[0., 0.], [1., 0.]])
+    with pytest.raises(ValueError):
+        RE(mod.triage_wells(xpd_pe1c, HW.motor1, HW.motor2, centers, 0.1, 0.5, metric=lambda readings: np.nan))
+    with pytest.raises(ValueError):
+        RE(mod.triage_wells(xpd_pe1c, HW.motor1, HW.motor2, centers, 0.1, 0.5, metric=None))
@@ -0,0 +1,35 @@
+from functools import partial
+
+import pytest
+from ophyd import Signal
+
+from scanplans.context import PlanContext
+from scanplans.ttseries import ttseries
+from scanplans.variants import simulate_variants
+
+
+def _failing(context=None):
+    raise ValueError("no plan")
+    yield
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_simulate_variants(sim_beamline_factory, processes):
+    plan = partial(ttseries, [], 400., 1., 0., 3, absolute_cadence=False)
+    variants = {
+        # a shutter which can not be read back sleeps after opening
+        "slow shutter": (plan, PlanContext({"shutter": Signal(name="command")}, {"shutter_sleep": 3.})),
+        "fast shutter": (plan, PlanContext(glbl={"frame_acq_time": 0.1})),
+        "broken": (_failing, None)
+    }
+    table = simulate_variants(variants, sim_beamline_factory, processes=processes)
+    assert list(table["variant"]) == ["fast shutter", "slow shutter", "broken"]
+    assert (table["num_events"][:2] == 3).all()
+    assert table["duration"][1] > table["duration"][0]
+    assert table["error"][0] == ""
+    assert table["error"][2] == "ValueError: no plan"
+
+
+def test_simulate_variants_processes(sim_beamline_factory):
+    with pytest.raises(ValueError):
+        simulate_variants({}, sim_beamline_factory, processes=0)